@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import jwt
+from fastapi import HTTPException, Header
+from pydantic import BaseModel
+from supabase import create_client, Client
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Supabase client used only for remote (revocation-sensitive) token checks
+supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+
+_jwks_client = None
+
+
+class AuthUser(BaseModel):
+    """Authenticated user built from verified JWT claims (or a remote Supabase lookup)"""
+    id: str
+    email: Optional[str] = None
+    user_metadata: dict = {}
+
+
+class _VerifiedTokenCache:
+    """Small thread-safe LRU cache of verified tokens with per-entry expiry"""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Never keep raw bearer tokens around as dictionary keys
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[AuthUser]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def put(self, token: str, user: AuthUser, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp:
+            expires_at = min(expires_at, token_exp)
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+token_cache = _VerifiedTokenCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def extract_token(authorization: Optional[str]) -> str:
+    """Extract the bearer token from an Authorization header"""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header missing")
+    # Expected format: "Bearer <token>"
+    return authorization.split(" ")[1] if " " in authorization else authorization
+
+
+def _signing_key(token: str):
+    """Resolve the key used to verify a Supabase JWT (shared secret or project JWKS)"""
+    global _jwks_client
+    if settings.SUPABASE_JWT_SECRET:
+        return settings.SUPABASE_JWT_SECRET, ["HS256"]
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json", cache_keys=True)
+    return _jwks_client.get_signing_key_from_jwt(token).key, ["RS256", "ES256"]
+
+
+def verify_token_locally(token: str) -> AuthUser:
+    """
+    Verify a Supabase JWT locally (signature, expiry, audience) and return the user.
+    Verified claims are cached for AUTH_CACHE_TTL_SECONDS (never past the token's own expiry).
+    """
+    cached = token_cache.get(token)
+    if cached:
+        metrics.incr("auth.cache_hit")
+        return cached
+
+    metrics.incr("auth.cache_miss")
+    key, algorithms = _signing_key(token)
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=settings.SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+    user = AuthUser(
+        id=claims["sub"],
+        email=claims.get("email"),
+        user_metadata=claims.get("user_metadata") or {},
+    )
+    token_cache.put(token, user, claims.get("exp"))
+    return user
+
+
+def verify_token_remotely(token: str) -> AuthUser:
+    """Verify a token with a Supabase Auth round-trip (sees revocations and fresh metadata)"""
+    metrics.incr("auth.remote_check")
+    user_response = supabase.auth.get_user(token)
+    if not user_response.user:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user = user_response.user
+    return AuthUser(id=user.id, email=user.email, user_metadata=user.user_metadata or {})
+
+
+async def get_current_user(authorization: str = Header(None)) -> AuthUser:
+    """Dependency to verify Supabase JWT token"""
+    token = extract_token(authorization)
+    try:
+        cached = token_cache.get(token)
+        if cached:
+            metrics.incr("auth.cache_hit")
+            return cached
+        # A cache miss may fetch the JWKS over the network; keep it off the event loop
+        return await asyncio.to_thread(verify_token_locally, token)
+    except jwt.PyJWKClientError as e:
+        # JWKS unreachable or missing the key (a subclass of PyJWTError) - fall back to Supabase
+        logger.warning(f"JWKS unavailable, falling back to Supabase: {e}")
+        return await _verify_remotely(token)
+    except jwt.PyJWTError as e:
+        logger.warning(f"Invalid or expired token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    except Exception as e:
+        # Local verification unavailable (e.g. JWKS unreachable) - fall back to Supabase
+        logger.warning(f"Local token verification unavailable, falling back to Supabase: {e}")
+        return await _verify_remotely(token)
+
+
+async def _verify_remotely(token: str) -> AuthUser:
+    try:
+        return await asyncio.to_thread(verify_token_remotely, token)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Auth error during verification: {e}")
+        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
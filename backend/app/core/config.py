@@ -4,7 +4,7 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
     QDRANT_API_KEY: str = os.getenv("QDRANT_API_KEY", "")
-    COLLECTION_NAME: str = "kca_documents"
+    COLLECTION_NAME: str = "kca_documents"  # Alias for the live versioned collection (see reindex.py)
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     CEREBRAS_API_KEY: str = os.getenv("CEREBRAS_API_KEY", "")
@@ -15,6 +15,101 @@ class Settings(BaseSettings):
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")  # Legacy HS256 secret; JWKS is used when empty
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    SUPABASE_POOL_MAX_CONNECTIONS: int = 50
+    SUPABASE_POOL_MAX_KEEPALIVE: int = 20
+
+    # Chat storage: 'blob' (chats.messages JSONB) or 'messages' (append-only chat_messages table, migration 004)
+    CHAT_STORAGE_MODE: str = os.getenv("CHAT_STORAGE_MODE", "blob")
+
+    # Autosave write coalescing (per chat, in-process). Buffered saves live only in this
+    # process's memory: a crash loses at most AUTOSAVE_MAX_DELAY_SECONDS of unsaved edits
+    # (a submission ending with the assistant's answer is written immediately)
+    AUTOSAVE_COALESCING: bool = True
+    AUTOSAVE_DEBOUNCE_SECONDS: float = 2.0  # Flush once a chat has been quiet this long...
+    AUTOSAVE_MAX_DELAY_SECONDS: float = 10.0  # ...but never hold a write longer than this
+
+    # Admin analytics read from the trigger-maintained daily rollups
+    # (enable after applying migration 007 and running backfill_analytics_rollups.py)
+    ANALYTICS_ROLLUPS: bool = False
+    ANALYTICS_CACHE_TTL_SECONDS: int = 30  # Serve cached dashboard data this long...
+    ANALYTICS_CACHE_STALE_SECONDS: int = 300  # ...then serve it stale while refreshing in the background
+
+    # Admin user directory pages (auth admin API) are cached this long
+    ADMIN_USERS_CACHE_TTL_SECONDS: int = 30
+
+    # Uploads larger than this are rejected with 413 while streaming to disk
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+
+    UPLOAD_BATCH_MAX_FILES: int = 20
+
+    # Document extraction worker processes (0 = one per CPU core)
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", "0"))
+    EXTRACTION_TIMEOUT_SECONDS: float = 120.0  # Per file
+    EXTRACTION_MEMORY_LIMIT_MB: int = 2048  # Address-space cap per worker process (0 = unlimited)
+    EXTRACTION_CACHE_MAX_CHARS: int = 50_000_000  # Extracted text kept in memory, keyed by file hash
+    EXTRACTION_CACHE_DIR: str = os.getenv("EXTRACTION_CACHE_DIR", "extraction_cache")  # On-disk tier; "" disables
+    EXTRACTION_CACHE_MAX_FILES: int = 2000  # Least recently used entries beyond this are pruned
+
+    # Background document ingestion
+    CORPUS_DIR: str = os.getenv("CORPUS_DIR", "../pdf documents")  # TXT files indexed by ingest.py
+    INDEX_SNAPSHOT_PATH: str = os.getenv("INDEX_SNAPSHOT_PATH", "index_snapshot.zip")  # Restored at startup if present
+    INGEST_JOBS_DIR: str = os.getenv("INGEST_JOBS_DIR", "ingest_jobs")  # SQLite job table + spooled uploads
+    INGEST_WORKERS: int = 1  # Jobs embedding at once (embedding is CPU-heavy; keep low to protect chat latency)
+    INGEST_MAX_ATTEMPTS: int = 3
+    INGEST_RETRY_BACKOFF_SECONDS: float = 5.0  # Doubled after every failed attempt
+    INGEST_FAILED_RETENTION_HOURS: float = 24.0  # Spooled uploads of failed jobs are kept this long for retry()
+    INGEST_BATCH_SIZE: int = 64  # Chunks embedded and upserted per batch
+    INGEST_UPSERT_WORKERS: int = 2  # Qdrant upserts in flight while the next batch is encoded
+    INGEST_MANIFEST_PATH: str = os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.json")  # Corpus (ingest.py)
+    INGEST_UPLOAD_MANIFEST_PATH: str = os.getenv("INGEST_UPLOAD_MANIFEST_PATH", "ingest_jobs/upload_manifest.json")
+    INGEST_DEDUP_ENABLED: bool = True  # Skip chunks that near-duplicate an already indexed chunk
+    INGEST_DEDUP_MAX_HAMMING: int = 3  # SimHash bits (of 64) two chunks may differ by and still be duplicates
+    EMBEDDING_STORE_DIR: str = os.getenv("EMBEDDING_STORE_DIR", "embedding_store")  # Content-addressed vectors; "" disables
+    EMBEDDING_STORE_DTYPE: str = "float16"  # float16 halves disk use; float32 stores vectors exactly
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"  # Bulk upserts over gRPC
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+
+    # Blue/green re-indexing (reindex.py): checks a new collection must pass before the alias moves
+    REINDEX_MIN_POINT_RATIO: float = 0.8  # New collection must hold at least this share of the old one's points
+    REINDEX_SMOKE_QUERIES: list = [
+        "What programmes does KCA University offer?",
+        "How do I apply for admission?",
+        "How can I pay my fees?",
+    ]
+    REINDEX_SMOKE_MIN_SCORE: float = 0.3  # Each smoke query's best hit must score at least this
+
+    # Verified-token cache (local JWT verification)
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_SIZE: int = 2048
+
+    # Outbound LLM concurrency (per provider; falls back to LLM_MAX_CONCURRENCY)
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_CONCURRENCY_LIMITS: dict = {"groq": 8, "cerebras": 8, "gemini": 4}
+
+    # Conversation memory (history sent with each prompt)
+    MEMORY_TOKEN_BUDGET: int = 1500  # Tokens of history per prompt, summary included
+    MEMORY_SUMMARY_TOKENS: int = 300  # Share of the budget for the summary of older turns
+    MEMORY_RECENT_MESSAGES: int = 6  # Newest messages kept verbatim (if they fit the budget)
+    MEMORY_MAX_MESSAGE_TOKENS: int = 400  # Longer messages (e.g. pasted documents) are truncated
+    MEMORY_MAX_MESSAGES: int = 50  # Older history sent by the client is ignored
+    MEMORY_CACHE_MAX_CHATS: int = 1000  # Rolling summaries kept in memory
+    MEMORY_CHARS_PER_TOKEN: float = 3.0  # Token estimate for the budgets above (~4 for English; lower is safer)
+
+    # Small-talk fast path (skips retrieval and web search)
+    INTENT_MAX_SMALL_TALK_WORDS: int = 6  # Longer messages always go through retrieval
+    INTENT_CENTROID_MIN_SCORE: float = 0.6  # Cosine to a small-talk centroid needed to route there...
+    INTENT_CENTROID_MARGIN: float = 0.1  # ...and its lead over the question centroid
+    INTENT_SMALL_TALK_LLM: bool = False  # Answer small talk with a short LLM prompt instead of a canned reply
+    QUERY_VECTOR_CACHE_SIZE: int = 512
+
+    # Retrieval / reranking policy
+    RERANK_MIN_FETCH_K: int = 8  # Never rerank fewer candidates than this (unless the collection has fewer)
+    RERANK_MAX_FETCH_K: int = 20  # Upper bound on candidates retrieved for reranking
+    RERANK_SCORE_WINDOW: float = 0.25  # Keep candidates within this dense-score distance of the top hit
+    RERANK_SKIP_MARGIN: float = 0.15  # Skip reranking when top-1 leads top-2 by at least this much...
+    RERANK_SKIP_MIN_SCORE: float = 0.55  # ...and the top-1 dense score is at least this high
 
     class Config:
 
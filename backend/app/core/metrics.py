@@ -0,0 +1,43 @@
+import threading
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry (counters and timing summaries).
+    Exposed to admins through GET /admin/metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    def incr(self, name: str, value: float = 1):
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Record an observation (e.g. a latency in ms) into a summary"""
+        with self._lock:
+            summary = self._summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def get(self, name: str, default: float = 0):
+        """Get the current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, default)
+
+    def snapshot(self) -> dict:
+        """Return a copy of all counters and summaries (with averages)"""
+        with self._lock:
+            summaries = {
+                name: {**s, "avg": round(s["sum"] / s["count"], 3) if s["count"] else 0.0}
+                for name, s in self._summaries.items()
+            }
+            return {"counters": dict(self._counters), "summaries": summaries}
+
+
+metrics = Metrics()
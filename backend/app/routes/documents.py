@@ -1,33 +1,26 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from app.services.ingest_service import ingest_service
-from supabase import create_client, Client
+from app.services.ingest_job_service import FAILED, ingest_job_service
+from app.services.supabase_service import supabase_service
+from app.services.text_extraction import SUPPORTED_TYPES
+from app.services.upload_service import spool_upload
 from app.core.config import settings
+from app.core.auth import AuthUser, extract_token, get_current_user
+from typing import List, Optional
+import asyncio
+import json
 import logging
+import os
+import uuid
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-
-async def get_current_user_id(authorization: str = Header(None)) -> str:
+async def get_current_user_id(user: AuthUser = Depends(get_current_user)) -> str:
     """Dependency to verify Supabase JWT token and get user ID"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-    
-    try:
-        # Expected format: "Bearer <token>"
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        
-        # Verify with Supabase
-        user_response = supabase.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        
-        return user_response.user.id
-    except Exception as e:
-        logger.error(f"Auth error: {e}")
-        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+    return user.id
 
 @router.post("/extract")
 async def extract_text(
@@ -42,62 +35,179 @@ async def extract_text(
         # We need to ensure text extraction works
         text = await ingest_service.extract_text_from_file(file)
         return {"filename": file.filename, "content": text}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error extracting text: {e}")
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
-@router.post("/upload")
-async def upload_document(
+@router.post("/extract/stream")
+async def extract_text_stream(
     file: UploadFile = File(...),
-    user_id: str = Depends(get_current_user_id),
-    authorization: str = Header(None)
+    max_chars: int = 0,
+    user_id: str = Depends(get_current_user_id)
 ):
     """
-    Upload a document (PDF, DOCX, TXT) for ingestion.
-    1. Uploads to Supabase Storage (documents bucket).
-    2. Ingests content into Qdrant.
+    Extract text page by page as NDJSON, one record per line:
+    {"type": "page", "page": n, "content": ...} as each page is cleaned, then
+    {"type": "done", "pages", "chars", "truncated", "cached"} or {"type": "error", "detail"}.
+    max_chars stops extraction early once that many characters were sent (0 = no limit).
+    Does NOT ingest into vector DB.
     """
-    try:
-        logger.info(f"User {user_id} uploading file: {file.filename}")
-        
-        # 1. Upload to Supabase Storage
-        # We need a service role client to bypass RLS if needed, or use the user's token
-        # For simplicity in this agentic context, we might skip the actual Supabase Storage upload 
-        # for now and just ingest, OR we try to upload if the bucket exists.
-        
-        # Let's try to upload to Supabase Storage "documents" bucket
+    _check_upload_type(file)
+    # Spooled before streaming: the UploadFile may be closed once this handler returns
+    upload = await spool_upload(file)
+
+    async def records():
+        try:
+            async for page in ingest_service.stream_pages(upload.path, file.filename, upload.sha256, max(max_chars, 0)):
+                if page.pop("done", False):
+                    yield json.dumps({"type": "done", **page}) + "\n"
+                else:
+                    yield json.dumps({"type": "page", **page}) + "\n"
+        except (ValueError, TimeoutError, MemoryError) as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming extraction of {file.filename}: {e}")
+            yield json.dumps({"type": "error", "detail": "Extraction failed"}) + "\n"
+        finally:
+            upload.remove()
+
+    # The background task also runs if the body is never iterated (e.g. the client went away)
+    return StreamingResponse(
+        records(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(upload.remove),
+    )
+
+def _check_upload_type(file: UploadFile):
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    if suffix not in SUPPORTED_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {suffix}")
+
+
+async def _accept_upload(file: UploadFile, user_id: str, token: Optional[str]) -> dict:
+    """Spool one upload, copy it to Supabase Storage and queue its ingestion job"""
+    logger.info(f"User {user_id} uploading file: {file.filename}")
+
+    # Spool the upload to disk once (size-limited, hashed while streaming);
+    # the same file feeds storage and the ingestion job, and survives restarts
+    job_id = str(uuid.uuid4())
+    upload = await spool_upload(file, ingest_job_service.spool_path(job_id, file.filename))
+
+    # 1. Upload to Supabase Storage "documents" bucket
+    if token:
         try:
-            token = authorization.split(" ")[1] if " " in authorization else authorization
-            user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-            user_supabase.auth.set_session(token, user_id)
-            
-            file_content = await file.read()
-            # Reset cursor for ingestion
-            await file.seek(0)
-            
-            # Check if bucket exists/upload
             file_path = f"{user_id}/{file.filename}"
-            user_supabase.storage.from_("documents").upload(
-                file_path,
-                file_content,
-                {"content-type": file.content_type, "x-upsert": "true"}
-            )
+
+            def upload_to_storage():
+                # Streamed from the spooled file rather than read into memory
+                with open(upload.path, "rb") as spooled:
+                    supabase_service.upload_file(
+                        "documents", file_path, spooled, file.content_type,
+                        token=token, upsert=True
+                    )
+
+            await asyncio.to_thread(upload_to_storage)
             logger.info(f"Uploaded {file.filename} to Supabase Storage")
             
         except Exception as e:
             logger.warning(f"Failed to upload to Supabase Storage (bucket might not exist): {e}")
             # Continue to ingestion anyway as that's the core requirement
-            await file.seek(0)
 
-        # 2. Ingest into Qdrant
-        result = await ingest_service.process_file(file, user_id)
-        
-        return result
-        
+    # 2. Queue ingestion into Qdrant
+    return await ingest_job_service.enqueue(
+        user_id, file.filename, upload.path, job_id=job_id, sha256=upload.sha256
+    )
+
+
+@router.post("/upload", status_code=202)
+async def upload_document(
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id),
+    authorization: str = Header(None)
+):
+    """
+    Upload a document (PDF, DOCX, TXT) for ingestion.
+    1. Uploads to Supabase Storage (documents bucket).
+    2. Queues ingestion into Qdrant and returns the job immediately
+       (poll GET /documents/jobs/{job_id} for progress).
+    """
+    _check_upload_type(file)
+    try:
+        return await _accept_upload(file, user_id, extract_token(authorization))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+
+@router.post("/upload/batch", status_code=202)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    user_id: str = Depends(get_current_user_id),
+    authorization: str = Header(None)
+):
+    """
+    Upload several documents at once. Each file gets its own ingestion job;
+    the jobs are extracted in parallel in the extraction process pool.
+    Files that are rejected (type, size) are reported without failing the batch.
+    """
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"Too many files (limit {settings.UPLOAD_BATCH_MAX_FILES} per batch)"
+        )
+    token = extract_token(authorization)
+
+    jobs, rejected = [], []
+    for file in files:
+        try:
+            _check_upload_type(file)
+            jobs.append(await _accept_upload(file, user_id, token))
+        except HTTPException as e:
+            rejected.append({"filename": file.filename, "error": e.detail})
+        except Exception as e:
+            logger.error(f"Error accepting {file.filename} in batch upload: {e}")
+            rejected.append({"filename": file.filename, "error": str(e)})
+
+    return {"jobs": jobs, "rejected": rejected}
+
+
+@router.get("/jobs")
+async def list_ingest_jobs(user_id: str = Depends(get_current_user_id), limit: int = 20):
+    """
+    Recent ingestion jobs for the user, newest first.
+    """
+    return {"jobs": await asyncio.to_thread(ingest_job_service.list_jobs, user_id, min(max(limit, 1), 100))}
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """
+    Status and progress of an ingestion job.
+    """
+    job = await asyncio.to_thread(ingest_job_service.get_job, job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_ingest_job(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """
+    Requeue a failed ingestion job.
+    """
+    job = await ingest_job_service.retry(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == FAILED:
+        # Failed for good, or its upload expired: only a new upload can be ingested
+        raise HTTPException(status_code=409, detail="This job cannot be retried; please upload the file again")
+    return job
+
+
 @router.get("/")
 async def list_documents(user_id: str = Depends(get_current_user_id)):
     """
@@ -141,6 +251,10 @@ async def list_documents(user_id: str = Depends(get_current_user_id)):
                         "type": payload.get("metadata", {}).get("type", "unknown")
                     }
                 files[source]["chunks"] += 1
+
+        # Uploads whose chunks all duplicate already indexed text own no points of their own
+        for source, chunks in ingest_service.list_uploads(user_id).items():
+            files.setdefault(source, {"name": source, "chunks": chunks, "type": "upload"})
         
         return {"documents": list(files.values())}
         
@@ -0,0 +1,239 @@
+"""
+Admin analytics service for KCA Connect AI
+Runs independent analytics queries concurrently and caches results with a
+short TTL plus stale-while-revalidate
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+
+def _first_row(rows) -> dict:
+    """RPCs returning TABLE come back as a list of rows"""
+    return rows[0] if isinstance(rows, list) and rows else {}
+
+
+def _format_duration(seconds: float) -> str:
+    """Format seconds as 'Xh Ym'"""
+    seconds = seconds or 0
+    return str(int(seconds // 3600)) + "h " + str(int((seconds % 3600) // 60)) + "m"
+
+
+class AnalyticsService:
+    def __init__(self):
+        self.ttl_seconds = settings.ANALYTICS_CACHE_TTL_SECONDS
+        self.stale_seconds = settings.ANALYTICS_CACHE_STALE_SECONDS
+        # key -> (value, fetched_at)
+        self._cache = {}
+        # key -> in-flight load, so concurrent requests share one query
+        self._inflight = {}
+        # Background refreshes; the event loop only keeps weak references to tasks
+        self._tasks = set()
+
+    async def _load(self, key: str, loader):
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(loader())
+        task = self._inflight[key]
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(key, None)
+        self._cache[key] = (value, time.monotonic())
+        return value
+
+    async def _background_refresh(self, key: str, loader):
+        try:
+            await self._load(key, loader)
+        except Exception as e:
+            logger.warning(f"Background refresh of analytics '{key}' failed: {e}")
+
+    async def _cached(self, key: str, loader):
+        """
+        Serve from cache when fresh; serve stale values (up to ANALYTICS_CACHE_STALE_SECONDS
+        past the TTL) while refreshing in the background; otherwise load and wait.
+        """
+        entry = self._cache.get(key)
+        if entry:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl_seconds:
+                metrics.incr("analytics.cache_hit")
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                metrics.incr("analytics.cache_stale")
+                if key not in self._inflight:
+                    task = asyncio.ensure_future(self._background_refresh(key, loader))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                return value
+        metrics.incr("analytics.cache_miss")
+        return await self._load(key, loader)
+
+    def invalidate(self):
+        """Drop all cached analytics (e.g. after user management changes)"""
+        self._cache.clear()
+
+    # ============ Queries ============
+
+    async def _rollup_daily(self, column: str, days: int) -> List[dict]:
+        """Read one per-day counter from the analytics_daily rollup (migration 007)"""
+        start_date = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+        rows = await supabase_service.aselect("analytics_daily", {
+            "select": f"day,{column}",
+            "day": f"gt.{start_date}",
+            column: "gt.0",
+            "order": "day.desc"
+        })
+        return [{"date": row["day"], "count": row[column]} for row in rows]
+
+    async def _overview(self) -> dict:
+        if settings.ANALYTICS_ROLLUPS:
+            total_users, rollup = await asyncio.gather(
+                supabase_service.arpc("get_total_users"),
+                supabase_service.arpc("get_rollup_overview", {"active_days": 30}),
+            )
+            rollup = _first_row(rollup)
+            return {
+                "total_users": total_users or 0,
+                "active_users_30d": rollup.get("active_users", 0),
+                "total_chats": rollup.get("total_chats", 0),
+                "total_messages": rollup.get("total_messages", 0),
+                "avg_session_duration": _format_duration(rollup.get("avg_session_seconds", 0))
+            }
+
+        total_users, active_users, chat_stats, avg_seconds = await asyncio.gather(
+            supabase_service.arpc("get_total_users"),
+            supabase_service.arpc("get_active_users", {"days": 30}),
+            supabase_service.arpc("get_chat_stats"),
+            supabase_service.arpc("get_avg_session_seconds"),
+        )
+        chat_stats = _first_row(chat_stats)
+        return {
+            "total_users": total_users or 0,
+            "active_users_30d": active_users or 0,
+            "total_chats": chat_stats.get("total", 0),
+            "total_messages": chat_stats.get("total_messages", 0),
+            "avg_session_duration": _format_duration(avg_seconds)
+        }
+
+    async def _user_stats(self) -> dict:
+        total, active, new_users = await asyncio.gather(
+            supabase_service.arpc("get_total_users"),
+            supabase_service.arpc("get_active_users", {"days": 30}),
+            supabase_service.arpc("get_new_users", {"days": 7}),
+        )
+        return {"total": total or 0, "active_30d": active or 0, "new_users_last_7d": new_users or 0}
+
+    async def _chat_stats(self) -> dict:
+        chat_stats = _first_row(await supabase_service.arpc("get_chat_stats"))
+        total_chats = chat_stats.get("total", 0)
+        total_messages = chat_stats.get("total_messages", 0)
+        avg_messages = total_messages / total_chats if total_chats > 0 else 0
+        return {
+            "total": total_chats,
+            "saved_chats": chat_stats.get("saved", 0),
+            "avg_messages_per_chat": round(avg_messages, 1)
+        }
+
+    async def _chats_daily(self, days: int) -> List[dict]:
+        if settings.ANALYTICS_ROLLUPS:
+            return await self._rollup_daily("chats_created", days)
+        rows = await supabase_service.arpc("get_chats_per_day", {"days": days}) or []
+        return [{"date": row["date"], "count": row["count"]} for row in rows]
+
+    async def _messages_daily(self, days: int) -> List[dict]:
+        if settings.ANALYTICS_ROLLUPS:
+            return await self._rollup_daily("messages", days)
+        rows = await supabase_service.arpc("get_messages_per_day", {"days": days}) or []
+        return [{"date": row["date"], "count": row["count"]} for row in rows]
+
+    async def _top_topics(self, limit: int) -> List[dict]:
+        rows = await supabase_service.arpc("get_top_chat_topics", {"limit_count": limit}) or []
+        return [{"title": row["title"], "count": row["count"]} for row in rows]
+
+    async def _engagement(self) -> dict:
+        stats = _first_row(await supabase_service.arpc("get_engagement_stats"))
+        return {
+            "avg_session_duration": _format_duration(stats.get("avg_session_seconds", 0)),
+            "avg_messages_per_user": round(stats.get("avg_messages_per_user") or 0, 1)
+        }
+
+    async def _system_health(self) -> dict:
+        from app.services.rag_service import rag_service
+
+        def collect():
+            # Qdrant client calls are blocking
+            try:
+                qdrant_collections = len(rag_service.client.get_collections().collections)
+            except Exception:
+                qdrant_collections = 0
+            try:
+                vector_count = rag_service.client.get_collection(settings.COLLECTION_NAME).vectors_count
+            except Exception:
+                vector_count = 0
+            return {"status": "healthy", "qdrant_collections": qdrant_collections, "rag_vectors": vector_count}
+
+        return await asyncio.to_thread(collect)
+
+    # ============ Cached Public API ============
+
+    async def overview(self) -> dict:
+        return await self._cached("overview", self._overview)
+
+    async def user_stats(self) -> dict:
+        return await self._cached("users", self._user_stats)
+
+    async def chat_stats(self) -> dict:
+        return await self._cached("chats", self._chat_stats)
+
+    async def chats_daily(self, days: int = 7) -> List[dict]:
+        return await self._cached(f"chats_daily:{days}", lambda: self._chats_daily(days))
+
+    async def messages_daily(self, days: int = 7) -> List[dict]:
+        return await self._cached(f"messages_daily:{days}", lambda: self._messages_daily(days))
+
+    async def top_topics(self, limit: int = 10) -> List[dict]:
+        return await self._cached(f"topics:{limit}", lambda: self._top_topics(limit))
+
+    async def engagement(self) -> dict:
+        return await self._cached("engagement", self._engagement)
+
+    async def system_health(self) -> dict:
+        return await self._cached("system", self._system_health)
+
+    async def dashboard(self, days: int = 7, topics_limit: int = 10) -> dict:
+        """
+        Everything the admin dashboard needs in one call, fetched concurrently.
+        A failing section is returned as null instead of failing the whole dashboard.
+        """
+        sections = {
+            "overview": self.overview(),
+            "users": self.user_stats(),
+            "chats": self.chat_stats(),
+            "chats_daily": self.chats_daily(days),
+            "messages_daily": self.messages_daily(days),
+            "topics": self.top_topics(topics_limit),
+            "engagement": self.engagement(),
+            "system": self.system_health(),
+        }
+        results = await asyncio.gather(*sections.values(), return_exceptions=True)
+        dashboard = {}
+        for name, result in zip(sections.keys(), results):
+            if isinstance(result, Exception):
+                logger.error(f"Error getting dashboard section '{name}': {result}")
+                result = None
+            dashboard[name] = result
+        return dashboard
+
+
+# Singleton instance
+analytics_service = AnalyticsService()
@@ -0,0 +1,167 @@
+"""
+Autosave coalescing for KCA Connect AI
+Buffers /auto-save calls per chat and writes only the latest state after a
+short debounce window, as soon as a submission completes a turn (ends with
+the assistant's answer), or on shutdown
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.chat_service import chat_service
+
+logger = logging.getLogger(__name__)
+
+
+class AutosaveService:
+    def __init__(self):
+        self.debounce_seconds = settings.AUTOSAVE_DEBOUNCE_SECONDS
+        self.max_delay_seconds = settings.AUTOSAVE_MAX_DELAY_SECONDS
+        # chat_id -> latest unsaved state
+        self._pending = {}
+        self._timers = {}
+        self._locks = {}
+        # (chat_id, user_id) pairs already written once by this process (ownership confirmed)
+        self._verified = OrderedDict()
+        # chat_id -> why its last buffered write failed, reported on the next save
+        self._errors = OrderedDict()
+
+    def is_verified(self, chat_id: str, user_id: str) -> bool:
+        return (chat_id, user_id) in self._verified
+
+    def mark_verified(self, chat_id: str, user_id: str):
+        self._verified[(chat_id, user_id)] = True
+        self._verified.move_to_end((chat_id, user_id))
+        while len(self._verified) > 10000:
+            self._verified.popitem(last=False)
+
+    def has_failed(self, chat_id: str) -> bool:
+        return chat_id in self._errors
+
+    def _record_error(self, chat_id: str, error: str):
+        self._errors[chat_id] = error
+        self._errors.move_to_end(chat_id)
+        while len(self._errors) > 10000:
+            self._errors.popitem(last=False)
+
+    @staticmethod
+    def _merge(entry: dict, messages: List[dict], offset: Optional[int]) -> bool:
+        """Merge a new submission into a pending entry. Returns False if they cannot be merged."""
+        offset = offset or 0
+        pending_offset = entry["offset"]
+        pending_end = pending_offset + len(entry["messages"])
+        if offset <= pending_offset:
+            # The new submission covers everything the pending one did
+            entry["messages"], entry["offset"] = messages, offset
+            return True
+        if offset <= pending_end:
+            entry["messages"] = entry["messages"][:offset - pending_offset] + messages
+            return True
+        return False
+
+    async def submit(self, chat_id: str, user_id: str, token: str, messages: List[dict],
+                     title: Optional[str] = None, offset: Optional[int] = None) -> bool:
+        """Buffer the latest state of a chat and (re)arm its debounce timer; True if it was written now"""
+        metrics.incr("autosave.submitted")
+        now = time.monotonic()
+        entry = self._pending.get(chat_id)
+
+        if entry and entry["user_id"] == user_id and self._merge(entry, messages, offset):
+            metrics.incr("autosave.coalesced")
+            entry["token"] = token
+            entry["title"] = title or entry["title"]
+            entry["last_at"] = now
+        else:
+            if entry:
+                await self.flush(chat_id)
+            self._pending[chat_id] = {
+                "user_id": user_id,
+                "token": token,
+                "title": title,
+                "messages": messages,
+                "offset": offset or 0,
+                "first_at": now,
+                "last_at": now,
+            }
+
+        if messages and messages[-1].get("role") != "user":
+            # The submission carries the answer, so the turn is complete: persist it now
+            # rather than after the debounce (the pending timer then finds nothing to do)
+            await self.flush(chat_id)
+            return True
+
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+        return False
+
+    async def _flush_later(self, chat_id: str):
+        """Wait until the chat has been quiet for the debounce window (or max delay elapsed), then flush"""
+        try:
+            while True:
+                entry = self._pending.get(chat_id)
+                if not entry:
+                    return
+                due = min(entry["last_at"] + self.debounce_seconds, entry["first_at"] + self.max_delay_seconds)
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+        finally:
+            self._timers.pop(chat_id, None)
+        await self.flush(chat_id)
+
+    async def flush(self, chat_id: str, user_id: Optional[str] = None):
+        """Write the pending state of a chat now (only if it belongs to user_id, when given)"""
+        entry = self._pending.get(chat_id)
+        if not entry or (user_id and entry["user_id"] != user_id):
+            return
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            entry = self._pending.pop(chat_id, None)
+            if not entry:
+                return
+            started = time.perf_counter()
+            try:
+                saved = await asyncio.to_thread(
+                    chat_service.save_messages,
+                    chat_id, entry["user_id"], entry["messages"], entry["token"],
+                    title=entry["title"], offset=entry["offset"] or None
+                )
+                if saved:
+                    self._errors.pop(chat_id, None)
+                else:
+                    logger.warning(f"Buffered autosave dropped: chat {chat_id} no longer exists")
+                    self._record_error(chat_id, "Chat not found")
+                metrics.incr("autosave.writes")
+            except Exception as e:
+                metrics.incr("autosave.flush_errors")
+                logger.error(f"Error flushing autosave for chat {chat_id}: {e}")
+                self._record_error(chat_id, str(e))
+            finally:
+                metrics.observe("autosave.flush_ms", (time.perf_counter() - started) * 1000)
+        if chat_id not in self._pending:
+            self._locks.pop(chat_id, None)
+
+    async def flush_now(self, chat_id: str, user_id: str) -> Optional[str]:
+        """Flush a chat and return why the write failed (None if it succeeded)"""
+        await self.flush(chat_id, user_id)
+        return self._errors.get(chat_id)
+
+    async def flush_all(self):
+        """Flush every buffered chat (called on shutdown)"""
+        for task in list(self._timers.values()):
+            task.cancel()
+        self._timers.clear()
+        pending = list(self._pending.keys())
+        if pending:
+            logger.info(f"Flushing {len(pending)} buffered autosaves")
+        await asyncio.gather(*(self.flush(chat_id) for chat_id in pending))
+
+
+# Singleton instance
+autosave_service = AutosaveService()
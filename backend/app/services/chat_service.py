@@ -0,0 +1,176 @@
+"""
+Chat storage service for KCA Connect AI
+Hides whether messages live in the chats.messages JSONB blob (CHAT_STORAGE_MODE=blob)
+or in the append-only chat_messages table (CHAT_STORAGE_MODE=messages)
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_COLUMNS = "seq,role,content,timestamp"
+# Rows per request when hydrating a page of chats (PostgREST caps responses at max-rows)
+HYDRATE_PAGE_SIZE = 1000
+
+
+def _to_message(row: dict) -> dict:
+    return {"role": row["role"], "content": row["content"], "timestamp": row.get("timestamp") or ""}
+
+
+class ChatService:
+    def __init__(self):
+        self.mode = settings.CHAT_STORAGE_MODE
+        # Last known stored message count per chat, so appends can send only the tail
+        self._known_counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def append_only(self) -> bool:
+        return self.mode == "messages"
+
+    def _remember_count(self, chat_id: str, count: int):
+        with self._lock:
+            self._known_counts[chat_id] = count
+            self._known_counts.move_to_end(chat_id)
+            while len(self._known_counts) > 10000:
+                self._known_counts.popitem(last=False)
+
+    def _known_count(self, chat_id: str) -> int:
+        with self._lock:
+            return self._known_counts.get(chat_id, 0)
+
+    def _forget_count(self, chat_id: str):
+        with self._lock:
+            self._known_counts.pop(chat_id, None)
+
+    def create_chat(self, user_id: str, title: str, messages: List[dict], token: str) -> Optional[dict]:
+        """Create a chat row (and its messages) and return the created row"""
+        chat_data = {
+            "user_id": user_id,
+            "title": title,
+            "messages": [] if self.append_only else messages,
+            "is_saved": False
+        }
+        rows = supabase_service.insert("chats", chat_data, token=token)
+        if not rows:
+            return None
+        chat = rows[0]
+        if self.append_only and messages:
+            self.save_messages(chat["id"], user_id, messages, token)
+            chat["messages"] = messages
+            chat["message_count"] = len(messages)
+        return chat
+
+    def save_messages(self, chat_id: str, user_id: str, messages: List[dict], token: str,
+                      title: Optional[str] = None, replace: bool = False,
+                      offset: Optional[int] = None) -> bool:
+        """
+        Persist a chat's messages. Returns False if the chat does not exist for this user.
+
+        messages is the full conversation, or only the messages from position
+        `offset` onwards when offset is given. In append-only mode only messages
+        not yet stored are sent; replace=True overwrites stored messages (PUT).
+        """
+        if not self.append_only:
+            if offset:
+                raise ValueError("Partial message updates require CHAT_STORAGE_MODE=messages")
+            update_data = {"messages": messages, "updated_at": datetime.utcnow().isoformat()}
+            if title is not None:
+                update_data["title"] = title
+            rows = supabase_service.update(
+                "chats", {"id": f"eq.{chat_id}", "user_id": f"eq.{user_id}"}, update_data, token=token
+            )
+            return bool(rows)
+
+        start = offset or 0
+        total = start + len(messages)
+        tail = messages
+        if not replace:
+            # Skip what we already know is stored; the RPC ignores any overlap
+            known = min(self._known_count(chat_id), total)
+            if known > start:
+                tail = messages[known - start:]
+
+        stored = self._append(chat_id, tail, total, title, replace, token)
+        if stored == -1:
+            # Fewer messages stored than we assumed (e.g. truncated by a PUT on another worker)
+            self._forget_count(chat_id)
+            if start:
+                raise ValueError("Stored conversation is shorter than message_offset; send the full conversation")
+            tail = messages
+            stored = self._append(chat_id, tail, total, title, replace, token)
+        if stored is None:
+            return False
+        self._remember_count(chat_id, stored)
+        return True
+
+    def _append(self, chat_id: str, messages: List[dict], total: int, title: Optional[str],
+                replace: bool, token: str) -> Optional[int]:
+        metrics.incr("chat.messages_appended", len(messages))
+        return supabase_service.rpc("append_chat_messages", {
+            "p_chat_id": chat_id,
+            "p_messages": messages,
+            "p_total": total,
+            "p_title": title,
+            "p_replace": replace,
+        }, token=token)
+
+    def list_messages(self, chat_id: str, token: str, limit: Optional[int] = None,
+                      before_seq: Optional[int] = None) -> List[dict]:
+        """
+        Messages of a chat in conversation order.
+        With limit, returns the `limit` messages before `before_seq` (newest page by default).
+        """
+        params = {"select": MESSAGE_COLUMNS, "chat_id": f"eq.{chat_id}", "order": "seq.desc"}
+        if before_seq is not None:
+            params["seq"] = f"lt.{before_seq}"
+        if limit:
+            params["limit"] = limit
+        rows = supabase_service.select("chat_messages", params, token=token)
+        rows.reverse()
+        return rows
+
+    def hydrate_messages(self, chat: dict, token: str, limit: Optional[int] = None) -> dict:
+        """Fill chat["messages"] from chat_messages when running append-only"""
+        if self.append_only and chat.get("message_count"):
+            rows = self.list_messages(chat["id"], token, limit=limit)
+            chat["messages"] = [_to_message(r) for r in rows]
+        elif limit:
+            # Legacy blob (not yet backfilled): page in memory
+            chat["messages"] = (chat.get("messages") or [])[-limit:]
+        return chat
+
+    def hydrate_many(self, chats: List[dict], token: str) -> List[dict]:
+        """hydrate_messages for a page of chats with one chat_id=in.(...) query instead of one per chat"""
+        pending = {chat["id"]: chat for chat in chats if self.append_only and chat.get("message_count")}
+        if not pending:
+            return chats
+        messages = {chat_id: [] for chat_id in pending}
+        offset = 0
+        while True:
+            rows = supabase_service.select("chat_messages", {
+                "select": "chat_id," + MESSAGE_COLUMNS,
+                "chat_id": f"in.({','.join(pending)})",
+                "order": "chat_id.asc,seq.asc",
+                "limit": HYDRATE_PAGE_SIZE,
+                "offset": offset,
+            }, token=token)
+            for r in rows:
+                messages[r["chat_id"]].append(_to_message(r))
+            if len(rows) < HYDRATE_PAGE_SIZE:
+                break
+            offset += HYDRATE_PAGE_SIZE
+        for chat_id, chat in pending.items():
+            chat["messages"] = messages[chat_id]
+        return chats
+
+
+# Singleton instance
+chat_service = ChatService()
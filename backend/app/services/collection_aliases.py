@@ -0,0 +1,149 @@
+"""
+Qdrant collection aliases for KCA Connect AI
+settings.COLLECTION_NAME is an alias for a versioned physical collection
+(e.g. kca_documents_20261019T120000). Search, ingestion and admin code
+always address the alias, so reindex.py can build a new collection in the
+background and switch every reader and writer to it in one atomic step
+"""
+import logging
+import time
+from typing import Optional
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.services.text_normalization import normalize_documents
+
+logger = logging.getLogger(__name__)
+
+_COPY_BATCH = 256
+
+UPLOAD_FILTER = models.Filter(
+    must=[models.FieldCondition(key="metadata.type", match=models.MatchValue(value="upload"))]
+)
+
+
+def versioned_name(alias: str) -> str:
+    """A new physical collection name for alias, e.g. kca_documents_20261019T120000"""
+    return f"{alias}_{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}"
+
+
+def resolve_alias(client: QdrantClient, alias: str) -> Optional[str]:
+    """The collection alias points at, or None if the alias does not exist"""
+    for entry in client.get_aliases().aliases:
+        if entry.alias_name == alias:
+            return entry.collection_name
+    return None
+
+
+def _physical_exists(client: QdrantClient, name: str) -> bool:
+    return name in [c.name for c in client.get_collections().collections]
+
+
+def collection_exists(client: QdrantClient, name: str) -> bool:
+    """True for an alias or a physical collection"""
+    return _physical_exists(client, name) or resolve_alias(client, name) is not None
+
+
+def create_collection(client: QdrantClient, name: str, vector_size: int = 384):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+    )
+
+
+def ensure_collection(client: QdrantClient, alias: str, vector_size: int = 384) -> str:
+    """
+    Make alias addressable, creating a versioned collection behind it if nothing exists yet.
+    A legacy physical collection with the alias's name is used as is (reindex.py migrates it).
+    Returns the physical collection name.
+    """
+    if _physical_exists(client, alias):
+        return alias
+    current = resolve_alias(client, alias)
+    if current:
+        return current
+    name = versioned_name(alias)
+    create_collection(client, name, vector_size)
+    swap_alias(client, alias, name)
+    logger.info(f"Created collection {name} behind alias {alias}")
+    return name
+
+
+def swap_alias(client: QdrantClient, alias: str, collection: str) -> Optional[str]:
+    """
+    Point alias at collection atomically; returns the collection it pointed at before.
+    A legacy physical collection named like the alias cannot coexist with the alias,
+    so it is deleted first (the only case with a brief gap, on the first migration).
+    """
+    previous = resolve_alias(client, alias)
+    operations = []
+    if previous:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    elif _physical_exists(client, alias):
+        logger.warning(f"Deleting legacy collection {alias} to replace it with an alias")
+        client.delete_collection(collection_name=alias)
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def scroll_uploads(client: QdrantClient, collection: str, with_vectors: bool):
+    """Every uploaded chunk in the collection"""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=UPLOAD_FILTER,
+            limit=_COPY_BATCH,
+            offset=offset,
+            with_payload=True,
+            with_vectors=with_vectors,
+        )
+        yield from points
+        if offset is None:
+            break
+
+
+def copy_uploads(client: QdrantClient, source: str, target: str, pipeline=None, reembed: bool = False,
+                 skip=frozenset()):
+    """
+    Copy the uploaded chunks of source that are not in skip into target, keeping their IDs
+    (so the upload manifest stays valid). With reembed, vectors are recomputed from the stored
+    text through pipeline (an EmbeddingPipeline writing to target).
+    Returns (ids copied, ids seen in source).
+    """
+    copied, seen, batch = set(), set(), []
+
+    def flush():
+        if not batch:
+            return
+        if reembed:
+            documents = normalize_documents([
+                Document(page_content=point.payload.get("page_content", ""),
+                         metadata=point.payload.get("metadata") or {})
+                for point in batch
+            ], unwrap_lines=False)
+            pipeline.run(documents, ids=[str(point.id) for point in batch])
+        else:
+            client.upsert(
+                collection_name=target,
+                points=[models.PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in batch],
+                wait=True,
+            )
+        batch.clear()
+
+    for point in scroll_uploads(client, source, with_vectors=not reembed):
+        point_id = str(point.id)
+        seen.add(point_id)
+        if point_id in skip:
+            continue
+        batch.append(point)
+        copied.add(point_id)
+        if len(batch) >= _COPY_BATCH:
+            flush()
+    flush()
+    return copied, seen
@@ -0,0 +1,207 @@
+"""
+Token-budgeted conversation memory for KCA Connect AI
+Recent turns go into the prompt verbatim (each message capped), older turns
+are folded into a rolling summary cached per chat and refreshed in the
+background after an answer, so one pasted document cannot inflate every
+later prompt and the history never grows without bound
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_TRUNCATED = " …[truncated]"
+
+
+def token_counter(chars_per_token: float = None) -> Callable[[str], int]:
+    """
+    Estimate tokens from length at MEMORY_CHARS_PER_TOKEN characters per token.
+    The answering LLM (Groq, Cerebras or Gemini) is not known up front and none of
+    their tokenizers is loaded locally, so the estimate is deliberately conservative:
+    English prose runs ~4 characters per token on these models, so 3 over-counts it by
+    about a third, which keeps denser text (code, numbers, Swahili) within the budget.
+    """
+    chars_per_token = chars_per_token or settings.MEMORY_CHARS_PER_TOKEN
+    return lambda text: int(len(text) / chars_per_token) + 1
+
+
+def _message_key(message: dict) -> str:
+    return hashlib.sha1(f"{message['role']}\0{message['content']}".encode("utf-8")).hexdigest()
+
+
+def _format(messages: List[dict]) -> str:
+    return "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in messages
+    )
+
+
+@dataclass
+class MemoryView:
+    """What of a conversation goes into the prompt"""
+    recent: List[dict]  # Newest messages, verbatim apart from per-message truncation
+    summary: str = ""  # Older messages, summarized
+    tokens: int = 0  # Tokens of text below
+    text: str = ""  # Ready to use as the prompt's history section
+    older: List[dict] = field(default_factory=list)  # Messages only represented by the summary
+    key: Optional[str] = None  # Summary cache key of the conversation
+
+
+@dataclass
+class _Summary:
+    text: str
+    covered: List[str]  # Keys of the messages folded into text, oldest first
+
+
+class ConversationMemory:
+    def __init__(self, count_tokens: Callable[[str], int],
+                 summarize: Optional[Callable[[str, List[dict]], Awaitable[str]]] = None):
+        """
+        count_tokens(text) -> int;
+        summarize(previous_summary, new_messages) -> updated summary (e.g. an LLM call).
+        Without summarize, older turns are condensed extractively.
+        """
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self._summaries = OrderedDict()
+        self._refreshing = set()
+        # The event loop only keeps weak references to tasks; hold them until they finish
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def _count(self, text: str) -> int:
+        return self.count_tokens(text)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._count(text)
+        if tokens <= max_tokens:
+            return text
+        # Characters in proportion to the token budget; close enough for prompt sizing
+        return text[:max(1, len(text) * max_tokens // tokens)].rstrip() + _TRUNCATED
+
+    @staticmethod
+    def _chat_key(chat_id: Optional[str], user_id: Optional[str]) -> Optional[str]:
+        # Summaries are only cached for identified chats, and never shared across users
+        return f"{user_id}:{chat_id}" if chat_id and user_id else None
+
+    def _cached_summary(self, key: Optional[str]) -> Optional[_Summary]:
+        if key is None:
+            return None
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def _extractive(self, messages: List[dict]) -> str:
+        """First sentence of each user message: a cheap stand-in for a summary"""
+        points = []
+        for msg in messages:
+            if msg["role"] == "user":
+                sentence = msg["content"].strip().split("\n")[0].split(". ")[0]
+                points.append(f"- {sentence[:200]}")
+        return "\n".join(points)
+
+    def build(self, history: Optional[list], chat_id: Optional[str] = None,
+              user_id: Optional[str] = None) -> MemoryView:
+        """Fit the conversation into MEMORY_TOKEN_BUDGET tokens"""
+        messages = [
+            {"role": msg.get("role", "user"), "content": str(msg.get("content", ""))}
+            for msg in (history or [])[-settings.MEMORY_MAX_MESSAGES:]
+            if str(msg.get("content", "")).strip()
+        ]
+        if not messages:
+            return MemoryView(recent=[])
+        key = self._chat_key(chat_id, user_id)
+
+        # What the prompt used to carry: the last 6 messages, verbatim
+        baseline = sum(self._count(msg["content"]) for msg in messages[-6:])
+
+        # 1. Newest messages first, until the verbatim budget is used up
+        recent, recent_tokens = [], 0
+        for msg in reversed(messages):
+            if len(recent) >= settings.MEMORY_RECENT_MESSAGES:
+                break
+            content = self._truncate(msg["content"], settings.MEMORY_MAX_MESSAGE_TOKENS)
+            tokens = self._count(content)
+            if recent and recent_tokens + tokens > settings.MEMORY_TOKEN_BUDGET - settings.MEMORY_SUMMARY_TOKENS:
+                break
+            recent.insert(0, {"role": msg["role"], "content": content})
+            recent_tokens += tokens
+        older = messages[:len(messages) - len(recent)]
+
+        # 2. Everything older is represented by the cached summary; messages it does not
+        # cover yet (it is refreshed after the answer) are condensed extractively meanwhile
+        summary = ""
+        if older:
+            cached = self._cached_summary(key)
+            covered = set(cached.covered) if cached else set()
+            uncovered = [msg for msg in older if _message_key(msg) not in covered]
+            parts = [cached.text] if cached and cached.text else []
+            if uncovered:
+                parts.append(self._extractive(uncovered))
+            summary = self._truncate("\n".join(part for part in parts if part), settings.MEMORY_SUMMARY_TOKENS)
+
+        text = _format(recent)
+        if summary:
+            text = f"Summary of earlier conversation:\n{summary}\n\nRecent messages:\n{text}"
+        tokens = recent_tokens + (self._count(summary) if summary else 0)
+
+        metrics.observe("memory.history_tokens", tokens)
+        if baseline > tokens:
+            metrics.incr("memory.tokens_saved", baseline - tokens)
+        return MemoryView(recent=recent, summary=summary, tokens=tokens, text=text, older=older, key=key)
+
+    async def refresh(self, view: MemoryView):
+        """Fold older messages the cached summary does not cover yet into it"""
+        if not view.older or self.summarize is None:
+            return
+        key = view.key
+        with self._lock:
+            if key is None or key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        try:
+            cached = self._cached_summary(key)
+            covered = list(cached.covered) if cached else []
+            covered_set = set(covered)
+            new_messages = [msg for msg in view.older if _message_key(msg) not in covered_set]
+            if not new_messages:
+                return
+            bounded = [
+                {"role": msg["role"], "content": self._truncate(msg["content"], settings.MEMORY_MAX_MESSAGE_TOKENS)}
+                for msg in new_messages
+            ]
+            text = await self.summarize(cached.text if cached else "", bounded)
+            text = self._truncate(text.strip(), settings.MEMORY_SUMMARY_TOKENS)
+            covered = (covered + [_message_key(msg) for msg in new_messages])[-settings.MEMORY_MAX_MESSAGES * 4:]
+            with self._lock:
+                self._summaries[key] = _Summary(text=text, covered=covered)
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > settings.MEMORY_CACHE_MAX_CHATS:
+                    self._summaries.popitem(last=False)
+            metrics.incr("memory.summaries")
+        except Exception as e:
+            logger.warning(f"Could not update conversation summary: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def schedule_refresh(self, view: MemoryView):
+        """Refresh the summary in the background once the answer has been produced"""
+        if not view.older or self.summarize is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.refresh(view))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,116 @@
+"""
+Batched embedding and upsert pipeline for KCA Connect AI ingestion
+Encodes chunks in fixed-size batches and upserts each batch to Qdrant in a
+small thread pool while the next batch is being encoded
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def create_qdrant_client(prefer_grpc: Optional[bool] = None) -> QdrantClient:
+    """Qdrant client for bulk writes (gRPC when QDRANT_PREFER_GRPC is set)"""
+    prefer_grpc = settings.QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc
+    return QdrantClient(
+        url=settings.QDRANT_URL,
+        api_key=settings.QDRANT_API_KEY or None,
+        prefer_grpc=prefer_grpc,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+    )
+
+
+class EmbeddingPipeline:
+    def __init__(self, embeddings, client: QdrantClient, collection_name: str,
+                 batch_size: Optional[int] = None, upsert_workers: Optional[int] = None):
+        self.embeddings = embeddings
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = max(batch_size or settings.INGEST_BATCH_SIZE, 1)
+        self.upsert_workers = max(upsert_workers or settings.INGEST_UPSERT_WORKERS, 1)
+
+    @staticmethod
+    def _points(documents: List[Document], vectors: List[List[float]], ids: List[str]) -> List[models.PointStruct]:
+        # Same payload layout as langchain_qdrant.QdrantVectorStore, so retrieval reads these points unchanged
+        return [
+            models.PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={"page_content": doc.page_content, "metadata": doc.metadata},
+            )
+            for doc, vector, point_id in zip(documents, vectors, ids)
+        ]
+
+    def _upsert(self, points: List[models.PointStruct]) -> float:
+        started = time.perf_counter()
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        return time.perf_counter() - started
+
+    def run(self, documents: List[Document], ids: Optional[List[str]] = None, on_progress=None) -> dict:
+        """
+        Embed and upsert documents. Returns throughput stats.
+        on_progress(done, total) is called after each batch is written.
+        """
+        total = len(documents)
+        ids = ids or [uuid.uuid4().hex for _ in documents]
+        stats = {"chunks": total, "batches": 0, "encode_seconds": 0.0, "upsert_seconds": 0.0}
+        if not total:
+            stats.update({"seconds": 0.0, "chunks_per_second": 0.0})
+            return stats
+
+        started = time.perf_counter()
+        done = 0
+        # Bound the number of encoded-but-unwritten batches held in memory
+        max_in_flight = self.upsert_workers * 2
+        in_flight = {}
+
+        def collect(futures):
+            nonlocal done
+            for future in futures:
+                size = in_flight.pop(future)
+                stats["upsert_seconds"] += future.result()
+                done += size
+                if on_progress:
+                    on_progress(done, total)
+
+        with ThreadPoolExecutor(max_workers=self.upsert_workers, thread_name_prefix="qdrant-upsert") as pool:
+            for start in range(0, total, self.batch_size):
+                batch = documents[start:start + self.batch_size]
+                encode_started = time.perf_counter()
+                vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+                stats["encode_seconds"] += time.perf_counter() - encode_started
+                stats["batches"] += 1
+
+                points = self._points(batch, vectors, ids[start:start + self.batch_size])
+                in_flight[pool.submit(self._upsert, points)] = len(batch)
+                if len(in_flight) >= max_in_flight:
+                    finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    collect(finished)
+
+            finished, _ = wait(list(in_flight))
+            collect(finished)
+
+        seconds = time.perf_counter() - started
+        stats["seconds"] = round(seconds, 3)
+        stats["encode_seconds"] = round(stats["encode_seconds"], 3)
+        stats["upsert_seconds"] = round(stats["upsert_seconds"], 3)
+        stats["chunks_per_second"] = round(total / seconds, 1) if seconds > 0 else 0.0
+
+        metrics.incr("ingest.chunks", total)
+        metrics.observe("ingest.chunks_per_second", stats["chunks_per_second"])
+        logger.info(
+            f"Embedded and upserted {total} chunks in {stats['seconds']}s "
+            f"({stats['chunks_per_second']} chunks/s, encode {stats['encode_seconds']}s, "
+            f"upsert {stats['upsert_seconds']}s over {self.upsert_workers} workers)"
+        )
+        return stats
@@ -0,0 +1,205 @@
+"""
+Content-addressed embedding store for KCA Connect AI
+Keeps every chunk vector ever computed, keyed by (model name, hash of the
+normalized chunk text), in an append-only matrix file that is memory-mapped
+for reads, so re-ingesting identical text costs disk I/O instead of inference
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_KEY_BYTES = 32  # sha256 digest
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalized_key(text: str) -> bytes:
+    """Hash of the text after Unicode (NFC) and whitespace normalization"""
+    text = _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    One directory per model and dtype:
+      meta.json    model name, dimension, dtype
+      vectors.bin  row-major matrix, one row per key (np.memmap)
+      keys.bin     32-byte keys, in row order
+    Rows are appended vectors-first, so a crash can only leave an unreferenced tail.
+    """
+
+    def __init__(self, root: str, model_name: str, dtype: str = "float16"):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        # The dtype is part of the directory so rows are never read back with another width
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(root, f"{safe_name}-{self.dtype.name}")
+        self.dim: Optional[int] = None
+        self._index = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._open()
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.bin")
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.path, "keys.bin")
+
+    def _open(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name or np.dtype(meta.get("dtype")) != self.dtype:
+            # e.g. two model names that sanitize to the same directory: move the old files
+            # aside, otherwise the next put_many would append to them under the new meta.json
+            stale = f"{self.path}.stale-{int(time.time())}"
+            logger.warning(f"Embedding store {self.path} was written for another model/dtype; moving it to {stale}")
+            os.replace(self.path, stale)
+            os.makedirs(self.path, exist_ok=True)
+            return
+        self.dim = meta["dim"]
+        self._refresh()
+        logger.info(f"Embedding store {self.path}: {len(self._index)} vectors")
+
+    def _committed_rows(self) -> int:
+        """Rows present in both files (keys are written last, so they bound the count)"""
+        row_bytes = self.dim * self.dtype.itemsize
+        key_rows = os.path.getsize(self._keys_path) // _KEY_BYTES if os.path.exists(self._keys_path) else 0
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        return min(key_rows, vector_rows)
+
+    def _refresh(self):
+        """Pick up rows appended since the last read (possibly by another process)"""
+        known = len(self._index)
+        rows = self._committed_rows()
+        if rows <= known:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(known * _KEY_BYTES)
+            keys = f.read((rows - known) * _KEY_BYTES)
+        for i in range(rows - known):
+            self._index[keys[i * _KEY_BYTES:(i + 1) * _KEY_BYTES]] = known + i
+        self._map(rows)
+
+    def _map(self, rows: int):
+        self._matrix = (
+            np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim)) if rows else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Stored vector for each text, or None where it has not been embedded yet"""
+        keys = [normalized_key(text) for text in texts]
+        with self._lock:
+            rows = [self._index.get(key) for key in keys]
+            matrix = self._matrix
+        return [
+            matrix[row].astype(np.float32).tolist() if row is not None else None
+            for row in rows
+        ]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Append vectors for texts not yet stored"""
+        if not texts:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(vectors[0])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name}, f)
+
+            with open(os.path.join(self.path, "write.lock"), "w") as lock_file:
+                if fcntl:
+                    # ingest.py and the API may append to the same store
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._refresh()
+
+                new_keys, new_vectors, seen = [], [], set()
+                for text, vector in zip(texts, vectors):
+                    key = normalized_key(text)
+                    if key not in self._index and key not in seen:
+                        seen.add(key)
+                        new_keys.append(key)
+                        new_vectors.append(vector)
+                if not new_keys:
+                    return
+
+                # Drop any tail left by an interrupted append so rows stay aligned
+                start = self._committed_rows()
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(start * self.dim * self.dtype.itemsize)
+                    f.write(np.asarray(new_vectors, dtype=self.dtype).tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.truncate(start * _KEY_BYTES)
+                    f.write(b"".join(new_keys))
+                for offset, key in enumerate(new_keys):
+                    self._index[key] = start + offset
+                self._map(len(self._index))
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings object: embed_documents reads from the store
+    and only encodes texts it has never seen. Queries are never cached.
+    """
+
+    def __init__(self, embeddings, store: EmbeddingStore):
+        self.embeddings = embeddings
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.store.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        metrics.incr("embedding_store.hits", len(texts) - len(missing))
+        metrics.incr("embedding_store.misses", len(missing))
+        if missing:
+            encoded = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.store.put_many([texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def with_embedding_store(embeddings, model_name: Optional[str] = None):
+    """Wrap embeddings with the on-disk store (unless EMBEDDING_STORE_DIR is empty)"""
+    if not settings.EMBEDDING_STORE_DIR:
+        return embeddings
+    store = EmbeddingStore(
+        settings.EMBEDDING_STORE_DIR, model_name or settings.EMBEDDING_MODEL, settings.EMBEDDING_STORE_DTYPE
+    )
+    return CachedEmbeddings(embeddings, store)
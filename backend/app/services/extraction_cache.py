@@ -0,0 +1,132 @@
+"""
+Extraction result cache for KCA Connect AI
+Extracted, cleaned pages keyed by the file's SHA-256, so attaching or
+uploading the same syllabus again skips parsing entirely. A bounded
+in-memory LRU sits in front of an optional on-disk tier that survives restarts
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.text_normalization import NORMALIZATION_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    def __init__(self, max_chars: int, directory: str = "", max_files: int = 0):
+        self.max_chars = max_chars
+        self.directory = directory
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _key(digest: str, suffix: str) -> str:
+        # The same bytes parse differently per loader, and cleaning rule changes invalidate everything
+        return f"{digest}{suffix.lower()}.v{NORMALIZATION_VERSION}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def _remember(self, key: str, pages: List[dict]):
+        size = sum(len(page["page_content"]) for page in pages)
+        if size > self.max_chars:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._chars -= self._entries.pop(key)[0]
+            self._entries[key] = (size, pages)
+            self._chars += size
+            while self._chars > self.max_chars:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._chars -= evicted
+
+    def _read_disk(self, key: str) -> Optional[List[dict]]:
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                pages = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable extraction cache entry {path}: {e}")
+            os.remove(path)
+            return None
+        # Touch it so pruning removes the least recently used files first
+        os.utime(path)
+        return pages
+
+    def _write_disk(self, key: str, pages: List[dict]):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(pages, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        if self.max_files:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        entries = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith(".json.gz")
+        ]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda path: os.path.getmtime(path))
+        for path in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, digest: str, suffix: str) -> Optional[List[Document]]:
+        """Cached pages for this file content, as fresh Documents (callers may modify them)"""
+        key = self._key(digest, suffix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+        if entry:
+            metrics.incr("extraction.cache_hits")
+            pages = entry[1]
+        else:
+            pages = self._read_disk(key)
+            if pages is None:
+                metrics.incr("extraction.cache_misses")
+                return None
+            metrics.incr("extraction.cache_disk_hits")
+            self._remember(key, pages)
+        return [Document(page_content=page["page_content"], metadata=dict(page["metadata"])) for page in pages]
+
+    def put(self, digest: str, suffix: str, documents: List[Document]):
+        key = self._key(digest, suffix)
+        pages = [{"page_content": doc.page_content, "metadata": dict(doc.metadata)} for doc in documents]
+        self._remember(key, pages)
+        if self.directory:
+            try:
+                self._write_disk(key, pages)
+            except (OSError, TypeError, ValueError) as e:
+                # A page with unserializable metadata just stays memory-only
+                logger.warning(f"Could not persist extraction cache entry {key}: {e}")
+
+
+# Singleton instance
+extraction_cache = ExtractionCache(
+    settings.EXTRACTION_CACHE_MAX_CHARS,
+    settings.EXTRACTION_CACHE_DIR,
+    settings.EXTRACTION_CACHE_MAX_FILES,
+)
@@ -0,0 +1,190 @@
+"""
+Process pool for document extraction in KCA Connect AI
+PDF/DOCX parsing and text cleaning are CPU-bound; running them in separate
+processes keeps them off the GIL of the API process and lets several files
+be extracted in parallel
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from queue import Empty
+from typing import AsyncIterator, List, Optional
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services import text_extraction
+from app.services.extraction_cache import extraction_cache
+
+logger = logging.getLogger(__name__)
+
+_STREAM_BUFFER_PAGES = 4  # Pages a streaming worker may run ahead of the consumer
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (honours container cpusets, unlike os.cpu_count)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+class ExtractionPool:
+    def __init__(self):
+        self.workers = settings.EXTRACTION_WORKERS or _available_cpus()
+        self.timeout_seconds = settings.EXTRACTION_TIMEOUT_SECONDS
+        self.memory_limit_bytes = settings.EXTRACTION_MEMORY_LIMIT_MB * 1024 * 1024
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+
+    @staticmethod
+    def _context():
+        # Never fork the API process (model weights, threads); forkserver also
+        # avoids re-importing the app's main module in every worker
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context(),
+                initializer=text_extraction.init_worker,
+                initargs=(self.memory_limit_bytes,),
+            )
+        return self._pool
+
+    def _get_manager(self):
+        """Manager process hosting the queues streaming workers send pages through (blocking)"""
+        if self._manager is None:
+            self._manager = self._context().Manager()
+        return self._manager
+
+    def _reset_pool(self):
+        pool, self._pool = self._pool, None
+        if pool:
+            # shutdown() alone waits for running tasks, so a hung worker would live on;
+            # terminate the workers (other in-flight files fail and can be retried)
+            processes = list((pool._processes or {}).values())
+            pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+    async def extract(self, path: str, filename: str, digest: Optional[str] = None) -> List[Document]:
+        """
+        Load and clean one file in a worker process.
+        With the file's SHA-256 (digest), previously extracted content is served from the cache.
+        Raises ValueError (unsupported type), TimeoutError or MemoryError.
+        """
+        suffix = os.path.splitext(filename)[1]
+        if digest:
+            cached = await asyncio.to_thread(extraction_cache.get, digest, suffix)
+            if cached is not None:
+                return cached
+
+        loop = asyncio.get_running_loop()
+        try:
+            # The worker interrupts itself at the timeout; the outer wait is only a backstop
+            pages = await asyncio.wait_for(
+                loop.run_in_executor(
+                    self._get_pool(), text_extraction.extract_pages, path, suffix, self.timeout_seconds
+                ),
+                timeout=self.timeout_seconds + 10 if self.timeout_seconds else None,
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next file
+            metrics.incr("extraction.worker_crashes")
+            self._reset_pool()
+            raise MemoryError(f"Extraction worker crashed while processing {filename}")
+        except asyncio.TimeoutError:
+            # The worker is stuck outside Python; replace the pool to reclaim it
+            metrics.incr("extraction.timeouts")
+            self._reset_pool()
+            raise TimeoutError(f"Extraction of {filename} timed out")
+        metrics.incr("extraction.files")
+        documents = [Document(page_content=page["page_content"], metadata=page["metadata"]) for page in pages]
+        if digest:
+            await asyncio.to_thread(extraction_cache.put, digest, suffix, documents)
+        return documents
+
+    @staticmethod
+    def _next_page(queue, future, deadline: Optional[float]) -> Optional[dict]:
+        """Next page from a streaming worker, None at the end (blocking); TimeoutError past the deadline"""
+        while True:
+            try:
+                return queue.get(timeout=1.0)
+            except Empty:
+                if future.done():
+                    return None  # The worker died before sending its end marker
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError
+
+    @staticmethod
+    def _drain(queue, future, deadline: Optional[float]):
+        """Discard pages until a stopped worker sends its end marker (blocking)"""
+        while True:
+            try:
+                if queue.get(timeout=1.0) is None:
+                    return
+            except Empty:
+                if future.done() or (deadline and time.monotonic() > deadline):
+                    return
+
+    async def stream(self, path: str, filename: str) -> AsyncIterator[dict]:
+        """
+        Load and clean one file page by page in a worker process, yielding
+        {"page_content", "metadata"} as each page is ready. Closing the generator
+        early stops the worker after its current page.
+        Raises ValueError (unsupported type), TimeoutError or MemoryError.
+        """
+        suffix = os.path.splitext(filename)[1]
+        manager = await asyncio.to_thread(self._get_manager)
+        queue, stop = manager.Queue(maxsize=_STREAM_BUFFER_PAGES), manager.Event()
+        future = self._get_pool().submit(
+            text_extraction.stream_pages, path, suffix, queue, stop, self.timeout_seconds
+        )
+        # The worker interrupts itself at the timeout; this deadline is only a backstop
+        deadline = time.monotonic() + self.timeout_seconds + 10 if self.timeout_seconds else None
+        finished = False
+        try:
+            while True:
+                try:
+                    page = await asyncio.to_thread(self._next_page, queue, future, deadline)
+                except TimeoutError:
+                    # The worker is stuck outside Python; replace the pool to reclaim it
+                    metrics.incr("extraction.timeouts")
+                    self._reset_pool()
+                    raise TimeoutError(f"Extraction of {filename} timed out")
+                if page is None:
+                    break
+                yield page
+            finished = True
+            # Re-raises the worker's error, if any
+            await asyncio.wrap_future(future)
+            metrics.incr("extraction.files")
+        except BrokenProcessPool:
+            metrics.incr("extraction.worker_crashes")
+            self._reset_pool()
+            raise MemoryError(f"Extraction worker crashed while processing {filename}")
+        finally:
+            if not finished:
+                stop.set()
+                await asyncio.to_thread(self._drain, queue, future, deadline)
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._manager:
+            self._manager.shutdown()
+            self._manager = None
+
+
+# Singleton instance
+extraction_pool = ExtractionPool()
@@ -0,0 +1,381 @@
+"""
+Incremental, idempotent indexing for KCA Connect AI
+Chunks get deterministic UUIDv5 point IDs derived from their content, and a
+JSON manifest records what is indexed, so only new or changed chunks are
+embedded, chunks that disappeared are deleted and near-duplicates of
+already indexed chunks are skipped
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from qdrant_client.http import models
+
+from app.core.metrics import metrics
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.near_duplicates import NearDuplicateIndex, simhash
+from app.services.text_normalization import NORMALIZATION_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Fixed namespace: the same (scope, chunk) always maps to the same point ID
+POINT_NAMESPACE = uuid.UUID("0165250e-c126-5bd6-a4d6-1a8076dfeac1")
+
+MANIFEST_VERSION = 1
+_QDRANT_BATCH = 256
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    What is indexed, per scope (a corpus file or a user's upload):
+    {scope: {"file_hash": ..., "chunks": {point_id: {"hash": ..., "meta": ..., "simhash": ...}}}}
+    Near-duplicate chunks have no point; their entry records "duplicate_of" instead of "meta".
+    """
+
+    def __init__(self, path: str, collection_name: str, embedding_model: str):
+        self.path = path
+        self.header = {
+            "version": MANIFEST_VERSION,
+            "collection": collection_name,
+            "embedding_model": embedding_model,
+            "normalization": NORMALIZATION_VERSION,
+        }
+        self._lock = threading.RLock()
+        self._scopes = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ingest manifest {self.path}: {e}")
+            return {}
+        if any(data.get(k) != self.header[k] for k in ("version", "collection", "embedding_model")):
+            # Different collection or embedding model: nothing recorded applies
+            logger.info(f"Ingest manifest {self.path} is for another collection/model; starting fresh")
+            return {}
+        scopes = data.get("scopes", {})
+        if data.get("normalization") != NORMALIZATION_VERSION:
+            # Cleaning rules changed: keep the entries (so superseded points get deleted)
+            # but re-sync every file, which re-embeds the chunks whose text changed
+            logger.info(f"Ingest manifest {self.path} predates normalization v{NORMALIZATION_VERSION}; re-syncing all files")
+            for entry in scopes.values():
+                entry["file_hash"] = None
+        return scopes
+
+    def get(self, scope: str) -> dict:
+        with self._lock:
+            return self._scopes.get(scope, {"file_hash": None, "chunks": {}})
+
+    def set(self, scope: str, entry: dict):
+        with self._lock:
+            self._scopes[scope] = entry
+
+    def remove(self, scope: str):
+        with self._lock:
+            self._scopes.pop(scope, None)
+
+    def scopes(self) -> List[str]:
+        with self._lock:
+            return list(self._scopes)
+
+    def save(self):
+        """Write atomically so a crash never leaves a half-written manifest"""
+        with self._lock:
+            data = dict(self.header, scopes=self._scopes)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+
+class IncrementalIndexer:
+    def __init__(self, pipeline: EmbeddingPipeline, manifest: IngestManifest,
+                 dedup_distance: Optional[int] = None, dedup_group=None, owner_metadata=None,
+                 reference_manifests=None, dependent_manifests=None):
+        """
+        dedup_distance: SimHash Hamming threshold for near-duplicate chunks (None disables);
+        dedup_group(scope): scopes with the same group are deduplicated against each other;
+        owner_metadata(scope): metadata identifying a scope's chunks, written to points
+        handed over to it. Without it, new owners are listed in invalidated for re-syncing.
+        reference_manifests(): manifests of other indexers on the same collection (read
+        only) whose chunks new chunks are also deduplicated against;
+        dependent_manifests(): manifests of other indexers whose chunks may link to this
+        indexer's points. Linked points are kept when released here; the dependent
+        indexer deletes them once nothing links to them any more.
+        """
+        self.pipeline = pipeline
+        self.manifest = manifest
+        self.client = pipeline.client
+        self.collection_name = pipeline.collection_name
+        self.dedup_distance = dedup_distance
+        self.dedup_group = dedup_group or (lambda scope: "")
+        self.owner_metadata = owner_metadata
+        self.reference_manifests = reference_manifests or (lambda: [])
+        self.dependent_manifests = dependent_manifests or (lambda: [])
+        # Scopes whose manifest entry was changed by another scope's sync and need re-syncing
+        self.invalidated = set()
+        # Syncs within a dedup group read and rewrite each other's manifest entries
+        self._group_locks = defaultdict(threading.Lock)
+        self._group_locks_guard = threading.Lock()
+
+    def _group_lock(self, scope: str) -> threading.Lock:
+        with self._group_locks_guard:
+            return self._group_locks[self.dedup_group(scope)]
+
+    @staticmethod
+    def point_id(scope: str, chunk_hash: str, occurrence: int = 0) -> str:
+        # occurrence disambiguates identical chunks within one scope
+        return str(uuid.uuid5(POINT_NAMESPACE, f"{scope}/{chunk_hash}/{occurrence}"))
+
+    def _present(self, ids: List[str]) -> set:
+        """Which of these point IDs actually exist in the collection (survives wipes)"""
+        present = set()
+        for start in range(0, len(ids), _QDRANT_BATCH):
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids[start:start + _QDRANT_BATCH],
+                with_payload=False,
+                with_vectors=False,
+            )
+            present.update(str(point.id) for point in points)
+        return present
+
+    def is_current(self, scope: str, digest: str) -> bool:
+        """True if the file was indexed with this exact content and all its points still exist"""
+        entry = self.manifest.get(scope)
+        if entry["file_hash"] != digest:
+            return False
+        # Duplicates have no point of their own; their canonical point must exist instead
+        ids = list({chunk.get("duplicate_of", point_id) for point_id, chunk in entry["chunks"].items()})
+        return len(self._present(ids)) == len(ids)
+
+    @staticmethod
+    def _points(manifests: List[IngestManifest]):
+        """(point IDs owned, canonical point IDs linked to) across every scope of these manifests"""
+        owned, linked = set(), set()
+        for manifest in manifests:
+            for scope in manifest.scopes():
+                for point_id, chunk in manifest.get(scope)["chunks"].items():
+                    if "duplicate_of" in chunk:
+                        linked.add(chunk["duplicate_of"])
+                    else:
+                        owned.add(point_id)
+        return owned, linked
+
+    def _dedup_index(self, scope: str, references: List[IngestManifest]) -> NearDuplicateIndex:
+        """Index of the points owned by other scopes in the same dedup group and by references"""
+        index = NearDuplicateIndex(self.dedup_distance)
+        group = self.dedup_group(scope)
+        for manifest in [self.manifest] + references:
+            for other in manifest.scopes():
+                if manifest is self.manifest and (other == scope or self.dedup_group(other) != group):
+                    continue
+                for point_id, chunk in manifest.get(other)["chunks"].items():
+                    if "duplicate_of" not in chunk:
+                        index.add(point_id, chunk["hash"], chunk.get("simhash"))
+        return index
+
+    def _release(self, scope: str, point_ids: List[str]) -> List[str]:
+        """
+        Points of scope that are going away. Points other scopes link to as their
+        canonical copy are handed to the first such scope instead of being deleted,
+        and points dependent manifests link to are kept.
+        Returns the IDs that can actually be deleted.
+        """
+        releasing = set(point_ids)
+        dependents = defaultdict(list)
+        for other in self.manifest.scopes():
+            if other == scope:
+                continue
+            for point_id, chunk in self.manifest.get(other)["chunks"].items():
+                if chunk.get("duplicate_of") in releasing:
+                    dependents[chunk["duplicate_of"]].append((other, point_id))
+
+        owners = {}
+        for canonical, links in dependents.items():
+            new_scope, dependent_id = links[0]
+            entry = self.manifest.get(new_scope)
+            dependent = entry["chunks"].pop(dependent_id)
+            # meta=None forces a payload rewrite when the new owner is next synced
+            entry["chunks"][canonical] = {"hash": dependent["hash"], "meta": None, "simhash": dependent.get("simhash")}
+            entry["file_hash"] = None
+            self.manifest.set(new_scope, entry)
+            owners[canonical] = new_scope
+        if owners and self.owner_metadata:
+            self._reassign(owners)
+        else:
+            self.invalidated.update(owners.values())
+        _, external = self._points(self.dependent_manifests())
+        kept = [point_id for point_id in point_ids if point_id not in dependents and point_id in external]
+        if kept:
+            logger.info(f"Keeping {len(kept)} points of {scope} that other indexes link to")
+        return [point_id for point_id in point_ids if point_id not in dependents and point_id not in external]
+
+    def _unlink(self, canonicals: set, references: List[IngestManifest]) -> List[str]:
+        """
+        Delete canonical points no longer linked to that no manifest owns (points a
+        reference indexer kept for us after releasing them). Call after the manifest is updated.
+        """
+        if not canonicals:
+            return []
+        owned, linked = self._points([self.manifest] + references)
+        orphans = [point_id for point_id in canonicals if point_id not in owned and point_id not in linked]
+        self._delete(orphans)
+        return orphans
+
+    def _reassign(self, owners: dict):
+        """Stamp handed-over points ({point_id: new scope}) with their new owner's metadata"""
+        point_ids = list(owners)
+        for start in range(0, len(point_ids), _QDRANT_BATCH):
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=point_ids[start:start + _QDRANT_BATCH],
+                with_payload=True,
+                with_vectors=False,
+            )
+            operations = []
+            for point in points:
+                payload = point.payload or {}
+                metadata = dict(payload.get("metadata") or {}, **self.owner_metadata(owners[str(point.id)]))
+                operations.append(models.OverwritePayloadOperation(
+                    overwrite_payload=models.SetPayload(payload=dict(payload, metadata=metadata), points=[point.id])
+                ))
+            if operations:
+                self.client.batch_update_points(collection_name=self.collection_name, update_operations=operations)
+
+    def _delete(self, point_ids: List[str]):
+        for start in range(0, len(point_ids), _QDRANT_BATCH):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=point_ids[start:start + _QDRANT_BATCH]),
+            )
+
+    def sync(self, scope: str, documents: List[Document], digest: Optional[str] = None,
+             force: bool = False, on_progress=None) -> dict:
+        """
+        Make the collection hold exactly these chunks for scope.
+        Embeds new/changed chunks, rewrites payloads whose metadata changed,
+        deletes chunks that are gone and skips near-duplicates of chunks already
+        indexed (recording the canonical point instead). force=True re-embeds everything.
+        """
+        with self._group_lock(scope):
+            return self._sync(scope, documents, digest, force, on_progress)
+
+    def _sync(self, scope: str, documents: List[Document], digest: Optional[str],
+              force: bool, on_progress) -> dict:
+        self.invalidated.discard(scope)
+        previous = self.manifest.get(scope)["chunks"]
+        owned_previous = [point_id for point_id, chunk in previous.items() if "duplicate_of" not in chunk]
+        present = self._present(owned_previous) if owned_previous else set()
+        references = self.reference_manifests()
+        index = self._dedup_index(scope, references) if self.dedup_distance is not None else None
+
+        chunks = {}
+        docs = {}
+        occurrences = defaultdict(int)
+        for doc in documents:
+            chunk_hash = content_hash(doc.page_content)
+            point_id = self.point_id(scope, chunk_hash, occurrences[chunk_hash])
+            occurrences[chunk_hash] += 1
+            signature = simhash(doc.page_content) if index is not None else None
+
+            # Chunks already stored stay where they are; new ones may link to a canonical point
+            canonical = None
+            if index is not None and point_id not in present:
+                canonical = index.find(chunk_hash, signature)
+            if canonical:
+                chunks[point_id] = {"hash": chunk_hash, "simhash": signature, "duplicate_of": canonical}
+                continue
+
+            doc.metadata.pop("chunk_hash", None)
+            meta_hash = content_hash(json.dumps(doc.metadata, sort_keys=True, default=str))
+            doc.metadata["chunk_hash"] = chunk_hash
+            chunks[point_id] = {"hash": chunk_hash, "meta": meta_hash, "simhash": signature}
+            docs[point_id] = doc
+            if index is not None:
+                index.add(point_id, chunk_hash, signature)
+
+        to_embed, to_repayload = [], []
+        for point_id, doc in docs.items():
+            if force or point_id not in present:
+                to_embed.append(point_id)
+            elif previous[point_id].get("meta") != chunks[point_id]["meta"]:
+                to_repayload.append(point_id)
+        to_delete = self._release(scope, [point_id for point_id in present if point_id not in docs])
+
+        stats = self.pipeline.run([docs[point_id] for point_id in to_embed], ids=to_embed, on_progress=on_progress)
+
+        for start in range(0, len(to_repayload), _QDRANT_BATCH):
+            operations = []
+            for point_id in to_repayload[start:start + _QDRANT_BATCH]:
+                doc = docs[point_id]
+                operations.append(models.OverwritePayloadOperation(
+                    overwrite_payload=models.SetPayload(
+                        payload={"page_content": doc.page_content, "metadata": doc.metadata},
+                        points=[point_id],
+                    )
+                ))
+            self.client.batch_update_points(collection_name=self.collection_name, update_operations=operations)
+
+        self._delete(to_delete)
+
+        self.manifest.set(scope, {"file_hash": digest, "chunks": chunks})
+        self.manifest.save()
+        dropped = ({chunk["duplicate_of"] for chunk in previous.values() if "duplicate_of" in chunk}
+                   - {chunk["duplicate_of"] for chunk in chunks.values() if "duplicate_of" in chunk})
+        to_delete += self._unlink(dropped, references)
+
+        duplicates = len(chunks) - len(docs)
+        if duplicates:
+            metrics.incr("ingest.duplicates", duplicates)
+        stats.update({
+            "chunks": len(chunks),
+            "embedded": len(to_embed),
+            "updated": len(to_repayload),
+            "deleted": len(to_delete),
+            "duplicates": duplicates,
+            "dedup_ratio": round(duplicates / len(chunks), 3) if chunks else 0.0,
+            "unchanged": len(docs) - len(to_embed) - len(to_repayload),
+        })
+        return stats
+
+    def remove(self, scope: str) -> int:
+        """Delete every point recorded for scope (e.g. a corpus file that was removed)"""
+        with self._group_lock(scope):
+            return self._remove(scope)
+
+    def _remove(self, scope: str) -> int:
+        chunks = self.manifest.get(scope)["chunks"]
+        owned = [point_id for point_id, chunk in chunks.items() if "duplicate_of" not in chunk]
+        to_delete = self._release(scope, owned)
+        self._delete(to_delete)
+        self.manifest.remove(scope)
+        self.manifest.save()
+        links = {chunk["duplicate_of"] for chunk in chunks.values() if "duplicate_of" in chunk}
+        to_delete += self._unlink(links, self.reference_manifests())
+        return len(to_delete)
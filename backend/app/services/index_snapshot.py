@@ -0,0 +1,232 @@
+"""
+Prebuilt index snapshots for KCA Connect AI
+A snapshot is a zip bundled with the build holding the corpus collection
+(vectors, payloads), its ingest manifest and a fingerprint of the embedding
+model. A fresh deployment restores it in seconds instead of loading the model
+and re-embedding the whole corpus
+"""
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from typing import Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.core.config import settings
+from app.services.collection_aliases import (
+    copy_uploads, create_collection, resolve_alias, swap_alias, versioned_name
+)
+from app.services.incremental_index import file_hash
+from app.services.text_normalization import NORMALIZATION_VERSION
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+_BATCH = 512
+_PROBE_TEXT = "KCA University admission requirements and fees"
+
+UPLOAD_CONDITION = models.FieldCondition(key="metadata.type", match=models.MatchValue(value="upload"))
+
+
+def corpus_hash(corpus_dir: Optional[str] = None) -> Optional[str]:
+    """Hash of the corpus files (names and contents) and cleaning rules; None if the corpus is absent"""
+    paths = sorted(glob.glob(os.path.join(corpus_dir or settings.CORPUS_DIR, "*.txt")))
+    if not paths:
+        return None
+    digest = hashlib.sha256(f"normalization:{NORMALIZATION_VERSION}".encode("utf-8"))
+    for path in paths:
+        digest.update(f"\n{os.path.basename(path)}:{file_hash(path)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def model_fingerprint(embeddings) -> dict:
+    """Model name, dimension and a probe vector that identifies the weights"""
+    probe = embeddings.embed_query(_PROBE_TEXT)
+    return {"model": settings.EMBEDDING_MODEL, "dim": len(probe), "probe": [round(x, 6) for x in probe]}
+
+
+def _same_model(fingerprint: dict, embeddings) -> bool:
+    if fingerprint.get("model") != settings.EMBEDDING_MODEL:
+        return False
+    if embeddings is None or not fingerprint.get("probe"):
+        return True
+    probe = np.asarray(embeddings.embed_query(_PROBE_TEXT), dtype=np.float32)
+    stored = np.asarray(fingerprint["probe"], dtype=np.float32)
+    if probe.shape != stored.shape:
+        return False
+    cosine = float(probe @ stored / (np.linalg.norm(probe) * np.linalg.norm(stored) or 1.0))
+    return cosine >= 0.999
+
+
+def export_snapshot(client: QdrantClient, path: str, embeddings, include_uploads: bool = False,
+                    dtype: str = "float16") -> dict:
+    """Write the collection behind COLLECTION_NAME to a snapshot file; returns its header"""
+    ids, payloads, vectors = [], [], []
+    scroll_filter = None if include_uploads else models.Filter(must_not=[UPLOAD_CONDITION])
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.COLLECTION_NAME,
+            scroll_filter=scroll_filter,
+            limit=_BATCH,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            ids.append(str(point.id))
+            payloads.append(point.payload)
+            vectors.append(point.vector)
+        if offset is None:
+            break
+
+    fingerprint = model_fingerprint(embeddings)
+    matrix = np.asarray(vectors, dtype=dtype).reshape(len(vectors), fingerprint["dim"])
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "points": len(ids),
+        "includes_uploads": include_uploads,
+        "corpus_hash": corpus_hash(),
+        "fingerprint": fingerprint,
+    }
+
+    tmp_path = path + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("header.json", json.dumps(header))
+        archive.writestr("ids.json", json.dumps(ids))
+        archive.writestr("payloads.jsonl", "\n".join(json.dumps(payload, default=str) for payload in payloads))
+        buffer = io.BytesIO()
+        np.save(buffer, matrix)
+        archive.writestr("vectors.npy", buffer.getvalue())
+        manifests = [("manifest.json", settings.INGEST_MANIFEST_PATH)]
+        if include_uploads:
+            manifests.append(("upload_manifest.json", settings.INGEST_UPLOAD_MANIFEST_PATH))
+        for name, manifest_path in manifests:
+            if os.path.exists(manifest_path):
+                archive.write(manifest_path, name)
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path: str) -> dict:
+    with zipfile.ZipFile(path) as archive:
+        return json.loads(archive.read("header.json"))
+
+
+def restore_snapshot(client: QdrantClient, path: str, embeddings=None, force: bool = False) -> dict:
+    """
+    Make COLLECTION_NAME serve the snapshot. If it already holds at least the snapshot's
+    points it is only verified, unless force. Otherwise the snapshot is loaded into a new
+    versioned collection, the users' uploaded chunks are copied over from the live
+    collection and the alias is switched to it.
+    Returns {"status": "verified" | "restored", "points", "uploads", "seconds", "stale"}; stale
+    means the corpus on disk differs from the snapshot (ingest.py then re-embeds only what changed).
+    Raises ValueError if the snapshot was built with another embedding model.
+    """
+    started = time.perf_counter()
+    with zipfile.ZipFile(path) as archive:
+        header = json.loads(archive.read("header.json"))
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {header.get('version')}")
+        if not _same_model(header["fingerprint"], embeddings):
+            raise ValueError(
+                f"Snapshot was built with {header['fingerprint'].get('model')}, "
+                f"not {settings.EMBEDDING_MODEL}"
+            )
+        current_corpus = corpus_hash()
+        stale = current_corpus is not None and current_corpus != header.get("corpus_hash")
+        result = {"points": header["points"], "stale": stale}
+
+        alias = settings.COLLECTION_NAME
+        live = resolve_alias(client, alias)
+        if live is None and alias in [c.name for c in client.get_collections().collections]:
+            live = alias
+        live_points = client.count(collection_name=live, exact=True).count if live else 0
+        if live and not force and live_points >= header["points"]:
+            result.update(status="verified", seconds=round(time.perf_counter() - started, 3))
+            return result
+
+        ids = json.loads(archive.read("ids.json"))
+        payloads = [json.loads(line) for line in archive.read("payloads.jsonl").decode("utf-8").splitlines() if line]
+        matrix = np.load(io.BytesIO(archive.read("vectors.npy")))
+
+        # Live uploads win over any in the snapshot: the live upload manifest describes them
+        live_uploads = bool(live) and client.count(
+            collection_name=live, count_filter=models.Filter(must=[UPLOAD_CONDITION]), exact=True
+        ).count > 0
+        if live_uploads:
+            kept = [i for i, payload in enumerate(payloads)
+                    if (payload.get("metadata") or {}).get("type") != "upload"]
+            ids, payloads, matrix = [ids[i] for i in kept], [payloads[i] for i in kept], matrix[kept]
+
+        target = versioned_name(alias)
+        create_collection(client, target, header["fingerprint"]["dim"])
+        for start in range(0, len(ids), _BATCH):
+            client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(id=point_id, vector=vector.astype(np.float32).tolist(), payload=payload)
+                    for point_id, vector, payload in zip(
+                        ids[start:start + _BATCH], matrix[start:start + _BATCH], payloads[start:start + _BATCH]
+                    )
+                ],
+                wait=True,
+            )
+
+        # Same model (checked above), so vectors are copied as they are
+        uploads = set()
+        if live:
+            uploads, _ = copy_uploads(client, live, target)
+
+        # The manifest describes exactly these points, so ingest.py stays incremental
+        manifests = [("manifest.json", settings.INGEST_MANIFEST_PATH)]
+        if not live_uploads:
+            manifests.append(("upload_manifest.json", settings.INGEST_UPLOAD_MANIFEST_PATH))
+        for name, manifest_path in manifests:
+            if name in archive.namelist():
+                directory = os.path.dirname(manifest_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(manifest_path + ".tmp", "wb") as f:
+                    f.write(archive.read(name))
+                os.replace(manifest_path + ".tmp", manifest_path)
+
+    if live:
+        # Catch up on uploads that arrived (or were replaced) while loading, then swap
+        added, seen = copy_uploads(client, live, target, skip=uploads)
+        stale_uploads = list((uploads | added) - seen)
+        if stale_uploads:
+            client.delete(collection_name=target, points_selector=models.PointIdsList(points=stale_uploads))
+        uploads = (uploads | added) & seen
+    result["uploads"] = len(uploads)
+
+    previous = swap_alias(client, alias, target)
+    if previous and live_points == 0:
+        # An empty collection from a fresh start is not worth keeping for rollback
+        client.delete_collection(collection_name=previous)
+    result.update(status="restored", collection=target, seconds=round(time.perf_counter() - started, 3))
+    return result
+
+
+def restore_on_startup(client: QdrantClient, embeddings) -> Optional[dict]:
+    """Startup hook: restore or verify the bundled snapshot, if there is one"""
+    path = settings.INDEX_SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        result = restore_snapshot(client, path, embeddings)
+    except Exception as e:
+        logger.error(f"Could not restore index snapshot {path}: {e}")
+        return None
+    logger.info(f"Index snapshot {result['status']}: {result['points']} points in {result['seconds']}s")
+    if result["stale"]:
+        logger.warning("Corpus changed since the snapshot was built; run ingest.py to sync the changes")
+    return result
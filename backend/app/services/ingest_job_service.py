@@ -0,0 +1,269 @@
+"""
+Background ingestion jobs for KCA Connect AI
+Uploads are spooled to disk and recorded in a local SQLite job table; a
+bounded pool of workers ingests them off the request path with retries
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.extraction_pool import extraction_pool
+from app.services.incremental_index import file_hash
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class IngestJobService:
+    def __init__(self):
+        self.jobs_dir = settings.INGEST_JOBS_DIR
+        self.files_dir = os.path.join(self.jobs_dir, "files")
+        os.makedirs(self.files_dir, exist_ok=True)
+        self.db_path = os.path.join(self.jobs_dir, "jobs.db")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(_SCHEMA)
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(ingest_jobs)")}
+            if "sha256" not in columns:
+                self._db.execute("ALTER TABLE ingest_jobs ADD COLUMN sha256 TEXT")
+            self._db.commit()
+        self._queue: Optional[asyncio.Queue] = None
+        self._embed_slots: Optional[asyncio.Semaphore] = None
+        self._workers = []
+
+    # ============ Job Table ============
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE ingest_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job.pop("path", None)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get_job(self, job_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        """Job status (only if it belongs to user_id, when given)"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or (user_id and row["user_id"] != user_id):
+            return None
+        return self._to_dict(row)
+
+    def list_jobs(self, user_id: str, limit: int = 20) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM ingest_jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    # ============ Queue ============
+
+    def spool_path(self, job_id: str, filename: str) -> str:
+        """Where an upload for job_id is kept until the job succeeds"""
+        return os.path.join(self.files_dir, job_id + os.path.splitext(filename)[1].lower())
+
+    async def enqueue(self, user_id: str, filename: str, path: str, job_id: Optional[str] = None,
+                      sha256: Optional[str] = None) -> dict:
+        """Record a job for a file already spooled to path (with its SHA-256, if known) and queue it"""
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        self._execute(
+            "INSERT INTO ingest_jobs (id, user_id, filename, path, sha256, status, stage, progress, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+            (job_id, user_id, filename, path, sha256, QUEUED, QUEUED, now, now)
+        )
+        metrics.incr("ingest.jobs_queued")
+        await self._queue.put(job_id)
+        return self.get_job(job_id)
+
+    @staticmethod
+    def _discard_upload(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def sweep_failed(self) -> int:
+        """Delete spooled uploads of jobs that failed more than INGEST_FAILED_RETENTION_HOURS ago"""
+        cutoff = time.time() - settings.INGEST_FAILED_RETENTION_HOURS * 3600
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM ingest_jobs WHERE status = ? AND updated_at < ?", (FAILED, cutoff)
+            ).fetchall()
+        removed = 0
+        for row in rows:
+            if os.path.exists(row["path"]):
+                os.remove(row["path"])
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} spooled uploads of failed ingestion jobs")
+        return removed
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep_failed)
+            except Exception as e:
+                logger.warning(f"Failed ingestion job sweep failed: {e}")
+            await asyncio.sleep(3600)
+
+    async def retry(self, job_id: str, user_id: str) -> Optional[dict]:
+        """
+        Requeue a failed job (attempts start over). Jobs whose upload is gone (failed for
+        good, or past INGEST_FAILED_RETENTION_HOURS) are returned unchanged.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or row["user_id"] != user_id:
+            return None
+        if row["status"] != FAILED or not os.path.exists(row["path"]):
+            return self._to_dict(row)
+        self._update(job_id, status=QUEUED, stage=QUEUED, progress=0, attempts=0, error=None)
+        await self._queue.put(job_id)
+        return self.get_job(job_id)
+
+    async def start(self):
+        """Start the worker pool and requeue jobs interrupted by a restart"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM ingest_jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        for row in rows:
+            self._update(row["id"], status=QUEUED, stage=QUEUED)
+            self._queue.put_nowait(row["id"])
+        if rows:
+            logger.info(f"Requeued {len(rows)} unfinished ingestion jobs")
+        # Enough workers to keep every extraction process busy; embedding is capped by INGEST_WORKERS
+        self._embed_slots = asyncio.Semaphore(max(settings.INGEST_WORKERS, 1))
+        workers = max(settings.INGEST_WORKERS, extraction_pool.workers, 1)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        self._workers.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        extraction_pool.shutdown()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Ingestion worker error on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        from app.services.ingest_service import ingest_service
+
+        with self._lock:
+            row = self._db.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or row["status"] != QUEUED:
+            return
+
+        attempts = row["attempts"] + 1
+        self._update(job_id, status=RUNNING, stage="starting", attempts=attempts, error=None)
+
+        def on_progress(stage: str, fraction: float):
+            self._update(job_id, stage=stage, progress=round(fraction, 3))
+
+        started = time.perf_counter()
+        try:
+            digest = row["sha256"] or await asyncio.to_thread(file_hash, row["path"])
+            result = await asyncio.to_thread(
+                ingest_service.unchanged_result, row["filename"], row["user_id"], digest
+            )
+            if result is None:
+                # Parsing and cleaning run in the extraction process pool (many files in parallel);
+                # a file already extracted (e.g. attached to a chat first) is not parsed again
+                on_progress("extracting", 0.05)
+                documents = await extraction_pool.extract(row["path"], row["filename"], digest=digest)
+                # Embedding and the Qdrant upsert are bounded separately to protect chat latency
+                async with self._embed_slots:
+                    result = await asyncio.to_thread(
+                        ingest_service.ingest_path, row["path"], row["filename"], row["user_id"], on_progress,
+                        digest=digest, documents=documents
+                    )
+        except (ValueError, TimeoutError, MemoryError) as e:
+            # Unsupported, too slow or too large: another attempt would fail the same way,
+            # so the upload is dropped now and retry() leaves the job as it is
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            metrics.incr("ingest.jobs_failed")
+            self._update(job_id, status=FAILED, stage=FAILED, error=str(e) or type(e).__name__)
+            self._discard_upload(row["path"])
+            return
+        except Exception as e:
+            metrics.incr("ingest.job_errors")
+            if attempts < settings.INGEST_MAX_ATTEMPTS:
+                delay = settings.INGEST_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+                logger.warning(f"Ingestion job {job_id} failed (attempt {attempts}), retrying in {delay}s: {e}")
+                self._update(job_id, status=QUEUED, stage="retrying", error=str(e))
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job_id)
+            else:
+                logger.error(f"Ingestion job {job_id} failed after {attempts} attempts: {e}")
+                metrics.incr("ingest.jobs_failed")
+                self._update(job_id, status=FAILED, stage=FAILED, error=str(e))
+            return
+        finally:
+            metrics.observe("ingest.job_ms", (time.perf_counter() - started) * 1000)
+
+        # Unsupported or empty files are final: retrying would not help
+        if result.get("success"):
+            metrics.incr("ingest.jobs_succeeded")
+            self._update(job_id, status=SUCCEEDED, stage=SUCCEEDED, progress=1.0, result=json.dumps(result))
+        else:
+            metrics.incr("ingest.jobs_failed")
+            self._update(job_id, status=FAILED, stage=FAILED, result=json.dumps(result), error=result.get("message"))
+        self._discard_upload(row["path"])
+
+# Singleton instance
+ingest_job_service = IngestJobService()
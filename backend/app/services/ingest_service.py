@@ -1,27 +1,40 @@
+import asyncio
 import os
-import shutil
-import tempfile
+from typing import AsyncIterator, Optional
 from fastapi import UploadFile, HTTPException
-from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.embedding_pipeline import EmbeddingPipeline, create_qdrant_client
+from app.services.embedding_store import with_embedding_store
+from app.services.extraction_cache import extraction_cache
+from app.services.extraction_pool import extraction_pool
+from app.services.incremental_index import IncrementalIndexer, IngestManifest, file_hash
+from app.services.text_extraction import load_documents
+from app.services.text_normalization import normalize_documents
+from app.services.upload_service import spool_upload
 import logging
-import re
 
 logger = logging.getLogger(__name__)
 
 class IngestService:
     def __init__(self):
         self.embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
-        self.client = QdrantClient(url=settings.QDRANT_URL)
-        self.vector_store = QdrantVectorStore(
-            client=self.client,
-            collection_name=settings.COLLECTION_NAME,
-            embedding=self.embeddings,
+        self.client = create_qdrant_client()
+        # Chunk vectors go through the on-disk store; identical text is never re-encoded
+        self.pipeline = EmbeddingPipeline(with_embedding_store(self.embeddings), self.client, settings.COLLECTION_NAME)
+        self.indexer = IncrementalIndexer(
+            self.pipeline,
+            IngestManifest(settings.INGEST_UPLOAD_MANIFEST_PATH, settings.COLLECTION_NAME, settings.EMBEDDING_MODEL),
+            dedup_distance=settings.INGEST_DEDUP_MAX_HAMMING if settings.INGEST_DEDUP_ENABLED else None,
+            # Retrieval searches every upload and the corpus, so all uploads form one dedup
+            # group (scope is "user_id/filename") and are also checked against the corpus
+            reference_manifests=self._corpus_manifest,
+            # Uploaded files are not kept, so a chunk handed over to another upload
+            # (possibly another user's) is re-labelled in place instead of re-synced
+            owner_metadata=lambda scope: dict(zip(("user_id", "source"), scope.split("/", 1)))
         )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1500,
@@ -29,137 +42,194 @@ class IngestService:
             add_start_index=True,
         )
 
+    @staticmethod
+    def _corpus_manifest() -> list:
+        """The corpus manifest as ingest.py last saved it (re-read for every sync)"""
+        return [IngestManifest(settings.INGEST_MANIFEST_PATH, settings.COLLECTION_NAME, settings.EMBEDDING_MODEL)]
+
+    def list_uploads(self, user_id: str) -> dict:
+        """{filename: chunk count} of the user's indexed uploads, from the manifest"""
+        prefix = f"{user_id}/"
+        return {
+            scope[len(prefix):]: len(self.indexer.manifest.get(scope)["chunks"])
+            for scope in self.indexer.manifest.scopes() if scope.startswith(prefix)
+        }
+
     async def extract_text_from_file(self, file: UploadFile) -> str:
         """
         Extract text from a file without ingesting it.
         """
         try:
-            suffix = os.path.splitext(file.filename)[1]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                shutil.copyfileobj(file.file, tmp)
-                tmp_path = tmp.name
-
+            upload = await spool_upload(file)
             try:
-                documents = []
-                if suffix.lower() == ".pdf":
-                    loader = PyPDFLoader(tmp_path)
-                    documents = loader.load()
-                elif suffix.lower() == ".docx":
-                    loader = Docx2txtLoader(tmp_path)
-                    documents = loader.load()
-                elif suffix.lower() == ".txt":
-                    loader = TextLoader(tmp_path, encoding="utf-8")
-                    documents = loader.load()
-                else:
-                   raise ValueError(f"Unsupported file type: {suffix}")
-
-                if not documents:
-                    return ""
-
-                return "\n\n".join([self._clean_text(doc.page_content) for doc in documents])
-
+                # Parsing and cleaning run in an extraction worker process; repeat
+                # attachments of the same file are answered from the extraction cache
+                documents = await extraction_pool.extract(upload.path, file.filename, digest=upload.sha256)
             finally:
-                if os.path.exists(tmp_path):
-                    # Reset file cursor for subsequent operations if needed, 
-                    # though here we consumed the upload file stream.
-                    # Fastapi UploadFile might need seek(0) if reused.
-                    pass
-                    os.remove(tmp_path)
+                upload.remove()
+            return "\n\n".join([doc.page_content for doc in documents])
 
+        except HTTPException:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.error(f"Error extracting text from {file.filename}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to extract text: {str(e)}")
 
-    def _clean_text(self, text: str) -> str:
+    async def stream_pages(self, path: str, filename: str, digest: str, max_chars: int = 0) -> AsyncIterator[dict]:
+        """
+        Yield cleaned pages of a saved file one at a time ({"page", "content"}). Pages are
+        parsed lazily in an extraction worker process (same isolation and timeout as
+        extract), so only a few pages are in memory. Stops once max_chars characters
+        have been produced (0 = no limit), truncating the last page; the final
+        record is {"done": True, "pages", "chars", "truncated", "cached"}.
+        Raises ValueError (unsupported type), TimeoutError or MemoryError.
+        """
+        suffix = os.path.splitext(filename)[1]
+        chars, count, truncated = 0, 0, False
+
+        cached = await asyncio.to_thread(extraction_cache.get, digest, suffix)
+
+        async def cached_pages():
+            for doc in cached:
+                yield {"page_content": doc.page_content, "metadata": doc.metadata}
+
+        pages = cached_pages() if cached is not None else extraction_pool.stream(path, filename)
+        # Complete extractions small enough to cache are kept for the next request
+        collected, collected_chars = ([], 0) if cached is None else (None, 0)
+
+        try:
+            async for page in pages:
+                if max_chars and chars >= max_chars:
+                    truncated = True
+                    break
+                if collected is not None:
+                    collected.append(page)
+                    collected_chars += len(page["page_content"])
+                    if collected_chars > extraction_cache.max_chars:
+                        collected = None
+
+                content = page["page_content"]
+                if max_chars and chars + len(content) > max_chars:
+                    content = content[:max_chars - chars]
+                    truncated = True
+                count += 1
+                chars += len(content)
+                yield {"page": count, "content": content}
+                if truncated:
+                    break
+        finally:
+            # Stops the worker if we finished early
+            await pages.aclose()
+
+        if collected is not None and not truncated:
+            documents = [Document(page_content=p["page_content"], metadata=p["metadata"]) for p in collected]
+            await asyncio.to_thread(extraction_cache.put, digest, suffix, documents)
+        metrics.incr("extraction.streamed_pages", count)
+        yield {"done": True, "pages": count, "chars": chars, "truncated": truncated, "cached": cached is not None}
+
+    def load_documents(self, path: str, suffix: str) -> list:
+        """Load a saved file in this process (see text_extraction.load_documents)"""
+        return load_documents(path, suffix)
+
+    def unchanged_result(self, filename: str, user_id: str, digest: str) -> Optional[dict]:
+        """Result to report if this exact file is already indexed for the user, else None"""
+        scope = f"{user_id}/{filename}"
+        if not self.indexer.is_current(scope, digest):
+            return None
+        logger.info(f"{filename} is unchanged for user {user_id}; nothing to ingest")
+        return {
+            "success": True,
+            "chunks": len(self.indexer.manifest.get(scope)["chunks"]),
+            "embedded": 0,
+            "unchanged": True
+        }
+
+    def ingest_path(self, path: str, filename: str, user_id: str, on_progress=None,
+                    digest: Optional[str] = None, documents: Optional[list] = None) -> dict:
         """
-        Clean extracted text to fix common PDF extraction artifacts.
-        e.g. "wordWord" -> "word Word", "end.Start" -> "end. Start"
+        Load, clean, split and ingest a file already saved to disk (blocking).
+        on_progress(stage, fraction) is called as the work advances;
+        digest is the file's SHA-256 if already known (computed otherwise);
+        documents are pages already loaded and normalized (e.g. by the extraction pool).
         """
-        if not text:
-            return ""
-            
-        # 1. Normalization: paragraphs
-        text = re.sub(r'\n\s*\n', '<PARAGRAPH>', text)
-        
-        # 2. Unwrap single newlines
-        text = re.sub(r'\n', ' ', text)
-        
-        # 3. Restore paragraphs
-        text = text.replace('<PARAGRAPH>', '\n\n')
-            
-        # 4. Fix camelCase-like merges
-        text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
-        
-        # 5. Fix UpperTitle merges (e.g. SYSTEMSIf -> SYSTEMS If)
-        text = re.sub(r'(?<=[A-Z])(?=[A-Z][a-z])', ' ', text)
-        
-        # 6. Fix period followed by Uppercase (e.g. ac.keHe -> ac.ke He)
-        text = re.sub(r'(?<=[a-z]\.)(?=[A-Z])', ' ', text)
-        
-        # 7. Collapse multiple spaces
-        text = re.sub(r'[ \t]+', ' ', text)
-        
-        return text.strip()
+        def report(stage: str, fraction: float):
+            if on_progress:
+                on_progress(stage, fraction)
+
+        suffix = os.path.splitext(filename)[1]
+        # Re-uploads replace the user's previous copy of the same file
+        scope = f"{user_id}/{filename}"
+        digest = digest or file_hash(path)
+
+        if documents is None:
+            unchanged = self.unchanged_result(filename, user_id, digest)
+            if unchanged:
+                return unchanged
+
+            report("loading", 0.05)
+            documents = extraction_cache.get(digest, suffix)
+            if documents is None:
+                try:
+                    documents = self.load_documents(path, suffix)
+                except ValueError as e:
+                    logger.warning(str(e))
+                    return {"success": False, "message": str(e)}
+                normalize_documents(documents)
+                extraction_cache.put(digest, suffix, documents)
+
+        if not documents:
+            return {"success": False, "message": "No content found in file."}
+
+        # Add metadata
+        report("splitting", 0.2)
+        for doc in documents:
+            doc.metadata["source"] = filename
+            doc.metadata["user_id"] = user_id
+            doc.metadata["type"] = "upload"
+
+        # Split text
+        texts = self.text_splitter.split_documents(documents)
+
+        if not texts:
+            return {"success": False, "message": "Could not split documents."}
+
+        # Embed and ingest only new or changed chunks; drop chunks no longer in the file
+        stats = self.indexer.sync(
+            scope, texts, digest,
+            on_progress=lambda done, total: report("embedding", 0.25 + 0.75 * done / total)
+        )
+
+        logger.info(
+            f"Ingested {len(texts)} chunks from {filename} "
+            f"({stats['embedded']} embedded, {stats['deleted']} deleted, {stats['duplicates']} duplicates)"
+        )
+        return {
+            "success": True,
+            "chunks": len(texts),
+            "embedded": stats["embedded"],
+            "deleted": stats["deleted"],
+            "duplicates": stats["duplicates"],
+            "chunks_per_second": stats["chunks_per_second"]
+        }
 
     async def process_file(self, file: UploadFile, user_id: str):
         """
-        Process an uploaded file: save to temp, load, split, and ingest.
+        Process an uploaded file: spool to disk once, load, split, and ingest.
+        The blocking work runs in a worker thread.
         """
         try:
-            # Create a temporary file to save the upload
-            suffix = os.path.splitext(file.filename)[1]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                shutil.copyfileobj(file.file, tmp)
-                tmp_path = tmp.name
-
+            upload = await spool_upload(file)
             try:
-                documents = []
-                # Determine loader based on file extension
-                if suffix.lower() == ".pdf":
-                    loader = PyPDFLoader(tmp_path)
-                    documents = loader.load()
-                elif suffix.lower() == ".docx":
-                    loader = Docx2txtLoader(tmp_path)
-                    documents = loader.load()
-                elif suffix.lower() == ".txt":
-                    loader = TextLoader(tmp_path, encoding="utf-8")
-                    documents = loader.load()
-                else:
-                    # For images, we would use a Vision model here.
-                    # For now, we skip unsupported types or implement image handling later.
-                    logger.warning(f"Unsupported file type: {suffix}")
-                    return {"success": False, "message": f"Unsupported file type: {suffix}"}
-
-                if not documents:
-                    return {"success": False, "message": "No content found in file."}
-
-                # Add metadata and Clean Text
-                for doc in documents:
-                    doc.page_content = self._clean_text(doc.page_content)
-                    doc.metadata["source"] = file.filename
-                    doc.metadata["user_id"] = user_id
-                    doc.metadata["type"] = "upload"
-
-                # Split text
-                texts = self.text_splitter.split_documents(documents)
-                
-                if not texts:
-                     return {"success": False, "message": "Could not split documents."}
-
-                # Ingest into Qdrant
-                self.vector_store.add_documents(texts)
-                
-                logger.info(f"Ingested {len(texts)} chunks from {file.filename}")
-                return {
-                    "success": True, 
-                    "chunks": len(texts)
-                }
-
+                return await asyncio.to_thread(
+                    self.ingest_path, upload.path, file.filename, user_id, digest=upload.sha256
+                )
             finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
+                upload.remove()
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error processing file {file.filename}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
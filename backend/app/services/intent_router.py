@@ -0,0 +1,143 @@
+"""
+Intent routing for KCA Connect AI
+Recognizes small talk ("hi", "thanks", "what's your name") before any
+retrieval happens: phrase rules first, then a nearest-centroid classifier
+over the query embedding (the same cached vector retrieval would use).
+Anything not confidently small talk goes down the normal RAG path
+"""
+import logging
+import re
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RAG = "rag"
+GREETING = "greeting"
+THANKS = "thanks"
+FAREWELL = "farewell"
+IDENTITY = "identity"
+
+_RULES = {
+    GREETING: re.compile(
+        r"^(hi+|hello+|hey+|hallo|howdy|greetings|habari|sasa|niaje|mambo|good (morning|afternoon|evening|day))"
+        r"( there| everyone| kca( connect)?( ai)?| bot)?[\s!.,]*$"
+    ),
+    THANKS: re.compile(
+        r"^((ok(ay)?|great|cool|nice|awesome|perfect)[\s,!.]*)?"
+        r"(thanks?( you)?( so much| a lot| very much)?|thx|ty|asante( sana)?|much appreciated|appreciated)[\s!.,]*$"
+    ),
+    FAREWELL: re.compile(
+        r"^(bye+|goodbye|good bye|see (you|ya)( later| soon)?|later|take care|good night|kwaheri)[\s!.,]*$"
+    ),
+    IDENTITY: re.compile(
+        r"^(what('?s| is) your name|who are you|what are you|who (made|built|created) you|"
+        r"are you (a bot|an ai|human|a robot)|what can you do|introduce yourself)[\s?!.]*$"
+    ),
+}
+
+# Exemplars for the centroid classifier; RAG exemplars give small talk a margin to beat
+_EXEMPLARS = {
+    GREETING: ["hi", "hello there", "hey, how are you?", "good morning", "hello, how is your day going?"],
+    THANKS: ["thank you", "thanks a lot, that helped", "I appreciate your help", "thanks, that's what I needed"],
+    FAREWELL: ["bye", "goodbye, see you later", "that's all for now, bye", "have a good day"],
+    IDENTITY: ["what is your name?", "who are you?", "are you a chatbot?", "who created you?", "what can you help me with?"],
+    RAG: [
+        "what are the admission requirements?",
+        "how much are the fees for this course?",
+        "when does the semester start?",
+        "which programmes does KCA University offer?",
+        "how do I register for exams?",
+        "where is the campus located?",
+    ],
+}
+
+_RESPONSES = {
+    GREETING: "Hello! I'm KCA Connect AI. How can I help you with KCA University today?",
+    THANKS: "You're welcome! Let me know if there's anything else you'd like to know about KCA University.",
+    FAREWELL: "Goodbye! Feel free to come back any time you have questions about KCA University.",
+    IDENTITY: (
+        "I'm KCA Connect AI, the official AI assistant of KCA University. I can answer questions about "
+        "programmes, admissions, fees, academic calendars and student services, and I can read documents "
+        "you attach."
+    ),
+}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class IntentRouter:
+    def __init__(self, embed: Callable[[str], List[float]]):
+        """embed(text) -> query vector (should be cached; retrieval reuses it)"""
+        self.embed = embed
+        self._centroids: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def _get_centroids(self) -> dict:
+        with self._lock:
+            if self._centroids is None:
+                centroids = {}
+                for route, examples in _EXEMPLARS.items():
+                    vectors = np.asarray([self.embed(example) for example in examples], dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    centroids[route] = centroid / np.linalg.norm(centroid)
+                self._centroids = centroids
+            return self._centroids
+
+    def classify_rules(self, query: str) -> Optional[str]:
+        """Phrase rules only (no embedding); None if undecided"""
+        text = _normalize(query)
+        for route, pattern in _RULES.items():
+            if pattern.match(text):
+                return route
+        return None
+
+    def classify(self, query: str) -> str:
+        """Route for the query: RAG or one of the small-talk routes (blocking: may embed)"""
+        route = self.classify_rules(query)
+        method = "rules"
+        # Only short messages are candidates for small talk; anything longer is a real question
+        if route is None and len(query.split()) <= settings.INTENT_MAX_SMALL_TALK_WORDS:
+            route = self._classify_centroid(query)
+            method = "centroid"
+        route = route or RAG
+        metrics.incr(f"intent.route.{route}")
+        if route != RAG:
+            metrics.incr(f"intent.method.{method}")
+        return route
+
+    def _classify_centroid(self, query: str) -> Optional[str]:
+        try:
+            vector = np.asarray(self.embed(query), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            scores = {route: float(vector @ centroid) for route, centroid in self._get_centroids().items()}
+        except Exception as e:
+            logger.warning(f"Intent classification failed, using retrieval: {e}")
+            return None
+        best = max((route for route in scores if route != RAG), key=scores.get)
+        if scores[best] >= settings.INTENT_CENTROID_MIN_SCORE and \
+                scores[best] - scores[RAG] >= settings.INTENT_CENTROID_MARGIN:
+            return best
+        return None
+
+    @staticmethod
+    def canned_response(route: str) -> str:
+        return _RESPONSES[route]
+
+    @staticmethod
+    def small_talk_prompt(route: str, query: str, history_text: str = "") -> str:
+        """Short prompt for small talk: no retrieved context, just who the assistant is"""
+        history = f"\nConversation so far:\n{history_text}\n" if history_text else ""
+        return f"""You are KCA Connect AI, the official AI assistant of KCA University. If asked about your name, identify yourself as KCA Connect AI.
+{history}
+The student wrote: {query}
+
+Reply briefly and warmly in one or two sentences, and offer help with KCA University questions. Only greet with "Hello" if there is no conversation so far."""
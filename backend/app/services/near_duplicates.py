@@ -0,0 +1,76 @@
+"""
+Near-duplicate chunk detection for KCA Connect AI
+64-bit SimHash over word shingles, indexed by band so that any two
+signatures within the Hamming threshold share at least one band exactly
+"""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Optional
+
+_TOKEN = re.compile(r"\w+")
+_BITS = 64
+# Below this many tokens SimHash is too noisy: only exact duplicates count
+MIN_TOKENS = 8
+
+
+def simhash(text: str, shingle_size: int = 3) -> Optional[int]:
+    """SimHash of the text's word shingles (None for very short text)"""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    weights = [0] * _BITS
+    for i in range(len(tokens) - shingle_size + 1):
+        shingle = " ".join(tokens[i:i + shingle_size]).encode("utf-8")
+        feature = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "big")
+        for bit in range(_BITS):
+            weights[bit] += 1 if feature >> bit & 1 else -1
+    return sum(1 << bit for bit in range(_BITS) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """
+    Finds an indexed point whose chunk is identical (same content hash) or
+    within max_distance bits of a SimHash. Uses max_distance + 1 bands
+    (pigeonhole), so no match within the threshold is missed.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        self._band_bits = _BITS // bands
+        self._bands = bands
+        self._by_band = defaultdict(set)
+        self._by_hash = {}
+        self._signatures = {}
+
+    def _band_keys(self, signature: int):
+        mask = (1 << self._band_bits) - 1
+        for band in range(self._bands):
+            yield band, signature >> (band * self._band_bits) & mask
+
+    def add(self, point_id: str, chunk_hash: str, signature: Optional[int]):
+        self._by_hash.setdefault(chunk_hash, point_id)
+        if signature is None:
+            return
+        self._signatures[point_id] = signature
+        for key in self._band_keys(signature):
+            self._by_band[key].add(point_id)
+
+    def find(self, chunk_hash: str, signature: Optional[int]) -> Optional[str]:
+        """Canonical point for this chunk, or None if it is not a near-duplicate"""
+        if chunk_hash in self._by_hash:
+            return self._by_hash[chunk_hash]
+        if signature is None:
+            return None
+        best, best_distance = None, self.max_distance + 1
+        for key in self._band_keys(signature):
+            for point_id in self._by_band.get(key, ()):
+                distance = hamming(signature, self._signatures[point_id])
+                if distance < best_distance:
+                    best, best_distance = point_id, distance
+        return best
@@ -1,6 +1,6 @@
 from qdrant_client import QdrantClient
-from qdrant_client.http import models
 from app.core.config import settings
+from app.services.collection_aliases import collection_exists, ensure_collection
 
 class QdrantService:
     def __init__(self):
@@ -15,18 +15,10 @@ class QdrantService:
         self.collection_name = settings.COLLECTION_NAME
 
     def create_collection_if_not_exists(self, vector_size: int = 384):
-        collections = self.client.get_collections()
-        collection_names = [c.name for c in collections.collections]
-        
-        if self.collection_name not in collection_names:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=vector_size,
-                    distance=models.Distance.COSINE
-                )
-            )
-            print(f"Collection '{self.collection_name}' created.")
+        # collection_name is an alias; a new versioned collection is created behind it
+        if not collection_exists(self.client, self.collection_name):
+            physical = ensure_collection(self.client, self.collection_name, vector_size)
+            print(f"Collection '{physical}' created as '{self.collection_name}'.")
         else:
             print(f"Collection '{self.collection_name}' already exists.")
 
@@ -3,28 +3,24 @@ from langchain_qdrant import QdrantVectorStore
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_cerebras import ChatCerebras
 from langchain_groq import ChatGroq
+from langchain_core.documents import Document
 from qdrant_client import QdrantClient
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.conversation_memory import ConversationMemory, token_counter
+from app.services.intent_router import RAG, IntentRouter
+from app.services.text_normalization import is_normalized, normalize_text
 from app.services.web_search_service import web_search_service
 import logging
 import asyncio
 import re
+import threading
+import time
+from collections import OrderedDict
 from flashrank import Ranker, RerankRequest
 
 logger = logging.getLogger(__name__)
 
-def _fix_merged_words(text: str) -> str:
-    """
-    Fix merged words from PDF extraction (e.g. "RequirementsTo" -> "Requirements To")
-    """
-    if not text:
-        return text
-    # Fix lowercase followed by uppercase
-    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-    # Fix uppercase sequence followed by lowercase
-    text = re.sub(r'([A-Z])([A-Z][a-z])', r'\1 \2', text)
-    return text
-
 def _format_document_context(docs: list) -> str:
     """
     Format document chunks with proper separation to prevent words running together.
@@ -36,8 +32,10 @@ def _format_document_context(docs: list) -> str:
     formatted_chunks = []
     for doc in docs:
         content = doc.page_content.strip()
-        # Fix merged words from PDF extraction
-        content = _fix_merged_words(content)
+        # Chunks are normalized at ingest; only points predating that need it here
+        if not is_normalized(doc.metadata):
+            metrics.incr("rag.unnormalized_chunks")
+            content = normalize_text(content, unwrap_lines=False)
         # Ensure each chunk ends with proper punctuation
         if content and content[-1] not in '.!?。':
             content = content + '.'
@@ -50,13 +48,23 @@ class RagService:
     def __init__(self):
         self.embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
         self.client = QdrantClient(url=settings.QDRANT_URL)
-        self.vector_store = QdrantVectorStore(
-            client=self.client,
-            collection_name=settings.COLLECTION_NAME,
-            embedding=self.embeddings,
-        )
+        # Built on first search: the collection may only exist once startup restored the snapshot
+        self._vector_store = None
+        self._vector_store_lock = threading.Lock()
         
+        self.llm_provider = None
         self.llm = self._initialize_llm()
+        # Per-provider semaphores bounding outbound LLM concurrency (created lazily)
+        self._llm_semaphores = {}
+        # Query vectors are cached so intent routing, the relevance check and retrieval embed once
+        self._query_vectors = OrderedDict()
+        self._query_vectors_lock = threading.Lock()
+        self.intent_router = IntentRouter(self._embed_query)
+
+        # Conversation history is fitted to a token budget, with older turns summarized
+        self.memory = ConversationMemory(
+            token_counter(), summarize=self._summarize_history if self.llm else None
+        )
         
         # Initialize FlashRank for reranking
         # Uses a lightweight model (e.g., ms-marco-TinyBERT-L-2-v2)
@@ -65,6 +73,8 @@ class RagService:
         except Exception as e:
             logger.warning(f"Failed to initialize FlashRank: {e}. Reranking will be disabled.")
             self.ranker = None
+        # Running estimate of FlashRank cost per candidate (ms), used to report latency saved by skips
+        self._rerank_ms_per_candidate = 5.0
 
         # Create custom prompt template
         self.system_prompt = """You are KCA Connect AI, the official AI assistant of KCA University. Use the following context from documents, web search results, and conversation history to answer the student's question.
@@ -106,11 +116,14 @@ Instructions:
         if settings.GROQ_API_KEY and (settings.DEFAULT_LLM == "groq" or not settings.CEREBRAS_API_KEY):
             try:
                 logger.info("Initializing Groq LLM (llama-3.3-70b-versatile)")
-                return ChatGroq(
+                llm = ChatGroq(
                     model="llama-3.3-70b-versatile",
                     groq_api_key=settings.GROQ_API_KEY,
                     temperature=0.3,
                 )
+                # Only once construction succeeded, so metrics and semaphores follow the real provider
+                self.llm_provider = "groq"
+                return llm
             except Exception as e:
                 logger.error(f"Failed to initialize Groq LLM: {e}")
         
@@ -118,11 +131,14 @@ Instructions:
         if settings.DEFAULT_LLM == "cerebras" and settings.CEREBRAS_API_KEY:
             try:
                 logger.info("Initializing Cerebras LLM (llama-3.3-70b)")
-                return ChatCerebras(
+                llm = ChatCerebras(
                     model="llama-3.3-70b",
                     cerebras_api_key=settings.CEREBRAS_API_KEY,
                     temperature=0.3,
                 )
+                # Only once construction succeeded, so metrics and semaphores follow the real provider
+                self.llm_provider = "cerebras"
+                return llm
             except Exception as e:
                 logger.error(f"Failed to initialize Cerebras LLM: {e}")
 
@@ -130,20 +146,120 @@ Instructions:
         if settings.DEFAULT_LLM == "gemini" and settings.GOOGLE_API_KEY:
             try:
                 logger.info("Initializing Gemini LLM (gemini-2.0-flash)")
-                return ChatGoogleGenerativeAI(
+                llm = ChatGoogleGenerativeAI(
                     model="gemini-2.0-flash",
                     google_api_key=settings.GOOGLE_API_KEY,
                     temperature=0.3,
                 )
+                # Only once construction succeeded, so metrics and semaphores follow the real provider
+                self.llm_provider = "gemini"
+                return llm
             except Exception as e:
                 logger.error(f"Failed to initialize Gemini LLM: {e}")
         
         logger.warning("No LLM provider available or configured. Operating in retrieval-only mode.")
         return None
 
+    def _llm_semaphore(self) -> asyncio.Semaphore:
+        """Get the concurrency-limiting semaphore for the active LLM provider"""
+        provider = self.llm_provider or "default"
+        if provider not in self._llm_semaphores:
+            limit = settings.LLM_CONCURRENCY_LIMITS.get(provider, settings.LLM_MAX_CONCURRENCY)
+            self._llm_semaphores[provider] = asyncio.Semaphore(limit)
+        return self._llm_semaphores[provider]
+
+    async def _ainvoke_llm(self, prompt: str) -> str:
+        """Invoke the LLM asynchronously, bounded by the provider semaphore"""
+        semaphore = self._llm_semaphore()
+        started = time.perf_counter()
+        async with semaphore:
+            metrics.observe(f"llm.{self.llm_provider}.queue_ms", (time.perf_counter() - started) * 1000)
+            response = await self.llm.ainvoke(prompt)
+        return response.content if hasattr(response, 'content') else str(response)
+
+    async def _astream_llm(self, prompt: str):
+        """
+        Stream LLM output chunk by chunk. The provider stream is read by a separate task that
+        holds a semaphore slot only while the provider is producing; chunks are buffered for
+        the caller, so slow clients (and the caller's pacing) never hold a slot.
+        """
+        semaphore = self._llm_semaphore()
+        chunks = asyncio.Queue()
+        done = object()
+
+        async def pump():
+            started = time.perf_counter()
+            try:
+                async with semaphore:
+                    metrics.observe(f"llm.{self.llm_provider}.queue_ms", (time.perf_counter() - started) * 1000)
+                    async for chunk in self.llm.astream(prompt):
+                        chunks.put_nowait(chunk.content if hasattr(chunk, 'content') else str(chunk))
+                chunks.put_nowait(done)
+            except Exception as e:
+                chunks.put_nowait(e)
+
+        task = asyncio.create_task(pump())
+        try:
+            while True:
+                item = await chunks.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # The caller stopped early (or the client went away): stop reading the provider
+            task.cancel()
+
+    async def _summarize_history(self, previous_summary: str, messages: list) -> str:
+        """Fold new messages into the running summary of a conversation"""
+        conversation = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in messages
+        )
+        prompt = f"""Update the summary of a conversation between a student and KCA Connect AI.
+
+Current summary:
+{previous_summary or '(none)'}
+
+New messages:
+{conversation}
+
+Write the updated summary in at most 120 words. Keep the topics, names, programmes and facts the student may refer back to; drop greetings and filler. Return only the summary."""
+        return await self._ainvoke_llm(prompt)
+
+    def _embed_query(self, query: str) -> list:
+        """Embed a query, reusing the vector if the same text was embedded recently"""
+        with self._query_vectors_lock:
+            vector = self._query_vectors.get(query)
+            if vector is not None:
+                self._query_vectors.move_to_end(query)
+                metrics.incr("rag.query_vector_cache_hits")
+                return vector
+        vector = self.embeddings.embed_query(query)
+        with self._query_vectors_lock:
+            self._query_vectors[query] = vector
+            while len(self._query_vectors) > settings.QUERY_VECTOR_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+        return vector
+
+    @property
+    def vector_store(self) -> QdrantVectorStore:
+        """The collection's vector store; raises (and retries next time) while the collection is missing"""
+        if self._vector_store is None:
+            with self._vector_store_lock:
+                if self._vector_store is None:
+                    self._vector_store = QdrantVectorStore(
+                        client=self.client,
+                        collection_name=settings.COLLECTION_NAME,
+                        embedding=self.embeddings,
+                    )
+        return self._vector_store
+
     def search_with_scores(self, query: str, k: int = 4):
         """Retrieve relevant documents from vector store with similarity scores"""
         try:
+            if hasattr(self.vector_store, 'similarity_search_with_score_by_vector'):
+                return self.vector_store.similarity_search_with_score_by_vector(self._embed_query(query), k=k)
             if hasattr(self.vector_store, 'similarity_search_with_score'):
                 results = self.vector_store.similarity_search_with_score(query, k=k)
                 return results
@@ -154,13 +270,38 @@ Instructions:
             logger.error(f"Error during vector search: {e}")
             return []
 
-    def hybrid_search(self, query: str, k: int = 5, fetch_k: int = 20):
+    def _plan_rerank(self, candidates: list, k: int):
+        """
+        Decide how many candidates to rerank based on the dense score distribution.
+        Returns (fetch_k, skip_rerank, reason).
+        """
+        scores = [score for _, score in candidates]
+        top_score = scores[0]
+
+        # Adaptive depth: only keep candidates that are still competitive with the top hit
+        floor = top_score - settings.RERANK_SCORE_WINDOW
+        competitive = sum(1 for score in scores if score >= floor)
+        fetch_k = min(len(scores), max(competitive, k, settings.RERANK_MIN_FETCH_K))
+
+        if fetch_k <= 1:
+            return fetch_k, True, "single_candidate"
+
+        # Decisive margin: the top dense hit is far ahead of the runner-up
+        margin = top_score - scores[1]
+        if top_score >= settings.RERANK_SKIP_MIN_SCORE and margin >= settings.RERANK_SKIP_MARGIN:
+            return fetch_k, True, "decisive_margin"
+
+        return fetch_k, False, None
+
+    def hybrid_search(self, query: str, k: int = 5, fetch_k: int = None):
         """
         Perform hybrid search with reranking.
-        1. Retrieve a larger set of candidates (fetch_k) using vector search.
-        2. Rerank the candidates using FlashRank.
-        3. Return the top k results.
+        1. Retrieve up to fetch_k candidates (default RERANK_MAX_FETCH_K) using vector search.
+        2. Shrink the candidate set adaptively and skip reranking when the dense margin is decisive.
+        3. Otherwise rerank the candidates using FlashRank.
+        4. Return the top k results.
         """
+        fetch_k = fetch_k or settings.RERANK_MAX_FETCH_K
         try:
             # 1. Retrieve candidates
             candidates = self.search_with_scores(query, k=fetch_k)
@@ -171,26 +312,47 @@ Instructions:
                 # Fallback to standard vector search if ranker not available
                 return [doc for doc, score in candidates[:k]]
 
-            # 2. Prepare for reranking
+            # 2. Choose rerank depth from the score distribution
+            candidates.sort(key=lambda item: item[1], reverse=True)
+            rerank_k, skip, reason = self._plan_rerank(candidates, k)
+            metrics.observe("rerank.fetch_k", rerank_k)
+
+            if skip:
+                # Estimate what reranking would have cost from the observed per-candidate latency
+                saved_ms = self._rerank_ms_per_candidate * rerank_k
+                metrics.incr("rerank.skipped")
+                metrics.incr(f"rerank.skipped.{reason}")
+                metrics.incr("rerank.latency_saved_ms", saved_ms)
+                logger.info(
+                    f"Skipping rerank ({reason}): top score {candidates[0][1]:.3f}, "
+                    f"~{saved_ms:.1f}ms saved"
+                )
+                return [doc for doc, score in candidates[:k]]
+
+            # 3. Prepare for reranking
             passages = [
                 {"id": str(i), "text": doc.page_content, "meta": doc.metadata} 
-                for i, (doc, score) in enumerate(candidates)
+                for i, (doc, score) in enumerate(candidates[:rerank_k])
             ]
             
             rerank_request = RerankRequest(query=query, passages=passages)
             
-            # 3. Rerank
+            # 4. Rerank
+            started = time.perf_counter()
             reranked_results = self.ranker.rerank(rerank_request)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._rerank_ms_per_candidate = 0.8 * self._rerank_ms_per_candidate + 0.2 * (elapsed_ms / len(passages))
+            metrics.incr("rerank.executed")
+            metrics.observe("rerank.latency_ms", elapsed_ms)
             
-            # 4. Format results
+            # 5. Format results
             final_results = []
             for result in reranked_results[:k]:
                 # Reconstruct document
-                from langchain_core.documents import Document
                 doc = Document(page_content=result['text'], metadata=result['meta'])
                 final_results.append(doc)
             
-            logger.info(f"Hybrid search returned {len(final_results)} reranked documents")
+            logger.info(f"Hybrid search returned {len(final_results)} reranked documents ({rerank_k} candidates, {elapsed_ms:.1f}ms)")
             return final_results
 
         except Exception as e:
@@ -319,8 +481,8 @@ Instructions:
         
         return found_topics
 
-    def _contextualize_query(self, query: str, history: list) -> str:
-        """Enhance query with context from conversation history"""
+    def _contextualize_query(self, query: str, history: list, summary: str = "") -> str:
+        """Enhance query with context from conversation history (recent messages plus the summary of older ones)"""
         if not history or len(history) == 0:
             return query
         
@@ -351,7 +513,7 @@ Instructions:
                 context_parts.append(f"{role}: {content}")
         
         # Extract key topics from history
-        all_history_text = " ".join([msg.get('content', '') for msg in history])
+        all_history_text = " ".join([summary] + [msg.get('content', '') for msg in history])
         key_topics = self._extract_key_topics(all_history_text)
         
         # If we have key topics and ambiguous query, try to expand it
@@ -412,8 +574,7 @@ Instructions:
             Return ONLY a valid JSON object: {{"score": float, "feedback": "string", "needs_rewrite": bool}}
             """
             
-            response = await self.llm.ainvoke(prompt)
-            content = response.content if hasattr(response, 'content') else str(response)
+            content = await self._ainvoke_llm(prompt)
             
             # Extract JSON
             import json
@@ -427,33 +588,50 @@ Instructions:
             logger.error(f"Error during self-reflection: {e}")
             return {"score": 1.0, "feedback": "Evaluation failed", "needs_rewrite": False}
 
-    def get_answer(self, query: str, history: list = None):
+    async def _small_talk_answer(self, route: str, query: str, history_text: str) -> str:
+        """Answer small talk without retrieval: a short LLM prompt if enabled, else a canned reply"""
+        if settings.INTENT_SMALL_TALK_LLM and self.llm:
+            try:
+                return await self._ainvoke_llm(self.intent_router.small_talk_prompt(route, query, history_text))
+            except Exception as e:
+                logger.error(f"Error calling LLM for small talk: {e}")
+        return self.intent_router.canned_response(route)
+
+    async def get_answer(self, query: str, history: list = None, chat_id: str = None, user_id: str = None):
         """Get answer using RAG pipeline with conversation context"""
+        memory = None
         try:
+            # Fitting history to the budget hashes every message and may condense older turns: off the event loop
+            memory = await asyncio.to_thread(self.memory.build, history, chat_id, user_id)
+            history = memory.recent
+            # Small talk ("hi", "thanks", "who are you") skips retrieval and web search entirely
+            route = await asyncio.to_thread(self.intent_router.classify, query)
+            if route != RAG:
+                logger.info(f"Routed '{query[:50]}' as {route}; skipping retrieval")
+                return await self._small_talk_answer(route, query, memory.text)
+
             # Contextualize the query using conversation history
             original_query = query
             if history:
-                query = self._contextualize_query(query, history)
+                query = self._contextualize_query(query, history, memory.summary)
                 if query != original_query:
                     logger.info(f"Query enhanced from '{original_query}' to '{query}'")
             
-            # Format history for the prompt
-            history_text = ""
-            if history:
-                history_text = "\n".join([
-                    f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}"
-                    for msg in history[-6:]  # Last 6 messages
-                ])
+            # History for the prompt: recent messages within the token budget, older ones summarized
+            history_text = memory.text
             
             # Check if we should search the web
             should_search = self._should_search_web(original_query)
             web_context = ""
             
-            if not self.should_use_rag(query) or should_search:
+            # Retrieval is blocking (embeddings + Qdrant), so keep it off the event loop
+            use_rag = await asyncio.to_thread(self.should_use_rag, query)
+            
+            if not use_rag or should_search:
                 logger.info(f"Query '{query}' doesn't match documents well. Searching the web...")
-                web_context = self.search_web(query)
+                web_context = await asyncio.to_thread(self.search_web, query)
             
-            if not self.should_use_rag(query):
+            if not use_rag:
                 if self.llm:
                     try:
                         # Include history and web context in the prompt
@@ -472,17 +650,14 @@ Instructions:
 - Answer based on the conversation context and web search results above
 - If there is prior conversation history, do NOT start with "Hello" - just answer directly
 - Only greet with "Hello" at the very start of a completely new conversation with no history"""
-                            response = self.llm.invoke(contextual_prompt)
+                            return await self._ainvoke_llm(contextual_prompt)
                         else:
-                            contextual_prompt = """You are KCA Connect AI, the official AI assistant of KCA University. If asked about your name, identify yourself as KCA Connect AI.
+                            contextual_prompt = f"""You are KCA Connect AI, the official AI assistant of KCA University. If asked about your name, identify yourself as KCA Connect AI.
+
+Question: {original_query}
 
 Important: Only greet with "Hello" if this is the very first message. Otherwise, just answer directly."""
-                            response = self.llm.invoke(contextual_prompt)
-                        
-                        if hasattr(response, 'content'):
-                            return response.content
-                        else:
-                            return str(response)
+                            return await self._ainvoke_llm(contextual_prompt)
                     except Exception as e:
                         logger.error(f"Error calling LLM for general question: {e}")
                         return "I encountered an error while processing your question. Please try again later."
@@ -490,7 +665,7 @@ Important: Only greet with "Hello" if this is the very first message. Otherwise,
                     return "I couldn't find any relevant information."
             
             # Use Hybrid Search
-            docs = self.search(query)
+            docs = await asyncio.to_thread(self.search, query)
             context = _format_document_context(docs)
             
             if self.llm:
@@ -501,13 +676,9 @@ Important: Only greet with "Hello" if this is the very first message. Otherwise,
                         history=history_text,
                         question=original_query
                     )
-                    response = self.llm.invoke(prompt)
-                    
-                    answer_text = response.content if hasattr(response, 'content') else str(response)
+                    answer_text = await self._ainvoke_llm(prompt)
                     
-                    # Self-Reflection Check (Synchronous wrapper for async method not ideal but acceptable for "get_answer")
-                    # For production, we should async/await properly, but here we might just skip or do a light check.
-                    # Or we can just return the answer for now to keep latency low.
+                    # Self-Reflection Check is skipped here to keep latency low.
                     
                     return answer_text
 
@@ -522,37 +693,49 @@ Important: Only greet with "Hello" if this is the very first message. Otherwise,
         except Exception as e:
             logger.error(f"Error generating answer: {e}")
             return "I encountered an error while processing your question. Please try again later."
+        finally:
+            if memory is not None:
+                self.memory.schedule_refresh(memory)
 
-    async def get_answer_stream(self, query: str, history: list = None):
+    async def get_answer_stream(self, query: str, history: list = None, chat_id: str = None, user_id: str = None):
         """Get answer using RAG pipeline with streaming support and conversation context"""
+        memory = None
         try:
+            # Fitting history to the budget hashes every message and may condense older turns: off the event loop
+            memory = await asyncio.to_thread(self.memory.build, history, chat_id, user_id)
+            history = memory.recent
+            # Small talk ("hi", "thanks", "who are you") skips retrieval and web search entirely
+            route = await asyncio.to_thread(self.intent_router.classify, query)
+            if route != RAG:
+                logger.info(f"Routed '{query[:50]}' as {route}; skipping retrieval")
+                yield await self._small_talk_answer(route, query, memory.text)
+                return
+
             # Contextualize the query using conversation history
             original_query = query
             if history:
-                query = self._contextualize_query(query, history)
+                query = self._contextualize_query(query, history, memory.summary)
                 if query != original_query:
                     logger.info(f"Query enhanced from '{original_query}' to '{query}'")
             
-            # Format history for the prompt
-            history_text = ""
-            if history:
-                history_text = "\n".join([
-                    f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}"
-                    for msg in history[-6:]  # Last 6 messages
-                ])
+            # History for the prompt: recent messages within the token budget, older ones summarized
+            history_text = memory.text
             
             # Check if we should search the web
             should_search = self._should_search_web(original_query)
             web_context = ""
             
-            if not self.should_use_rag(query) or should_search:
+            # Retrieval is blocking (embeddings + Qdrant), so keep it off the event loop
+            use_rag = await asyncio.to_thread(self.should_use_rag, query)
+            
+            if not use_rag or should_search:
                 logger.info(f"Query '{query}' doesn't match documents well. Searching the web...")
-                web_context = self.search_web(query)
+                web_context = await asyncio.to_thread(self.search_web, query)
                 
                 if web_context:
                     logger.info(f"Web search found results, enriching context")
             
-            if not self.should_use_rag(query):
+            if not use_rag:
                 if self.llm:
                     try:
                         # Include history and web context in the prompt
@@ -571,25 +754,17 @@ Instructions:
 - Answer based on the conversation context and web search results above
 - If there is prior conversation history, do NOT start with "Hello" - just answer directly
 - Only greet with "Hello" at the very start of a completely new conversation with no history"""
-                            async for chunk in self.llm.astream(contextual_prompt):
-                                if hasattr(chunk, 'content'):
-                                    text = chunk.content
-                                else:
-                                    text = str(chunk)
-                                
+                            async for text in self._astream_llm(contextual_prompt):
                                 for char in text:
                                     yield char
                                     await asyncio.sleep(0.01) # Faster streaming
                         else:
-                            contextual_prompt = """You are KCA Connect AI, the official AI assistant of KCA University. If asked about your name, identify yourself as KCA Connect AI.
+                            contextual_prompt = f"""You are KCA Connect AI, the official AI assistant of KCA University. If asked about your name, identify yourself as KCA Connect AI.
+
+Question: {original_query}
 
 Important: Only greet with "Hello" if this is the very first message. Otherwise, just answer directly."""
-                            async for chunk in self.llm.astream(contextual_prompt):
-                                if hasattr(chunk, 'content'):
-                                    text = chunk.content
-                                else:
-                                    text = str(chunk)
-                                
+                            async for text in self._astream_llm(contextual_prompt):
                                 for char in text:
                                     yield char
                                     await asyncio.sleep(0.01)
@@ -603,7 +778,7 @@ Important: Only greet with "Hello" if this is the very first message. Otherwise,
                     return
             
             # Use Hybrid Search
-            docs = self.search(query)
+            docs = await asyncio.to_thread(self.search, query)
             context = _format_document_context(docs)
             
             if self.llm:
@@ -616,12 +791,7 @@ Important: Only greet with "Hello" if this is the very first message. Otherwise,
                     )
                     
                     full_answer = ""
-                    async for chunk in self.llm.astream(prompt):
-                        if hasattr(chunk, 'content'):
-                            text = chunk.content
-                        else:
-                            text = str(chunk)
-                        
+                    async for text in self._astream_llm(prompt):
                         full_answer += text
                         for char in text:
                             yield char
@@ -647,5 +817,8 @@ Important: Only greet with "Hello" if this is the very first message. Otherwise,
         except Exception as e:
             logger.error(f"Error generating streaming answer: {e}")
             yield "I encountered an error while processing your question. Please try again later."
+        finally:
+            if memory is not None:
+                self.memory.schedule_refresh(memory)
 
 rag_service = RagService()
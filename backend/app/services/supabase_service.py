@@ -0,0 +1,194 @@
+"""
+Supabase data-access layer for KCA Connect AI
+Issues PostgREST, Storage and Auth calls over one long-lived, pooled HTTP client
+"""
+import importlib.util
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseService:
+    def __init__(self):
+        self.base_url = settings.SUPABASE_URL.rstrip("/")
+        # HTTP/2 multiplexing only when the optional h2 package is installed
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self.client = httpx.Client(http2=self.http2, timeout=self._timeout(), limits=self._limits())
+        # Async pool for code running on the event loop (e.g. admin analytics fan-out)
+        self.async_client = httpx.AsyncClient(http2=self.http2, timeout=self._timeout(), limits=self._limits())
+
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(30.0, connect=5.0)
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=60.0,
+        )
+
+    def close(self):
+        """Close pooled connections (called on application shutdown)"""
+        self.client.close()
+
+    async def aclose(self):
+        """Close the sync and async pools (called on application shutdown)"""
+        self.client.close()
+        await self.async_client.aclose()
+
+    def _headers(self, token: Optional[str] = None, prefer: Optional[str] = None) -> Dict[str, str]:
+        """
+        Build request headers.
+        With a user token the request runs under that user's RLS policies;
+        without one it uses the service role key.
+        """
+        if token:
+            headers = {"Authorization": f"Bearer {token}", "apikey": settings.SUPABASE_ANON_KEY}
+        else:
+            headers = {
+                "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+                "apikey": settings.SUPABASE_SERVICE_KEY,
+            }
+        if prefer:
+            headers["Prefer"] = prefer
+        return headers
+
+    # ============ PostgREST ============
+
+    def select(self, table: str, params: Dict[str, Any], token: Optional[str] = None, count: bool = False):
+        """
+        SELECT rows from a table using PostgREST query params
+        (e.g. {"select": "id,title", "user_id": "eq.<id>"}).
+        Returns the rows, or (rows, total) when count=True.
+        """
+        response = self.client.get(
+            f"{self.base_url}/rest/v1/{table}",
+            headers=self._headers(token, prefer="count=exact" if count else None),
+            params=params,
+        )
+        response.raise_for_status()
+        if not count:
+            return response.json()
+        content_range = response.headers.get("content-range", "*/0")
+        total = content_range.split("/")[-1]
+        return response.json(), int(total) if total.isdigit() else 0
+
+    def insert(self, table: str, data: Any, token: Optional[str] = None) -> list:
+        """INSERT one row (dict) or many rows (list) and return the created rows"""
+        response = self.client.post(
+            f"{self.base_url}/rest/v1/{table}",
+            headers=self._headers(token, prefer="return=representation"),
+            json=data,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def update(self, table: str, filters: Dict[str, str], data: dict, token: Optional[str] = None) -> list:
+        """UPDATE rows matching PostgREST filters and return the updated rows"""
+        response = self.client.patch(
+            f"{self.base_url}/rest/v1/{table}",
+            headers=self._headers(token, prefer="return=representation"),
+            params=filters,
+            json=data,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def delete(self, table: str, filters: Dict[str, str], token: Optional[str] = None) -> list:
+        """DELETE rows matching PostgREST filters and return the deleted rows"""
+        response = self.client.delete(
+            f"{self.base_url}/rest/v1/{table}",
+            headers=self._headers(token, prefer="return=representation"),
+            params=filters,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def rpc(self, function: str, params: Optional[dict] = None, token: Optional[str] = None):
+        """Call a Postgres function exposed through PostgREST"""
+        response = self.client.post(
+            f"{self.base_url}/rest/v1/rpc/{function}",
+            headers=self._headers(token),
+            json=params or {},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def aselect(self, table: str, params: Dict[str, Any], token: Optional[str] = None):
+        """Async variant of select (without count)"""
+        response = await self.async_client.get(
+            f"{self.base_url}/rest/v1/{table}",
+            headers=self._headers(token),
+            params=params,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def arpc(self, function: str, params: Optional[dict] = None, token: Optional[str] = None):
+        """Async variant of rpc"""
+        response = await self.async_client.post(
+            f"{self.base_url}/rest/v1/rpc/{function}",
+            headers=self._headers(token),
+            json=params or {},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    # ============ Storage ============
+
+    def upload_file(self, bucket: str, path: str, content, content_type: str,
+                    token: Optional[str] = None, upsert: bool = False) -> dict:
+        """Upload an object to Supabase Storage (content: bytes, or a binary file object to stream)"""
+        headers = self._headers(token)
+        headers["Content-Type"] = content_type or "application/octet-stream"
+        if upsert:
+            headers["x-upsert"] = "true"
+        response = self.client.post(
+            f"{self.base_url}/storage/v1/object/{bucket}/{path}",
+            headers=headers,
+            content=content,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_public_url(self, bucket: str, path: str) -> str:
+        """Public URL of an object in a public bucket (no request needed)"""
+        return f"{self.base_url}/storage/v1/object/public/{bucket}/{path}"
+
+    # ============ Auth ============
+
+    def update_user_metadata(self, token: str, data: dict) -> dict:
+        """Merge data into the calling user's user_metadata and return the updated user"""
+        response = self.client.put(
+            f"{self.base_url}/auth/v1/user",
+            headers=self._headers(token),
+            json={"data": data},
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+    def list_auth_users(self, page: int = 1, per_page: int = 50):
+        """
+        One page of the auth user directory (admin API, service role only).
+        Returns (users, total); total is None if the server does not report it.
+        """
+        response = self.client.get(
+            f"{self.base_url}/auth/v1/admin/users",
+            headers=self._headers(),
+            params={"page": page, "per_page": per_page},
+        )
+        response.raise_for_status()
+        total = response.headers.get("x-total-count")
+        return response.json().get("users", []), int(total) if total and total.isdigit() else None
+
+
+# Singleton instance
+supabase_service = SupabaseService()
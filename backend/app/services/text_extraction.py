@@ -0,0 +1,116 @@
+"""
+Document text extraction for KCA Connect AI
+Loading and cleaning are plain functions of a file path so they can run in
+extraction worker processes; this module must stay free of heavy imports
+(no embedding models or service singletons)
+"""
+import signal
+from typing import Iterator, List
+
+from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
+
+from app.services.text_normalization import NORMALIZATION_VERSION, normalize_text
+
+SUPPORTED_TYPES = {".pdf", ".docx", ".txt"}
+
+
+def _loader(path: str, suffix: str):
+    suffix = suffix.lower()
+    if suffix == ".pdf":
+        return PyPDFLoader(path)
+    elif suffix == ".docx":
+        return Docx2txtLoader(path)
+    elif suffix == ".txt":
+        return TextLoader(path, encoding="utf-8")
+    # For images, we would use a Vision model here.
+    raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def load_documents(path: str, suffix: str) -> list:
+    """
+    Load a saved file into LangChain documents (one per PDF page).
+    Raises ValueError for unsupported file types.
+    """
+    return _loader(path, suffix).load()
+
+
+def iter_pages(path: str, suffix: str) -> Iterator[dict]:
+    """
+    Lazily load and clean a file one page at a time (same records as extract_pages),
+    so only the current page is held in memory.
+    Raises ValueError for unsupported file types.
+    """
+    for doc in _loader(path, suffix).lazy_load():
+        yield {
+            "page_content": clean_text(doc.page_content),
+            "metadata": dict(doc.metadata, normalized_version=NORMALIZATION_VERSION),
+        }
+
+
+def clean_text(text: str) -> str:
+    """
+    Clean extracted text to fix common PDF extraction artifacts.
+    e.g. "wordWord" -> "word Word", "end.Start" -> "end. Start"
+    """
+    return normalize_text(text, unwrap_lines=True)
+
+
+# ============ Worker Process Entry Points ============
+
+def init_worker(memory_limit_bytes: int):
+    """Process pool initializer: cap the worker's address space (Unix only)"""
+    if memory_limit_bytes <= 0:
+        return
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("Extraction timed out")
+
+
+def extract_pages(path: str, suffix: str, timeout_seconds: float = 0) -> List[dict]:
+    """
+    Load and clean a file, returning picklable pages: [{"page_content", "metadata"}].
+    With a timeout the work is interrupted by SIGALRM, so the worker survives.
+    """
+    use_alarm = timeout_seconds > 0 and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        return [
+            {
+                "page_content": clean_text(doc.page_content),
+                "metadata": dict(doc.metadata, normalized_version=NORMALIZATION_VERSION),
+            }
+            for doc in load_documents(path, suffix)
+        ]
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def stream_pages(path: str, suffix: str, queue, stop, timeout_seconds: float = 0):
+    """
+    Streaming counterpart of extract_pages: put each cleaned page on queue (a manager
+    queue, bounded so only a few pages are buffered), then None as the end marker.
+    Stops after the current page once stop (a manager event) is set; errors reach the
+    caller through the task's future.
+    """
+    use_alarm = timeout_seconds > 0 and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        for page in iter_pages(path, suffix):
+            if stop.is_set():
+                break
+            queue.put(page)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        queue.put(None)
@@ -0,0 +1,60 @@
+"""
+Text normalization for KCA Connect AI
+The one place chunk text is normalized. It runs once at ingest and the
+result is stamped into the chunk payload (metadata.normalized_version), so
+retrieved chunks go into prompts as stored. Bump NORMALIZATION_VERSION when
+the rules change, then run migrate_normalized_payloads.py.
+"""
+import re
+from typing import List
+
+NORMALIZATION_VERSION = 1
+
+# Layout repair for extracted documents (PDF/DOCX): paragraphs are blank lines,
+# single newlines are soft wraps
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SOFT_WRAP = re.compile(r'\n')
+_PARAGRAPH_MARK = '<PARAGRAPH>'
+
+# Inline repairs, safe for structured (markdown) text too
+_INLINE_RULES = [
+    # Fix camelCase-like merges (e.g. "RequirementsTo" -> "Requirements To")
+    (re.compile(r'(?<=[a-z])(?=[A-Z])'), ' '),
+    # Fix UpperTitle merges (e.g. SYSTEMSIf -> SYSTEMS If)
+    (re.compile(r'(?<=[A-Z])(?=[A-Z][a-z])'), ' '),
+    # Fix period followed by Uppercase (e.g. ac.keHe -> ac.ke He)
+    (re.compile(r'(?<=[a-z]\.)(?=[A-Z])'), ' '),
+    # Collapse multiple spaces
+    (re.compile(r'[ \t]+'), ' '),
+]
+
+
+def normalize_text(text: str, unwrap_lines: bool = True) -> str:
+    """
+    Normalize chunk text. unwrap_lines joins soft-wrapped lines (extracted
+    documents); leave it off for text whose line structure matters (markdown).
+    """
+    if not text:
+        return ""
+
+    if unwrap_lines:
+        text = _PARAGRAPH_BREAK.sub(_PARAGRAPH_MARK, text)
+        text = _SOFT_WRAP.sub(' ', text)
+        text = text.replace(_PARAGRAPH_MARK, '\n\n')
+
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+
+    return text.strip()
+
+
+def is_normalized(metadata: dict) -> bool:
+    return (metadata or {}).get("normalized_version") == NORMALIZATION_VERSION
+
+
+def normalize_documents(documents: List, unwrap_lines: bool = True) -> List:
+    """Normalize LangChain documents in place and stamp their metadata"""
+    for doc in documents:
+        doc.page_content = normalize_text(doc.page_content, unwrap_lines=unwrap_lines)
+        doc.metadata["normalized_version"] = NORMALIZATION_VERSION
+    return documents
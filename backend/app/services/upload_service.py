@@ -0,0 +1,66 @@
+"""
+Upload spooling for KCA Connect AI
+Streams an upload to disk exactly once, enforcing the size limit and hashing
+it on the way, so storage, extraction and ingestion all read the same file
+"""
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+
+_CHUNK_BYTES = 1024 * 1024
+
+
+class SpooledUpload:
+    """An upload written to disk, with its size and SHA-256"""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def spool_upload(file: UploadFile, path: Optional[str] = None,
+                       max_bytes: Optional[int] = None) -> SpooledUpload:
+    """
+    Write the upload to path (a new temp file with the same extension if None).
+    Raises 413 (and removes the partial file) once max_bytes is exceeded.
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large (limit {max_bytes // (1024 * 1024)} MB)")
+
+    if path is None:
+        suffix = os.path.splitext(file.filename or "")[1].lower()
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        out = os.fdopen(fd, "wb")
+    else:
+        out = open(path, "wb")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with out:
+            while True:
+                chunk = await file.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413, detail=f"File too large (limit {max_bytes // (1024 * 1024)} MB)"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(path, size, digest.hexdigest())
@@ -0,0 +1,76 @@
+"""
+Admin user directory for KCA Connect AI
+Pages the Supabase auth user list at the source, caches pages briefly and
+fetches chat counts for a whole page in one grouped query
+"""
+import logging
+import threading
+import time
+from typing import List
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+
+class UserDirectoryService:
+    def __init__(self):
+        self.ttl_seconds = settings.ADMIN_USERS_CACHE_TTL_SECONDS
+        # (page, per_page) -> (users, total, fetched_at)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Drop cached pages (after creating, updating or deleting users)"""
+        with self._lock:
+            self._pages.clear()
+
+    def _fetch_page(self, page: int, per_page: int):
+        key = (page, per_page)
+        with self._lock:
+            entry = self._pages.get(key)
+        if entry and time.monotonic() - entry[2] < self.ttl_seconds:
+            metrics.incr("admin_users.cache_hit")
+            return entry[0], entry[1]
+
+        metrics.incr("admin_users.cache_miss")
+        users, total = supabase_service.list_auth_users(page=page, per_page=per_page)
+        if total is None:
+            # Older auth servers don't send X-Total-Count
+            total = supabase_service.rpc("get_total_users") or 0
+        with self._lock:
+            self._pages[key] = (users, total, time.monotonic())
+            # Stale pages are only useful until their TTL; keep the dict small
+            now = time.monotonic()
+            for stale in [k for k, v in self._pages.items() if now - v[2] >= self.ttl_seconds]:
+                del self._pages[stale]
+        return users, total
+
+    def list_users(self, limit: int = 50, offset: int = 0):
+        """
+        Users [offset, offset + limit) of the auth directory.
+        Pages are sized by limit, so aligned offsets (the admin UI's) cost one request.
+        Returns (users, total).
+        """
+        limit = max(limit, 1)
+        offset = max(offset, 0)
+        first_page = offset // limit + 1
+        users, total = self._fetch_page(first_page, limit)
+        skip = offset % limit
+        if skip:
+            next_users, total = self._fetch_page(first_page + 1, limit)
+            users = users + next_users
+        return users[skip:skip + limit], total
+
+    def chat_counts(self, user_ids: List[str]) -> dict:
+        """Number of chats per user id, for a whole page in one query (migration 008)"""
+        if not user_ids:
+            return {}
+        rows = supabase_service.rpc("get_chat_counts", {"user_ids": user_ids}) or []
+        return {row["user_id"]: row["count"] for row in rows}
+
+
+# Singleton instance
+user_directory_service = UserDirectoryService()
@@ -0,0 +1,18 @@
+from app.services.supabase_service import supabase_service
+import sys
+
+def backfill_analytics_rollups():
+    """Rebuild the analytics_daily rollups (migration 007) from chats and user_sessions"""
+    print("Rebuilding analytics rollups...")
+    
+    try:
+        days = supabase_service.rpc("backfill_analytics_rollups")
+    except Exception as e:
+        print(f"Error while backfilling analytics rollups: {e}")
+        sys.exit(1)
+    
+    print(f"Backfill complete! {days} days of analytics rolled up.")
+    print("Set ANALYTICS_ROLLUPS=true to serve the admin dashboard from the rollups.")
+
+if __name__ == "__main__":
+    backfill_analytics_rollups()
@@ -0,0 +1,26 @@
+from app.services.supabase_service import supabase_service
+import sys
+
+def backfill_chat_messages(batch_size: int = 500, clear_blob: bool = False):
+    """Copy chats.messages blobs into chat_messages (migration 004) in batches"""
+    print(f"Backfilling chat_messages in batches of {batch_size}...")
+    
+    total = 0
+    try:
+        while True:
+            migrated = supabase_service.rpc(
+                "backfill_chat_messages",
+                {"batch_size": batch_size, "clear_blob": clear_blob}
+            )
+            if not migrated:
+                break
+            total += migrated
+            print(f"Migrated {total} chats so far...")
+    except Exception as e:
+        print(f"Error while backfilling chat messages: {e}")
+        sys.exit(1)
+    
+    print(f"Backfill complete! {total} chats migrated.")
+
+if __name__ == "__main__":
+    backfill_chat_messages(clear_blob="--clear-blob" in sys.argv)
@@ -1,28 +1,22 @@
 import os
 import glob
+import argparse
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
 from app.core.config import settings
+from app.services.collection_aliases import collection_exists, ensure_collection
+from app.services.embedding_pipeline import EmbeddingPipeline, create_qdrant_client
+from app.services.embedding_store import CachedEmbeddings, with_embedding_store
+from app.services.incremental_index import IncrementalIndexer, IngestManifest, file_hash
+from app.services.text_normalization import normalize_documents
 
-def ingest_docs():
-    # 1. Load Documents (TXT files)
-    txt_files = glob.glob("../pdf documents/*.txt")
-    documents = []
-    
-    for txt_file in txt_files:
-        print(f"Loading {txt_file}...")
-        loader = TextLoader(txt_file, encoding='utf-8')
-        documents.extend(loader.load())
-
-    if not documents:
-        print("No documents found to ingest.")
-        return
+def split_file(txt_file):
+    """Load one TXT file and split it into chunks"""
+    loader = TextLoader(txt_file, encoding='utf-8')
+    documents = loader.load()
 
-    # 2. Split Text - First by Markdown Headers to preserve context
+    # Split Text - First by Markdown Headers to preserve context
     # Define headers to split on
     headers_to_split_on = [
         ("#", "Header 1"),
@@ -45,8 +39,6 @@ def ingest_docs():
             split.metadata["source"] = os.path.basename(doc.metadata.get("source", "unknown"))
         md_splits.extend(splits)
     
-    print(f"Split by headers into {len(md_splits)} sections.")
-    
     # Second pass: split large sections into smaller chunks
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
@@ -54,32 +46,94 @@ def ingest_docs():
         add_start_index=True,  # Helps track where chunks come from
     )
     
-    texts = text_splitter.split_documents(md_splits)
-    print(f"Split into {len(texts)} chunks.")
+    # Normalize once here (keeping markdown line structure) so retrieval needs no cleanup
+    return normalize_documents(text_splitter.split_documents(md_splits), unwrap_lines=False)
 
-    # 3. Create/Reset Collection
-    client = QdrantClient(url=settings.QDRANT_URL)
-    
-    # Check if collection exists
-    collections = client.get_collections()
-    if settings.COLLECTION_NAME not in [c.name for c in collections.collections]:
-        client.create_collection(
-            collection_name=settings.COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
-        )
-        print(f"Created collection {settings.COLLECTION_NAME}")
+def ingest_docs(full=False, collection_name=None, manifest_path=None, embeddings=None):
+    """
+    Sync the corpus (settings.CORPUS_DIR) into the collection.
+    By default this is the live alias and manifest; reindex.py passes a new
+    collection, its own manifest and an already loaded model.
+    Returns the run totals.
+    """
+    # 1. Find Documents (TXT files)
+    txt_files = sorted(glob.glob(os.path.join(settings.CORPUS_DIR, "*.txt")))
 
-    # 4. Indexes
-    embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
-    
-    QdrantVectorStore.from_documents(
-        texts,
-        embeddings,
-        url=settings.QDRANT_URL,
-        collection_name=settings.COLLECTION_NAME,
+    # 2. Create Collection if needed (a versioned collection behind the alias)
+    client = create_qdrant_client()
+    if collection_name is None:
+        collection_name = settings.COLLECTION_NAME
+        if not collection_exists(client, collection_name):
+            print(f"Created collection {ensure_collection(client, collection_name)} as {collection_name}")
+
+    # The model is only loaded if something actually needs embedding
+    pipeline = EmbeddingPipeline(embeddings, client, collection_name)
+    # The manifest always records the alias: it describes whatever the alias serves
+    manifest = IngestManifest(manifest_path or settings.INGEST_MANIFEST_PATH, settings.COLLECTION_NAME,
+                              settings.EMBEDDING_MODEL)
+    indexer = IncrementalIndexer(
+        pipeline, manifest,
+        dedup_distance=settings.INGEST_DEDUP_MAX_HAMMING if settings.INGEST_DEDUP_ENABLED else None,
+        # Uploads deduplicated against the corpus link to corpus points; keep those when a file goes
+        dependent_manifests=lambda: [IngestManifest(settings.INGEST_UPLOAD_MANIFEST_PATH, settings.COLLECTION_NAME,
+                                                    settings.EMBEDDING_MODEL)]
     )
-    print("Ingestion complete!")
 
-if __name__ == "__main__":
-    ingest_docs()
+    # 3. Sync each file: unchanged files are skipped, changed files only re-embed changed chunks
+    totals = {"chunks": 0, "embedded": 0, "updated": 0, "deleted": 0, "unchanged": 0, "duplicates": 0,
+              "skipped_files": 0}
+    files = {os.path.basename(txt_file): txt_file for txt_file in txt_files}
 
+    def sync_file(source):
+        txt_file = files[source]
+        texts = split_file(txt_file)
+        print(f"Syncing {source} ({len(texts)} chunks)...")
+        if pipeline.embeddings is None:
+            pipeline.embeddings = with_embedding_store(HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL))
+        stats = indexer.sync(
+            source, texts, file_hash(txt_file), force=full,
+            on_progress=lambda done, total: print(f"  {done}/{total} chunks written", end="\r")
+        )
+        if stats["embedded"]:
+            print()
+            print(f"  {stats['chunks_per_second']} chunks/s; encode {stats['encode_seconds']}s, "
+                  f"upsert {stats['upsert_seconds']}s")
+        if stats["duplicates"]:
+            print(f"  {stats['duplicates']} near-duplicate chunks skipped")
+        for key in ("chunks", "embedded", "updated", "deleted", "unchanged", "duplicates"):
+            totals[key] += stats[key]
+
+    for source in files:
+        if not full and indexer.is_current(source, file_hash(files[source])):
+            totals["skipped_files"] += 1
+            continue
+        sync_file(source)
+
+    # 4. Remove files that are no longer in the corpus
+    for source in manifest.scopes():
+        if source not in files:
+            print(f"Removing {source} (file deleted)...")
+            totals["deleted"] += indexer.remove(source)
+
+    # 5. Files that inherited a chunk from a changed or removed file take it over properly
+    for source in sorted(indexer.invalidated):
+        if source in files:
+            print(f"Re-syncing {source} (took over a shared chunk)...")
+            sync_file(source)
+
+    print(f"Ingestion complete! {len(txt_files)} files ({totals['skipped_files']} unchanged): "
+          f"{totals['embedded']} chunks embedded, {totals['updated']} payloads updated, "
+          f"{totals['deleted']} deleted, {totals['unchanged']} unchanged")
+    if totals["chunks"]:
+        print(f"Deduplication: {totals['duplicates']} of {totals['chunks']} synced chunks were near-duplicates "
+              f"({100 * totals['duplicates'] / totals['chunks']:.1f}%)")
+    if isinstance(pipeline.embeddings, CachedEmbeddings):
+        print(f"Embedding store: {pipeline.embeddings.hits} vectors reused, "
+              f"{pipeline.embeddings.misses} encoded")
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally index the corpus into Qdrant")
+    parser.add_argument("--full", action="store_true", help="Re-embed every chunk, ignoring the manifest")
+    args = parser.parse_args()
+    ingest_docs(full=args.full)
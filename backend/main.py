@@ -1,5 +1,6 @@
 import os
 import json
+import base64
 from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File, Form
 from pydantic import BaseModel
 from typing import List, Optional
@@ -8,8 +9,15 @@ from fastapi.responses import StreamingResponse
 from app.services.rag_service import rag_service
 from app.services.web_search_service import web_search_service
 from app.core.config import settings
+from app.core.auth import extract_token, get_current_user
+from app.core.metrics import metrics
+from app.services.supabase_service import supabase_service
+from app.services.chat_service import chat_service
+from app.services.autosave_service import autosave_service
+from app.services.ingest_job_service import ingest_job_service
+from app.services.collection_aliases import collection_exists as qdrant_collection_exists, ensure_collection
+from app.services.index_snapshot import restore_on_startup
 from app.routes import admin
-from supabase import create_client, Client
 from uuid import UUID
 import logging
 import asyncio
@@ -19,9 +27,6 @@ from datetime import datetime
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-
 app = FastAPI(title="KCA Connect Agentic AI")
 
 # Configure CORS - use environment variable for production, allow all for development
@@ -43,29 +48,6 @@ from app.routes import admin, documents
 app.include_router(admin.router)
 app.include_router(documents.router)
 
-async def get_current_user(authorization: str = Header(None)):
-    """Dependency to verify Supabase JWT token"""
-    if not authorization:
-        logger.warning("Authorization header missing")
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-    
-    try:
-        # Expected format: "Bearer <token>"
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        logger.info(f"Verifying token: {token[:10]}...")
-        
-        # Verify with Supabase
-        user_response = supabase.auth.get_user(token)
-        if not user_response.user:
-            logger.warning("Invalid or expired token")
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        
-        logger.info(f"User authenticated: {user_response.user.email}")
-        return user_response.user
-    except Exception as e:
-        logger.error(f"Auth error during verification: {e}")
-        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
-
 class Message(BaseModel):
     role: str  # "user" or "assistant"
     content: str
@@ -73,6 +55,7 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[Message]] = []
+    chat_id: Optional[str] = None  # Lets the server reuse the chat's cached history summary
 
 class ChatResponse(BaseModel):
     response: str
@@ -90,9 +73,9 @@ def health_check():
     """Health check endpoint to verify service status"""
     try:
         # Check Qdrant connection
-        collections = rag_service.client.get_collections()
+        # COLLECTION_NAME is an alias (see reindex.py), which get_collections() does not list
+        collection_exists = qdrant_collection_exists(rag_service.client, settings.COLLECTION_NAME)
         qdrant_status = "connected"
-        collection_exists = settings.COLLECTION_NAME in [c.name for c in collections.collections]
     except Exception as e:
         logger.error(f"Qdrant health check failed: {e}")
         qdrant_status = "disconnected"
@@ -107,7 +90,7 @@ def health_check():
     }
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest, user=Depends(get_current_user)):
+async def chat(request: ChatRequest, user=Depends(get_current_user)):
     """Chat endpoint for RAG-based Q&A (Protected)"""
     try:
         if not request.message or not request.message.strip():
@@ -123,7 +106,9 @@ def chat(request: ChatRequest, user=Depends(get_current_user)):
         # Convert history to dict format for the RAG service
         history_dicts = [msg.model_dump() for msg in request.history] if request.history else []
         
-        answer = rag_service.get_answer(request.message, history=history_dicts)
+        answer = await rag_service.get_answer(
+            request.message, history=history_dicts, chat_id=request.chat_id, user_id=user.id
+        )
         logger.info(f"Generated response for user {user.id}")
         
         return ChatResponse(response=answer)
@@ -136,7 +121,7 @@ def chat(request: ChatRequest, user=Depends(get_current_user)):
             detail=f"An error occurred while processing your request: {str(e)}"
         )
 
-async def stream_answer_generator(message: str, user, history=None, user_metadata: Optional[dict] = None):
+async def stream_answer_generator(message: str, user, history=None, user_metadata: Optional[dict] = None, chat_id: Optional[str] = None):
     """Generator function for streaming responses"""
     try:
         msg_snippet = str(message)
@@ -144,7 +129,7 @@ async def stream_answer_generator(message: str, user, history=None, user_metadat
             msg_snippet = msg_snippet[:100] + "..."
         logger.info(f"Streaming response for user {user.id} - query: {msg_snippet}")
         
-        async for chunk in rag_service.get_answer_stream(message, history=history):
+        async for chunk in rag_service.get_answer_stream(message, history=history, chat_id=chat_id, user_id=user.id):
             yield f"data: {chunk}\n\n"
         
         yield "data: [DONE]\n\n"
@@ -153,7 +138,7 @@ async def stream_answer_generator(message: str, user, history=None, user_metadat
         yield f"data: ERROR: I encountered an error while processing your question. Please try again later.\n\n"
 
 @app.get("/chat/stream")
-async def chat_stream(message: str, history: str = "[]", user_metadata: str = "", user=Depends(get_current_user)):
+async def chat_stream(message: str, history: str = "[]", user_metadata: str = "", chat_id: Optional[str] = None, user=Depends(get_current_user)):
     """Streaming chat endpoint using Server-Sent Events (SSE)"""
     try:
         if not message or not message.strip():
@@ -175,7 +160,7 @@ async def chat_stream(message: str, history: str = "[]", user_metadata: str = ""
                 user_metadata_dict = {}
         
         return StreamingResponse(
-            stream_answer_generator(message, user, history=history_list, user_metadata=user_metadata_dict),
+            stream_answer_generator(message, user, history=history_list, user_metadata=user_metadata_dict, chat_id=chat_id),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -237,6 +222,7 @@ class ChatResponse(BaseModel):
 class ChatListResponse(BaseModel):
     chats: List[dict]
     total: int
+    next_cursor: Optional[str] = None
 
 @app.post("/web/search", response_model=WebSearchResponse)
 def web_search(request: WebSearchRequest, user=Depends(get_current_user)):
@@ -293,56 +279,69 @@ def fetch_url(request: UrlFetchRequest, user=Depends(get_current_user)):
 
 # ============ Chat History Endpoints ============
 
+CHAT_SUMMARY_COLUMNS = "id,title,is_saved,updated_at,total_messages"
+
+def _encode_chat_cursor(chat: dict) -> str:
+    """Opaque keyset cursor for the (updated_at, id) position of a chat"""
+    raw = json.dumps([chat["updated_at"], chat["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_chat_cursor(cursor: str):
+    """Decode a cursor from _encode_chat_cursor into (updated_at, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, chat_id = json.loads(base64.urlsafe_b64decode(padded))
+        UUID(chat_id)
+        return str(updated_at), chat_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/chats", response_model=ChatListResponse)
 def get_chats(
     limit: int = 50, 
     offset: int = 0, 
     saved_only: bool = False,
-    user=Depends(get_current_user)
+    view: str = "full",
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+    authorization: str = Header(None)
 ):
     """
     Get all chats for the authenticated user (with pagination)
+    view=summary returns only id, title, is_saved, updated_at and total_messages
+    (no message bodies). Pass next_cursor back as cursor to get the next page;
+    keyset paging on (updated_at, id) replaces offset when a cursor is given.
     """
     try:
-        logger.info(f"Fetching chats for user {user.id}, saved_only={saved_only}")
-        
-        # Use httpx directly to bypass any Supabase client issues
-        import httpx
+        logger.info(f"Fetching chats for user {user.id}, saved_only={saved_only}, view={view}")
         
-        headers = {
-            "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
-            "apikey": settings.SUPABASE_SERVICE_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        # Build query URL
         params = {
-            "select": "*",
+            "select": CHAT_SUMMARY_COLUMNS if view == "summary" else "*",
             "user_id": f"eq.{user.id}",
-            "order": "updated_at.desc",
-            "offset": offset,
+            "order": "updated_at.desc,id.desc",
             "limit": limit
         }
         
+        if cursor:
+            updated_at, chat_id = _decode_chat_cursor(cursor)
+            params["or"] = f'(updated_at.lt."{updated_at}",and(updated_at.eq."{updated_at}",id.lt.{chat_id}))'
+        elif offset:
+            params["offset"] = offset
+        
         if saved_only:
             params["is_saved"] = "eq.true"
         
-        with httpx.Client() as client:
-            url = f"{settings.SUPABASE_URL}/rest/v1/chats"
-            response = client.get(url, headers=headers, params=params)
-            
-            logger.info(f"Direct REST API response status: {response.status_code}")
-            logger.info(f"Direct REST API response: {response.text}")
-            
-            if response.status_code == 200:
-                chats = response.json()
-                return {
-                    "chats": chats,
-                    "total": len(chats)
-                }
-            else:
-                logger.error(f"Failed to fetch chats: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=500, detail="Failed to fetch chats")
+        token = extract_token(authorization)
+        chats = supabase_service.select("chats", params, token=token)
+        if view != "summary":
+            # In messages mode the rows' blobs are empty; callers loading a chat need its messages
+            chats = chat_service.hydrate_many(chats, token)
+        next_cursor = _encode_chat_cursor(chats[-1]) if len(chats) == limit else None
+        return {
+            "chats": chats,
+            "total": len(chats),
+            "next_cursor": next_cursor
+        }
         
     except HTTPException:
         raise
@@ -350,74 +349,99 @@ def get_chats(
         logger.error(f"Error fetching chats: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch chats")
 
+def _chat_response(chat: dict) -> dict:
+    """Shape a chats row into a ChatResponse payload"""
+    return {
+        "id": chat["id"],
+        "user_id": chat["user_id"],
+        "title": chat["title"],
+        "messages": chat["messages"],
+        "is_saved": chat["is_saved"],
+        "created_at": chat["created_at"],
+        "updated_at": chat["updated_at"]
+    }
+
+def _title_from_messages(messages: list) -> Optional[str]:
+    """Generate a chat title from the first message"""
+    if not messages:
+        return None
+    first_msg = messages[0].content if hasattr(messages[0], 'content') else messages[0]['content']
+    return first_msg[:50] + "..." if len(first_msg) > 50 else first_msg
+
 @app.get("/chats/{chat_id}", response_model=ChatResponse)
-def get_chat(chat_id: str, user=Depends(get_current_user)):
+def get_chat(chat_id: str, message_limit: Optional[int] = None, user=Depends(get_current_user), authorization: str = Header(None)):
     """
     Get a specific chat by ID
+    With message_limit, only the most recent messages are returned (see /chats/{chat_id}/messages for older ones)
     """
     try:
-        result = supabase.table("chats").select("*").eq("id", chat_id).eq("user_id", user.id).execute()
+        token = extract_token(authorization)
+        rows = supabase_service.select(
+            "chats",
+            {"select": "*", "id": f"eq.{chat_id}", "user_id": f"eq.{user.id}"},
+            token=token
+        )
         
-        if not result.data or len(result.data) == 0:
+        if not rows:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        chat = result.data[0]
-        return {
-            "id": chat["id"],
-            "user_id": chat["user_id"],
-            "title": chat["title"],
-            "messages": chat["messages"],
-            "is_saved": chat["is_saved"],
-            "created_at": chat["created_at"],
-            "updated_at": chat["updated_at"]
-        }
+        return _chat_response(chat_service.hydrate_messages(rows[0], token, limit=message_limit))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching chat: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch chat")
 
+class ChatMessagesPage(BaseModel):
+    messages: List[dict]
+    next_before_seq: Optional[int] = None
+
+@app.get("/chats/{chat_id}/messages", response_model=ChatMessagesPage)
+def get_chat_messages(
+    chat_id: str,
+    limit: int = 50,
+    before_seq: Optional[int] = None,
+    user=Depends(get_current_user),
+    authorization: str = Header(None)
+):
+    """
+    Page through a chat's messages, newest first by page (messages within a page are in order).
+    Pass next_before_seq from the previous page as before_seq to load older messages.
+    """
+    try:
+        if not chat_service.append_only:
+            raise HTTPException(status_code=400, detail="Message pagination requires CHAT_STORAGE_MODE=messages")
+        
+        limit = max(1, min(limit, 200))
+        rows = chat_service.list_messages(chat_id, extract_token(authorization), limit=limit, before_seq=before_seq)
+        
+        # RLS hides other users' rows, so an empty first page may also mean "not yours"
+        next_before_seq = rows[0]["seq"] if len(rows) == limit and rows[0]["seq"] > 0 else None
+        return {"messages": rows, "next_before_seq": next_before_seq}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching chat messages: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch chat messages")
+
 @app.post("/chats", response_model=ChatResponse)
 def create_chat(request: CreateChatRequest, user=Depends(get_current_user), authorization: str = Header(None)):
     """
     Create a new chat
     """
     try:
-        # Extract the user's JWT token
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        
-        # Create a new Supabase client with the user's token for authenticated operations
-        user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, user.id)
+        token = extract_token(authorization)
         
         # Generate title from first message if not provided
-        title = request.title
-        if not title and request.messages:
-            first_msg = request.messages[0].content if hasattr(request.messages[0], 'content') else request.messages[0]['content']
-            title = first_msg[:50] + "..." if len(first_msg) > 50 else first_msg
-        
-        chat_data = {
-            "user_id": user.id,
-            "title": title or "New Chat",
-            "messages": [m.model_dump() if hasattr(m, 'model_dump') else m for m in request.messages],
-            "is_saved": False
-        }
+        title = request.title or _title_from_messages(request.messages)
         
-        result = user_supabase.table("chats").insert(chat_data).execute()
+        messages = [m.model_dump() if hasattr(m, 'model_dump') else m for m in request.messages]
+        chat = chat_service.create_chat(user.id, title or "New Chat", messages, token)
         
-        if not result.data:
+        if not chat:
             raise HTTPException(status_code=500, detail="Failed to create chat")
         
-        chat = result.data[0]
-        return {
-            "id": chat["id"],
-            "user_id": chat["user_id"],
-            "title": chat["title"],
-            "messages": chat["messages"],
-            "is_saved": chat["is_saved"],
-            "created_at": chat["created_at"],
-            "updated_at": chat["updated_at"]
-        }
+        return _chat_response(chat)
     except HTTPException:
         raise
     except Exception as e:
@@ -430,44 +454,33 @@ def update_chat(chat_id: str, request: UpdateChatRequest, user=Depends(get_curre
     Update an existing chat (messages, title, or saved status)
     """
     try:
-        # Extract the user's JWT token
-        token = authorization.split(" ")[1] if " " in authorization else authorization
+        token = extract_token(authorization)
         
-        # Create a new Supabase client with the user's token for authenticated operations
-        user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, user.id)
-        
-        # First verify the chat belongs to the user
-        check = user_supabase.table("chats").select("id").eq("id", chat_id).eq("user_id", user.id).execute()
-        if not check.data or len(check.data) == 0:
-            raise HTTPException(status_code=404, detail="Chat not found")
+        if request.messages is not None and chat_service.append_only:
+            messages = [m.model_dump() for m in request.messages]
+            if not chat_service.save_messages(chat_id, user.id, messages, token, title=request.title, replace=True):
+                raise HTTPException(status_code=404, detail="Chat not found")
         
         # Build update data
         update_data = {}
         if request.title is not None:
             update_data["title"] = request.title
-        if request.messages is not None:
+        if request.messages is not None and not chat_service.append_only:
             update_data["messages"] = [m.model_dump() if hasattr(m, 'model_dump') else m for m in request.messages]
         if request.is_saved is not None:
             update_data["is_saved"] = request.is_saved
         
         update_data["updated_at"] = datetime.utcnow().isoformat()
         
-        result = user_supabase.table("chats").update(update_data).eq("id", chat_id).execute()
+        # Filtering on user_id makes the ownership check part of the update itself
+        rows = supabase_service.update(
+            "chats", {"id": f"eq.{chat_id}", "user_id": f"eq.{user.id}"}, update_data, token=token
+        )
         
-        if not result.data:
-            raise HTTPException(status_code=500, detail="Failed to update chat")
+        if not rows:
+            raise HTTPException(status_code=404, detail="Chat not found")
         
-        chat = result.data[0]
-        return {
-            "id": chat["id"],
-            "user_id": chat["user_id"],
-            "title": chat["title"],
-            "messages": chat["messages"],
-            "is_saved": chat["is_saved"],
-            "created_at": chat["created_at"],
-            "updated_at": chat["updated_at"]
-        }
+        return _chat_response(chat_service.hydrate_messages(rows[0], token))
     except HTTPException:
         raise
     except Exception as e:
@@ -480,20 +493,12 @@ def delete_chat(chat_id: str, user=Depends(get_current_user), authorization: str
     Delete a chat
     """
     try:
-        # Extract the user's JWT token
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        
-        # Create a new Supabase client with the user's token for authenticated operations
-        user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, user.id)
-        
-        # First verify the chat belongs to the user
-        check = user_supabase.table("chats").select("id").eq("id", chat_id).eq("user_id", user.id).execute()
-        if not check.data or len(check.data) == 0:
+        rows = supabase_service.delete(
+            "chats", {"id": f"eq.{chat_id}", "user_id": f"eq.{user.id}"}, token=extract_token(authorization)
+        )
+        if not rows:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        user_supabase.table("chats").delete().eq("id", chat_id).execute()
-        
         return {"message": "Chat deleted successfully"}
     except HTTPException:
         raise
@@ -507,26 +512,26 @@ def toggle_save_chat(chat_id: str, user=Depends(get_current_user), authorization
     Toggle the saved status of a chat
     """
     try:
-        # Extract the user's JWT token
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        
-        # Create a new Supabase client with the user's token for authenticated operations
-        user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, user.id)
+        token = extract_token(authorization)
         
         # First get current status
-        result = user_supabase.table("chats").select("id, is_saved").eq("id", chat_id).eq("user_id", user.id).execute()
+        rows = supabase_service.select(
+            "chats",
+            {"select": "id,is_saved", "id": f"eq.{chat_id}", "user_id": f"eq.{user.id}"},
+            token=token
+        )
         
-        if not result.data or len(result.data) == 0:
+        if not rows:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        current_status = result.data[0]["is_saved"]
-        new_status = not current_status
+        new_status = not rows[0]["is_saved"]
         
-        update_result = user_supabase.table("chats").update({
-            "is_saved": new_status,
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", chat_id).execute()
+        supabase_service.update(
+            "chats",
+            {"id": f"eq.{chat_id}", "user_id": f"eq.{user.id}"},
+            {"is_saved": new_status, "updated_at": datetime.utcnow().isoformat()},
+            token=token
+        )
         
         return {
             "message": f"Chat {'saved' if new_status else 'unsaved'} successfully",
@@ -539,96 +544,104 @@ def toggle_save_chat(chat_id: str, user=Depends(get_current_user), authorization
         raise HTTPException(status_code=500, detail="Failed to update save status")
 
 @app.post("/chats/saved", response_model=ChatListResponse)
-def get_saved_chats(limit: int = 50, offset: int = 0, user=Depends(get_current_user)):
+def get_saved_chats(
+    limit: int = 50,
+    offset: int = 0,
+    view: str = "full",
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+    authorization: str = Header(None)
+):
     """
     Get all saved chats for the authenticated user
     """
-    return get_chats(limit=limit, offset=offset, saved_only=True, user=user)
+    return get_chats(limit=limit, offset=offset, saved_only=True, view=view, cursor=cursor, user=user, authorization=authorization)
 
 class AutoSaveRequest(BaseModel):
     title: Optional[str] = None
     messages: List[ChatMessage]
     chat_id: Optional[str] = None
+    # Position of messages[0] in the conversation, so clients can send only new messages
+    # (requires CHAT_STORAGE_MODE=messages)
+    message_offset: Optional[int] = None
 
 @app.post("/auto-save")
-def auto_save_chat(request: AutoSaveRequest, user=Depends(get_current_user)):
+async def auto_save_chat(request: AutoSaveRequest, user=Depends(get_current_user), authorization: str = Header(None)):
     """
     Auto-save chat: Creates a new chat or updates existing one
     If chat_id is provided, updates that chat. Otherwise creates new.
+    Updates to a chat already saved by this process are buffered and coalesced
+    (AUTOSAVE_COALESCING); the first save of a chat is written immediately, and so is
+    the next save after a buffered write failed, so the failure reaches the client.
     """
     try:
-        import httpx
+        token = extract_token(authorization)
         
-        # Generate title from first message if not provided
+        # Generate title from first message if not provided (a partial update keeps the stored title)
         title = request.title
-        if not title and request.messages:
-            first_msg = request.messages[0].content if hasattr(request.messages[0], 'content') else request.messages[0]['content']
-            title = first_msg[:50] + "..." if len(first_msg) > 50 else first_msg
-        
-        headers = {
-            "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
-            "apikey": settings.SUPABASE_SERVICE_KEY,
-            "Content-Type": "application/json",
-            "Prefer": "return=representation"
-        }
-        
-        with httpx.Client() as client:
-            # If chat_id provided, try to update existing chat
-            if request.chat_id:
-                # First verify the chat belongs to the user
-                check_url = f"{settings.SUPABASE_URL}/rest/v1/chats?id=eq.{request.chat_id}&user_id=eq.{user.id}"
-                check_response = client.get(check_url, headers=headers)
-                
-                if check_response.status_code == 200 and check_response.json():
-                    # Chat exists and belongs to user - UPDATE it
-                    update_data = {
-                        "title": title or "New Chat",
-                        "messages": [m.model_dump() if hasattr(m, 'model_dump') else m for m in request.messages],
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                    
-                    update_url = f"{settings.SUPABASE_URL}/rest/v1/chats?id=eq.{request.chat_id}"
-                    update_response = client.patch(update_url, headers=headers, json=update_data)
-                    
-                    logger.info(f"Auto-save update response status: {update_response.status_code}")
-                    
-                    if update_response.status_code in [200, 201]:
-                        result = update_response.json()
-                        logger.info(f"Chat auto-saved (updated) successfully: {request.chat_id}")
-                        return {
-                            "success": True,
-                            "chat_id": request.chat_id,
-                            "message": "Chat updated successfully"
-                        }
-            
-            # Either no chat_id provided, or update failed - CREATE new chat
-            chat_data = {
-                "user_id": user.id,
-                "title": title or "New Chat",
-                "messages": [m.model_dump() if hasattr(m, 'model_dump') else m for m in request.messages],
-                "is_saved": False
+        if not title and not request.message_offset:
+            title = _title_from_messages(request.messages) or "New Chat"
+        messages = [m.model_dump() if hasattr(m, 'model_dump') else m for m in request.messages]
+        
+        if request.message_offset and not chat_service.append_only:
+            raise ValueError("Partial message updates require CHAT_STORAGE_MODE=messages")
+        
+        # Ownership of this chat was confirmed by an earlier write - buffer the update
+        if request.chat_id and settings.AUTOSAVE_COALESCING and autosave_service.is_verified(request.chat_id, user.id):
+            written = await autosave_service.submit(
+                request.chat_id, user.id, token, messages,
+                title=title, offset=request.message_offset
+            )
+            if written or autosave_service.has_failed(request.chat_id):
+                error = await autosave_service.flush_now(request.chat_id, user.id)
+                if error:
+                    raise HTTPException(status_code=500, detail=f"Failed to auto-save chat: {error}")
+                return {
+                    "success": True,
+                    "chat_id": request.chat_id,
+                    "message": "Chat updated successfully"
+                }
+            return {
+                "success": True,
+                "chat_id": request.chat_id,
+                "message": "Chat update queued"
             }
-            
-            url = f"{settings.SUPABASE_URL}/rest/v1/chats"
-            response = client.post(url, headers=headers, json=chat_data)
-            
-            logger.info(f"Auto-save create response status: {response.status_code}")
-            
-            if response.status_code in [200, 201]:
-                result = response.json()
-                chat_id = result[0]['id'] if result else None
-                logger.info(f"Chat auto-saved (created) successfully: {chat_id}")
+        
+        # If chat_id provided, try to update existing chat (ownership enforced by the filter)
+        if request.chat_id:
+            saved = await asyncio.to_thread(
+                chat_service.save_messages,
+                request.chat_id, user.id, messages, token,
+                title=title, offset=request.message_offset
+            )
+            metrics.incr("autosave.writes")
+            if saved:
+                autosave_service.mark_verified(request.chat_id, user.id)
+                logger.info(f"Chat auto-saved (updated) successfully: {request.chat_id}")
                 return {
                     "success": True,
-                    "chat_id": chat_id,
-                    "message": "Chat created successfully"
+                    "chat_id": request.chat_id,
+                    "message": "Chat updated successfully"
                 }
-            else:
-                logger.error(f"Auto-save failed: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=500, detail="Failed to auto-save chat")
+        
+        # Either no chat_id provided, or chat not found - CREATE new chat
+        if request.message_offset:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        chat = await asyncio.to_thread(chat_service.create_chat, user.id, title or "New Chat", messages, token)
+        chat_id = chat['id'] if chat else None
+        if chat_id:
+            autosave_service.mark_verified(chat_id, user.id)
+        logger.info(f"Chat auto-saved (created) successfully: {chat_id}")
+        return {
+            "success": True,
+            "chat_id": chat_id,
+            "message": "Chat created successfully"
+        }
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in auto-save: {e}")
         raise HTTPException(status_code=500, detail="Failed to auto-save chat")
@@ -652,56 +665,22 @@ def update_user_profile(request: UpdateProfileRequest, user=Depends(get_current_
     try:
         logger.info(f"Updating profile for user {user.id}")
         
-        # Extract the user's JWT token
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        
-        # Create a new Supabase client with the user's token for authenticated operations
-        user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-        user_supabase.auth.set_session(token, user.id)
-        
-        # Build update data for user_metadata
-        update_data = {}
+        # Only provided fields are merged into user_metadata as custom fields
+        update_data = request.model_dump(exclude_none=True)
         
-        if request.full_name is not None:
-            update_data["full_name"] = request.full_name
+        # Update user metadata in Supabase as the user
+        updated_user = supabase_service.update_user_metadata(extract_token(authorization), update_data)
         
-        # These will be stored in user_metadata as custom fields
-        if request.course_name is not None:
-            update_data["course_name"] = request.course_name
-        
-        if request.campus_branch is not None:
-            update_data["campus_branch"] = request.campus_branch
-        
-        if request.contact_number is not None:
-            update_data["contact_number"] = request.contact_number
-
-        if request.year_of_study is not None:
-            update_data["year_of_study"] = request.year_of_study
-
-        if request.trimester is not None:
-            update_data["trimester"] = request.trimester
-
-        if request.mode_of_study is not None:
-            update_data["mode_of_study"] = request.mode_of_study
-        
-        # Update user metadata in Supabase using user-specific client
-        result = user_supabase.auth.update_user({
-            "data": update_data
-        })
-        
-        if result.user:
-            logger.info(f"Profile updated successfully for user {user.id}")
-            return {
-                "success": True,
-                "message": "Profile updated successfully",
-                "user": {
-                    "id": result.user.id,
-                    "email": result.user.email,
-                    "user_metadata": result.user.user_metadata
-                }
+        logger.info(f"Profile updated successfully for user {user.id}")
+        return {
+            "success": True,
+            "message": "Profile updated successfully",
+            "user": {
+                "id": updated_user.get("id"),
+                "email": updated_user.get("email"),
+                "user_metadata": updated_user.get("user_metadata", {})
             }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to update profile")
+        }
             
     except HTTPException:
         raise
@@ -745,39 +724,25 @@ async def upload_avatar(
         file_ext = avatar.filename.split(".")[-1] if "." in avatar.filename else "jpg"
         file_name = f"{user.id}/{uuid.uuid4()}.{file_ext}"
         
-        # Use service role client for storage operations (bypasses RLS)
         try:
-            service_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+            # Upload with the service role key (bypasses storage RLS)
+            await asyncio.to_thread(
+                supabase_service.upload_file, "avatars", file_name, file_content, avatar.content_type
+            )
+            public_url = supabase_service.get_public_url("avatars", file_name)
             
-            upload_result = service_supabase.storage.from_("avatars").upload(
-                file_name, 
-                file_content, 
-                {"content-type": avatar.content_type}
+            # Update user metadata with avatar URL as the user
+            await asyncio.to_thread(
+                supabase_service.update_user_metadata, extract_token(authorization), {"avatar_url": public_url}
             )
             
-            if upload_result.path:
-                # Get public URL
-                public_url = service_supabase.storage.from_("avatars").get_public_url(file_name)
-                
-                # Create a user-specific client to update user metadata
-                token = authorization.split(" ")[1] if " " in authorization else authorization
-                user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-                user_supabase.auth.set_session(token, user.id)
-                
-                # Update user metadata with avatar URL
-                update_result = user_supabase.auth.update_user({
-                    "data": {"avatar_url": public_url}
-                })
-                
-                logger.info(f"Avatar uploaded successfully for user {user.id}: {public_url}")
-                
-                return {
-                    "success": True,
-                    "message": "Avatar uploaded successfully",
-                    "avatar_url": public_url
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to upload avatar to storage")
+            logger.info(f"Avatar uploaded successfully for user {user.id}: {public_url}")
+            
+            return {
+                "success": True,
+                "message": "Avatar uploaded successfully",
+                "avatar_url": public_url
+            }
                 
         except Exception as storage_error:
             logger.error(f"Storage error: {storage_error}")
@@ -793,3 +758,24 @@ async def upload_avatar(
     except Exception as e:
         logger.error(f"Error uploading avatar: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to upload avatar: {str(e)}")
+
+@app.on_event("startup")
+async def on_startup():
+    """
+    Restore the bundled index snapshot if the collection is empty (creating an empty
+    collection when there is no snapshot), then start the ingestion workers
+    """
+    await asyncio.to_thread(restore_on_startup, rag_service.client, rag_service.embeddings)
+    try:
+        await asyncio.to_thread(ensure_collection, rag_service.client, settings.COLLECTION_NAME)
+    except Exception as e:
+        logger.error(f"Could not ensure Qdrant collection {settings.COLLECTION_NAME}: {e}")
+    await ingest_job_service.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Stop ingestion workers, flush buffered autosaves, then release pooled Supabase connections"""
+    await ingest_job_service.stop()
+    await autosave_service.flush_all()
+    await supabase_service.aclose()
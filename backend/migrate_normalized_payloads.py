@@ -0,0 +1,63 @@
+from qdrant_client.http import models
+from app.core.config import settings
+from app.services.embedding_pipeline import create_qdrant_client
+from app.services.text_normalization import NORMALIZATION_VERSION, is_normalized, normalize_text
+import sys
+
+def migrate_normalized_payloads(batch_size: int = 256, dry_run: bool = False):
+    """
+    Rewrite stored chunk text with the current normalization and stamp
+    metadata.normalized_version, so retrieval needs no per-request cleanup.
+    Vectors are left as they are; the ingest manifest records the normalization
+    version, so the next ingest.py run re-syncs every corpus file and re-embeds
+    the chunks whose normalized text changed. Uploaded chunks keep their
+    vectors until the file is uploaded again.
+    """
+    client = create_qdrant_client()
+    print(f"Normalizing payloads in {settings.COLLECTION_NAME} (version {NORMALIZATION_VERSION})...")
+    
+    scanned = 0
+    rewritten = 0
+    offset = None
+    try:
+        while True:
+            points, offset = client.scroll(
+                collection_name=settings.COLLECTION_NAME,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            operations = []
+            for point in points:
+                payload = point.payload or {}
+                metadata = payload.get("metadata") or {}
+                if is_normalized(metadata):
+                    continue
+                # Layout is unknown for old points: only apply the inline (structure-safe) rules
+                content = normalize_text(payload.get("page_content", ""), unwrap_lines=False)
+                metadata["normalized_version"] = NORMALIZATION_VERSION
+                operations.append(models.SetPayloadOperation(
+                    set_payload=models.SetPayload(
+                        payload={"page_content": content, "metadata": metadata},
+                        points=[point.id],
+                    )
+                ))
+            
+            scanned += len(points)
+            if operations and not dry_run:
+                client.batch_update_points(collection_name=settings.COLLECTION_NAME, update_operations=operations)
+            rewritten += len(operations)
+            print(f"Scanned {scanned} points, {rewritten} rewritten so far...")
+            
+            if offset is None:
+                break
+    except Exception as e:
+        print(f"Error while migrating payloads: {e}")
+        sys.exit(1)
+    
+    action = "would be rewritten" if dry_run else "rewritten"
+    print(f"Migration complete! {rewritten} of {scanned} points {action}.")
+
+if __name__ == "__main__":
+    migrate_normalized_payloads(dry_run="--dry-run" in sys.argv)
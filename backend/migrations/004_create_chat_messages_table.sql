@@ -0,0 +1,193 @@
+-- Migration script for append-only chat message storage
+-- Run this in Supabase SQL Editor
+-- Used when the backend runs with CHAT_STORAGE_MODE=messages
+
+-- ============ Chat Messages Table ============
+-- One row per message instead of rewriting chats.messages on every turn
+CREATE TABLE IF NOT EXISTS public.chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id UUID NOT NULL REFERENCES public.chats(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    "timestamp" TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (chat_id, seq)
+);
+
+-- Number of messages stored in chat_messages for each chat
+ALTER TABLE public.chats ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE public.chat_messages ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own chat messages"
+ON public.chat_messages FOR SELECT
+TO authenticated
+USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can insert their own chat messages"
+ON public.chat_messages FOR INSERT
+TO authenticated
+WITH CHECK (auth.uid() = user_id);
+
+CREATE POLICY "Users can update their own chat messages"
+ON public.chat_messages FOR UPDATE
+TO authenticated
+USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can delete their own chat messages"
+ON public.chat_messages FOR DELETE
+TO authenticated
+USING (auth.uid() = user_id);
+
+-- Index for per-user queries (chat_id, seq is covered by the unique constraint)
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_id ON public.chat_messages(user_id);
+
+-- ============ Append Function ============
+-- Appends the tail of a conversation in a single round-trip.
+-- p_messages holds the last jsonb_array_length(p_messages) messages of a
+-- conversation that is p_total messages long, so callers may send either the
+-- full list or only the new messages. Messages already stored are skipped and
+-- a shorter p_total never removes anything. Only p_replace (full PUT
+-- semantics) overwrites stored messages at the same positions and truncates
+-- the stored conversation to p_total.
+-- Runs as the caller, so RLS still applies. Returns NULL if the chat is not
+-- found or not owned by the caller, -1 if messages between the stored count and
+-- the sent tail are missing (the caller resends from the stored count),
+-- otherwise the new message count.
+CREATE OR REPLACE FUNCTION public.append_chat_messages(
+    p_chat_id UUID,
+    p_messages JSONB,
+    p_total INTEGER,
+    p_title TEXT DEFAULT NULL,
+    p_replace BOOLEAN DEFAULT false
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_chat RECORD;
+    v_start INTEGER;
+    v_total INTEGER;
+BEGIN
+    SELECT id, user_id, message_count, messages INTO v_chat
+    FROM public.chats
+    WHERE id = p_chat_id AND user_id = auth.uid()
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    -- Lazily migrate a legacy messages blob on first append. message_count is reset
+    -- whenever the blob is written (see the trigger below), so the blob is authoritative
+    -- and rows left from an earlier backfill are replaced.
+    IF v_chat.message_count = 0 AND jsonb_array_length(COALESCE(v_chat.messages, '[]'::jsonb)) > 0 THEN
+        DELETE FROM public.chat_messages WHERE chat_id = p_chat_id;
+        INSERT INTO public.chat_messages (chat_id, user_id, seq, role, content, "timestamp")
+        SELECT v_chat.id, v_chat.user_id, (m.ord - 1)::INTEGER,
+               m.value->>'role', COALESCE(m.value->>'content', ''), m.value->>'timestamp'
+        FROM jsonb_array_elements(v_chat.messages) WITH ORDINALITY AS m(value, ord);
+        v_chat.message_count := jsonb_array_length(v_chat.messages);
+    END IF;
+
+    v_start := p_total - jsonb_array_length(p_messages);
+
+    IF NOT p_replace AND v_start > v_chat.message_count THEN
+        RETURN -1;
+    END IF;
+
+    IF p_replace AND p_total < v_chat.message_count THEN
+        DELETE FROM public.chat_messages WHERE chat_id = p_chat_id AND seq >= p_total;
+    END IF;
+
+    INSERT INTO public.chat_messages (chat_id, user_id, seq, role, content, "timestamp")
+    SELECT p_chat_id, v_chat.user_id, (v_start + m.ord - 1)::INTEGER,
+           m.value->>'role', COALESCE(m.value->>'content', ''), m.value->>'timestamp'
+    FROM jsonb_array_elements(p_messages) WITH ORDINALITY AS m(value, ord)
+    WHERE p_replace OR v_start + m.ord - 1 >= v_chat.message_count
+    ON CONFLICT (chat_id, seq) DO UPDATE
+        SET role = EXCLUDED.role, content = EXCLUDED.content, "timestamp" = EXCLUDED."timestamp";
+
+    v_total := CASE WHEN p_replace THEN p_total ELSE GREATEST(p_total, v_chat.message_count) END;
+
+    UPDATE public.chats
+    SET message_count = v_total,
+        messages = '[]'::jsonb,
+        title = COALESCE(p_title, title),
+        updated_at = NOW()
+    WHERE id = p_chat_id;
+
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER SET search_path = public;
+
+-- ============ Blob Writes ============
+-- A write to the messages blob (CHAT_STORAGE_MODE=blob, or a backfilled chat whose
+-- blob was kept) makes any chat_messages rows stale: reset message_count so reads
+-- fall back to the blob and the next append migrates it again.
+CREATE OR REPLACE FUNCTION public.reset_chat_message_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.messages IS DISTINCT FROM OLD.messages
+        AND jsonb_array_length(COALESCE(NEW.messages, '[]'::jsonb)) > 0 THEN
+        NEW.message_count := 0;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+DROP TRIGGER IF EXISTS chats_reset_message_count ON public.chats;
+CREATE TRIGGER chats_reset_message_count
+BEFORE UPDATE OF messages ON public.chats
+FOR EACH ROW EXECUTE FUNCTION public.reset_chat_message_count();
+
+-- ============ Backfill ============
+-- Copies existing chats.messages blobs into chat_messages in batches.
+-- Call repeatedly (see backfill_chat_messages.py) until it returns 0.
+-- Blobs are kept unless clear_blob is true, so CHAT_STORAGE_MODE=blob keeps working.
+CREATE OR REPLACE FUNCTION public.backfill_chat_messages(batch_size INTEGER DEFAULT 500, clear_blob BOOLEAN DEFAULT false)
+RETURNS INTEGER AS $$
+DECLARE
+    batch_ids UUID[];
+    migrated INTEGER;
+BEGIN
+    SELECT array_agg(b.id) INTO batch_ids
+    FROM (
+        SELECT id
+        FROM public.chats
+        WHERE message_count = 0
+            AND jsonb_array_length(COALESCE(messages, '[]'::jsonb)) > 0
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) b;
+
+    IF batch_ids IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    -- Rows from an earlier backfill are stale once the blob has been written again
+    DELETE FROM public.chat_messages WHERE chat_id = ANY(batch_ids);
+
+    INSERT INTO public.chat_messages (chat_id, user_id, seq, role, content, "timestamp")
+    SELECT c.id, c.user_id, (m.ord - 1)::INTEGER,
+           m.value->>'role', COALESCE(m.value->>'content', ''), m.value->>'timestamp'
+    FROM public.chats c, jsonb_array_elements(c.messages) WITH ORDINALITY AS m(value, ord)
+    WHERE c.id = ANY(batch_ids);
+
+    -- The blob is either unchanged or emptied, so the reset trigger leaves message_count alone
+    UPDATE public.chats
+    SET message_count = jsonb_array_length(messages),
+        messages = CASE WHEN clear_blob THEN '[]'::jsonb ELSE messages END
+    WHERE id = ANY(batch_ids);
+
+    GET DIAGNOSTICS migrated = ROW_COUNT;
+    RETURN migrated;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ============ Permissions ============
+-- backfill_chat_messages runs as SECURITY DEFINER over all users' chats: only the
+-- backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION public.backfill_chat_messages(INTEGER, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.backfill_chat_messages(INTEGER, BOOLEAN) TO service_role;
@@ -0,0 +1,37 @@
+-- Migration script for lean, keyset-paginated chat listing
+-- Run this in Supabase SQL Editor (works with or without 004_create_chat_messages_table.sql)
+
+-- ============ Stored Message Count ============
+-- select=id,title,total_messages reads this column, so listing never detoasts
+-- the messages blob. It is maintained on every write in both storage modes:
+-- blob writes store the blob length, append-only writes (004) store
+-- message_count; whichever is not in use is 0. message_count is read through
+-- to_jsonb(NEW) so this trigger does not require 004's column to exist.
+-- Replaces the earlier total_messages(chats) computed field.
+DROP FUNCTION IF EXISTS public.total_messages(public.chats);
+ALTER TABLE public.chats ADD COLUMN IF NOT EXISTS total_messages INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION public.set_chat_total_messages()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.total_messages := GREATEST(
+        COALESCE((to_jsonb(NEW) ->> 'message_count')::INTEGER, 0),
+        jsonb_array_length(COALESCE(NEW.messages, '[]'::jsonb))
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- Named to fire after chats_reset_message_count (BEFORE triggers run in name order)
+DROP TRIGGER IF EXISTS chats_set_total_messages ON public.chats;
+CREATE TRIGGER chats_set_total_messages
+BEFORE INSERT OR UPDATE ON public.chats
+FOR EACH ROW EXECUTE FUNCTION public.set_chat_total_messages();
+
+-- Backfill existing rows (the trigger computes the value)
+UPDATE public.chats SET total_messages = total_messages;
+
+-- ============ Keyset Index ============
+-- Supports ORDER BY updated_at DESC, id DESC with (updated_at, id) cursors per user
+CREATE INDEX IF NOT EXISTS idx_chats_user_updated_id
+ON public.chats(user_id, updated_at DESC, id DESC);
@@ -0,0 +1,104 @@
+-- Migration script for server-side admin analytics aggregation
+-- Run this in Supabase SQL Editor (after 005_chat_listing_summary.sql)
+--
+-- Redefines the 002 analytics functions as plain SQL functions: the plpgsql
+-- versions called array_length() on jsonb and had column names that clash
+-- with their RETURNS TABLE output names. Message counts use
+-- the stored chats.total_messages column so both chat storage modes are counted.
+
+-- ============ Existing Functions (fixed) ============
+
+CREATE OR REPLACE FUNCTION public.get_total_messages()
+RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(c.total_messages), 0)::BIGINT
+    FROM public.chats c;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION public.get_chats_per_day(days INTEGER DEFAULT 7)
+RETURNS TABLE(date DATE, count BIGINT) AS $$
+    SELECT DATE(c.created_at), COUNT(*)::BIGINT
+    FROM public.chats c
+    WHERE c.created_at > NOW() - (days || ' days')::INTERVAL
+    GROUP BY 1
+    ORDER BY 1 DESC;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION public.get_messages_per_day(days INTEGER DEFAULT 7)
+RETURNS TABLE(date DATE, count BIGINT) AS $$
+    SELECT DATE(c.created_at), COALESCE(SUM(c.total_messages), 0)::BIGINT
+    FROM public.chats c
+    WHERE c.created_at > NOW() - (days || ' days')::INTERVAL
+    GROUP BY 1
+    ORDER BY 1 DESC;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION public.get_top_chat_topics(limit_count INTEGER DEFAULT 10)
+RETURNS TABLE(title TEXT, count BIGINT) AS $$
+    SELECT INITCAP(c.title), COUNT(*)::BIGINT
+    FROM public.chats c
+    WHERE c.title IS NOT NULL
+        AND c.title != 'New Chat'
+        AND LENGTH(TRIM(c.title)) > 0
+    GROUP BY 1
+    ORDER BY 2 DESC
+    LIMIT limit_count;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- ============ New Aggregates ============
+
+-- Users created in the last N days
+CREATE OR REPLACE FUNCTION public.get_new_users(days INTEGER DEFAULT 7)
+RETURNS INTEGER AS $$
+    SELECT COUNT(*)::INTEGER
+    FROM auth.users u
+    WHERE u.email IS NOT NULL
+        AND u.created_at > NOW() - (days || ' days')::INTERVAL;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Average session duration in seconds (get_avg_session_duration returns an INTERVAL)
+CREATE OR REPLACE FUNCTION public.get_avg_session_seconds()
+RETURNS DOUBLE PRECISION AS $$
+    SELECT COALESCE(EXTRACT(EPOCH FROM AVG(s.logout_at - s.login_at)), 0)::DOUBLE PRECISION
+    FROM public.user_sessions s
+    WHERE s.logout_at IS NOT NULL;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Chat totals in one scan
+CREATE OR REPLACE FUNCTION public.get_chat_stats()
+RETURNS TABLE(total BIGINT, saved BIGINT, total_messages BIGINT) AS $$
+    SELECT COUNT(*)::BIGINT,
+           COUNT(*) FILTER (WHERE c.is_saved)::BIGINT,
+           COALESCE(SUM(c.total_messages), 0)::BIGINT
+    FROM public.chats c;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Engagement: average session length and messages per chatting user
+CREATE OR REPLACE FUNCTION public.get_engagement_stats()
+RETURNS TABLE(avg_session_seconds DOUBLE PRECISION, avg_messages_per_user DOUBLE PRECISION) AS $$
+    SELECT public.get_avg_session_seconds(),
+           COALESCE(
+               (SELECT SUM(c.total_messages)::DOUBLE PRECISION / NULLIF(COUNT(DISTINCT c.user_id), 0)
+                FROM public.chats c),
+               0
+           );
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- ============ Permissions ============
+-- These run as SECURITY DEFINER over all users' data: only the backend
+-- (service role) may call them, never anon/authenticated clients directly.
+DO $$
+DECLARE
+    fn TEXT;
+BEGIN
+    FOREACH fn IN ARRAY ARRAY[
+        'get_total_users()', 'get_active_users(integer)', 'get_total_chats()',
+        'get_total_messages()', 'get_chats_per_day(integer)', 'get_messages_per_day(integer)',
+        'get_top_chat_topics(integer)', 'get_new_users_per_day(integer)',
+        'get_avg_session_duration()', 'get_new_users(integer)', 'get_avg_session_seconds()',
+        'get_chat_stats()', 'get_engagement_stats()'
+    ] LOOP
+        EXECUTE format('REVOKE EXECUTE ON FUNCTION public.%s FROM PUBLIC, anon, authenticated', fn);
+        EXECUTE format('GRANT EXECUTE ON FUNCTION public.%s TO service_role', fn);
+    END LOOP;
+END;
+$$;
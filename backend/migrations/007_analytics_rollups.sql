@@ -0,0 +1,190 @@
+-- Migration script for incrementally maintained analytics rollups
+-- Run this in Supabase SQL Editor (after 006_analytics_aggregates.sql)
+--
+-- Triggers on chats and user_sessions keep one row per day up to date, so
+-- the admin overview and daily charts read O(days) rows instead of scanning
+-- every chat. Run backfill_analytics_rollups.py once after applying this
+-- migration to cover existing data.
+--
+-- Messages are attributed to the day they were written (deltas of
+-- chats.total_messages), chats to the day they were created.
+
+-- ============ Rollup Tables ============
+CREATE TABLE IF NOT EXISTS public.analytics_daily (
+    day DATE PRIMARY KEY,
+    chats_created BIGINT NOT NULL DEFAULT 0,
+    chats_deleted BIGINT NOT NULL DEFAULT 0,
+    messages BIGINT NOT NULL DEFAULT 0,  -- Net change (negative for deletions/truncations)
+    active_users BIGINT NOT NULL DEFAULT 0,
+    sessions_started BIGINT NOT NULL DEFAULT 0,
+    sessions_ended BIGINT NOT NULL DEFAULT 0,
+    session_seconds DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+-- Distinct users with a session per day (feeds active_users and 30-day actives)
+CREATE TABLE IF NOT EXISTS public.analytics_daily_active_users (
+    day DATE NOT NULL,
+    user_id UUID NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+
+-- Only the service role reads these (no policies = no access for clients)
+ALTER TABLE public.analytics_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.analytics_daily_active_users ENABLE ROW LEVEL SECURITY;
+
+-- ============ Rollup Helpers ============
+CREATE OR REPLACE FUNCTION public.bump_analytics_daily(
+    p_day DATE,
+    p_chats_created BIGINT DEFAULT 0,
+    p_chats_deleted BIGINT DEFAULT 0,
+    p_messages BIGINT DEFAULT 0,
+    p_active_users BIGINT DEFAULT 0,
+    p_sessions_started BIGINT DEFAULT 0,
+    p_sessions_ended BIGINT DEFAULT 0,
+    p_session_seconds DOUBLE PRECISION DEFAULT 0
+)
+RETURNS VOID AS $$
+    INSERT INTO public.analytics_daily AS a (
+        day, chats_created, chats_deleted, messages, active_users,
+        sessions_started, sessions_ended, session_seconds
+    )
+    VALUES (
+        p_day, p_chats_created, p_chats_deleted, p_messages, p_active_users,
+        p_sessions_started, p_sessions_ended, p_session_seconds
+    )
+    ON CONFLICT (day) DO UPDATE SET
+        chats_created = a.chats_created + EXCLUDED.chats_created,
+        chats_deleted = a.chats_deleted + EXCLUDED.chats_deleted,
+        messages = a.messages + EXCLUDED.messages,
+        active_users = a.active_users + EXCLUDED.active_users,
+        sessions_started = a.sessions_started + EXCLUDED.sessions_started,
+        sessions_ended = a.sessions_ended + EXCLUDED.sessions_ended,
+        session_seconds = a.session_seconds + EXCLUDED.session_seconds;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+-- ============ Triggers ============
+CREATE OR REPLACE FUNCTION public.rollup_chats()
+RETURNS TRIGGER AS $$
+DECLARE
+    delta BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM public.bump_analytics_daily(DATE(COALESCE(NEW.created_at, NOW())), p_chats_created => 1,
+                                            p_messages => NEW.total_messages);
+    ELSIF TG_OP = 'UPDATE' THEN
+        delta := NEW.total_messages - OLD.total_messages;
+        IF delta != 0 THEN
+            PERFORM public.bump_analytics_daily(CURRENT_DATE, p_messages => delta);
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM public.bump_analytics_daily(CURRENT_DATE, p_chats_deleted => 1,
+                                            p_messages => -OLD.total_messages);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Fires on every update: total_messages is set by a BEFORE trigger, which an
+-- UPDATE OF column list would not see; updates that leave it unchanged are no-ops
+DROP TRIGGER IF EXISTS trg_rollup_chats ON public.chats;
+CREATE TRIGGER trg_rollup_chats
+AFTER INSERT OR UPDATE OR DELETE ON public.chats
+FOR EACH ROW EXECUTE FUNCTION public.rollup_chats();
+
+CREATE OR REPLACE FUNCTION public.rollup_user_sessions()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_day DATE;
+    v_new_active BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        v_day := DATE(COALESCE(NEW.login_at, NOW()));
+        INSERT INTO public.analytics_daily_active_users (day, user_id)
+        VALUES (v_day, NEW.user_id)
+        ON CONFLICT DO NOTHING;
+        GET DIAGNOSTICS v_new_active = ROW_COUNT;
+        PERFORM public.bump_analytics_daily(v_day, p_sessions_started => 1, p_active_users => v_new_active);
+    END IF;
+
+    IF NEW.logout_at IS NOT NULL AND (TG_OP = 'INSERT' OR OLD.logout_at IS NULL) THEN
+        PERFORM public.bump_analytics_daily(
+            DATE(NEW.logout_at),
+            p_sessions_ended => 1,
+            p_session_seconds => GREATEST(EXTRACT(EPOCH FROM (NEW.logout_at - NEW.login_at)), 0)
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS trg_rollup_user_sessions ON public.user_sessions;
+CREATE TRIGGER trg_rollup_user_sessions
+AFTER INSERT OR UPDATE OF logout_at ON public.user_sessions
+FOR EACH ROW EXECUTE FUNCTION public.rollup_user_sessions();
+
+-- ============ Read Functions ============
+
+-- Overview totals from the rollups (O(days) rows)
+CREATE OR REPLACE FUNCTION public.get_rollup_overview(active_days INTEGER DEFAULT 30)
+RETURNS TABLE(total_chats BIGINT, total_messages BIGINT, active_users BIGINT, avg_session_seconds DOUBLE PRECISION) AS $$
+    SELECT
+        COALESCE(SUM(a.chats_created - a.chats_deleted), 0)::BIGINT,
+        COALESCE(SUM(a.messages), 0)::BIGINT,
+        (SELECT COUNT(DISTINCT u.user_id)
+         FROM public.analytics_daily_active_users u
+         WHERE u.day > CURRENT_DATE - active_days)::BIGINT,
+        COALESCE(SUM(a.session_seconds) / NULLIF(SUM(a.sessions_ended), 0), 0)::DOUBLE PRECISION
+    FROM public.analytics_daily a;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- ============ Backfill ============
+-- Rebuilds the rollups from chats and user_sessions (idempotent).
+-- Historical messages are attributed to their chat's creation day.
+CREATE OR REPLACE FUNCTION public.backfill_analytics_rollups()
+RETURNS INTEGER AS $$
+DECLARE
+    v_days INTEGER;
+BEGIN
+    -- TRUNCATE locks both tables for the rebuild (and is not rejected by safeupdate like a bare DELETE)
+    TRUNCATE public.analytics_daily, public.analytics_daily_active_users;
+
+    INSERT INTO public.analytics_daily_active_users (day, user_id)
+    SELECT DISTINCT DATE(s.login_at), s.user_id
+    FROM public.user_sessions s
+    WHERE s.login_at IS NOT NULL;
+
+    INSERT INTO public.analytics_daily (day, chats_created, messages)
+    SELECT DATE(c.created_at), COUNT(*), COALESCE(SUM(c.total_messages), 0)
+    FROM public.chats c
+    WHERE c.created_at IS NOT NULL
+    GROUP BY 1;
+
+    INSERT INTO public.analytics_daily AS a (day, active_users, sessions_started)
+    SELECT DATE(s.login_at), COUNT(DISTINCT s.user_id), COUNT(*)
+    FROM public.user_sessions s
+    WHERE s.login_at IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET
+        active_users = EXCLUDED.active_users,
+        sessions_started = EXCLUDED.sessions_started;
+
+    INSERT INTO public.analytics_daily AS a (day, sessions_ended, session_seconds)
+    SELECT DATE(s.logout_at), COUNT(*), SUM(GREATEST(EXTRACT(EPOCH FROM (s.logout_at - s.login_at)), 0))
+    FROM public.user_sessions s
+    WHERE s.logout_at IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET
+        sessions_ended = EXCLUDED.sessions_ended,
+        session_seconds = EXCLUDED.session_seconds;
+
+    SELECT COUNT(*) INTO v_days FROM public.analytics_daily;
+    RETURN v_days;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ============ Permissions ============
+REVOKE EXECUTE ON FUNCTION public.bump_analytics_daily(DATE, BIGINT, BIGINT, BIGINT, BIGINT, BIGINT, BIGINT, DOUBLE PRECISION) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.get_rollup_overview(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.backfill_analytics_rollups() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_rollup_overview(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION public.backfill_analytics_rollups() TO service_role;
@@ -0,0 +1,18 @@
+-- Migration script for batched per-user chat counts in the admin user list
+-- Run this in Supabase SQL Editor (after 007_analytics_rollups.sql)
+--
+-- /admin/users used to issue one chats count query per listed user. This
+-- function returns the counts for a whole page of user ids in one grouped
+-- query (served by idx_chats_user_id / the 005 listing index).
+
+CREATE OR REPLACE FUNCTION public.get_chat_counts(user_ids UUID[])
+RETURNS TABLE(user_id UUID, count BIGINT) AS $$
+    SELECT c.user_id, COUNT(*)::BIGINT
+    FROM public.chats c
+    WHERE c.user_id = ANY(user_ids)
+    GROUP BY c.user_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- ============ Permissions ============
+REVOKE EXECUTE ON FUNCTION public.get_chat_counts(UUID[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_chat_counts(UUID[]) TO service_role;
@@ -0,0 +1,157 @@
+"""
+Zero-downtime re-index (blue/green).
+
+Builds a new versioned collection next to the live one, fills it with the
+corpus (CORPUS_DIR) and the users' uploaded chunks, validates it and
+then atomically moves the COLLECTION_NAME alias to it. The API keeps serving
+the old collection the whole time; nothing is wiped.
+
+Uploaded chunks are copied with their vectors when the embedding model is
+unchanged, and re-embedded from their stored text otherwise.
+
+Changing EMBEDDING_MODEL: run with the new setting and --no-swap, then
+--activate the printed collection together with deploying the API on the same
+setting, so queries are never embedded with a different model than the index.
+
+    python reindex.py                 build, validate, swap
+    python reindex.py --no-swap       build and validate only
+    python reindex.py --drop-old      delete the previous collection after the swap
+    python reindex.py --activate NAME point the alias at NAME (e.g. to roll back)
+"""
+import argparse
+import json
+import os
+import sys
+from langchain_huggingface import HuggingFaceEmbeddings
+from qdrant_client.http import models
+from app.core.config import settings
+from app.services.collection_aliases import (
+    copy_uploads, create_collection, resolve_alias, swap_alias, versioned_name
+)
+from app.services.embedding_pipeline import EmbeddingPipeline, create_qdrant_client
+from app.services.embedding_store import with_embedding_store
+from ingest import ingest_docs
+
+
+def read_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def validate(client, target, embeddings, expected_points, previous_points):
+    """Point count and smoke queries; returns a list of problems (empty if the collection is good)"""
+    problems = []
+    points = client.count(collection_name=target, exact=True).count
+    print(f"Validating {target}: {points} points (expected {expected_points})")
+    if points != expected_points:
+        problems.append(f"point count {points} != expected {expected_points}")
+    if previous_points and points < previous_points * settings.REINDEX_MIN_POINT_RATIO:
+        problems.append(f"only {points} points vs {previous_points} in the live collection")
+
+    for query in settings.REINDEX_SMOKE_QUERIES:
+        hits = client.query_points(
+            collection_name=target, query=embeddings.embed_query(query), limit=3
+        ).points
+        best = hits[0].score if hits else 0.0
+        print(f"  '{query}': best score {best:.3f}")
+        if best < settings.REINDEX_SMOKE_MIN_SCORE:
+            problems.append(f"smoke query '{query}' scored {best:.3f}")
+    return problems
+
+
+def activate(client, collection):
+    previous = swap_alias(client, settings.COLLECTION_NAME, collection)
+    print(f"Alias {settings.COLLECTION_NAME} now points at {collection} (was {previous or 'nothing'})")
+    return previous
+
+
+def reindex(swap=True, drop_old=False):
+    client = create_qdrant_client()
+    alias = settings.COLLECTION_NAME
+    source = resolve_alias(client, alias)
+    if source is None and alias in [c.name for c in client.get_collections().collections]:
+        source = alias  # Legacy collection created before aliases; migrated by the swap
+    print(f"Live collection: {source or 'none'}")
+
+    embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+    vector_size = len(embeddings.embed_query("dimension probe"))
+    embeddings = with_embedding_store(embeddings)
+
+    target = versioned_name(alias)
+    create_collection(client, target, vector_size)
+    print(f"Building {target} ({settings.EMBEDDING_MODEL}, {vector_size} dimensions)...")
+
+    # 1. Corpus, into a fresh manifest that replaces the live one on swap
+    corpus_manifest = settings.INGEST_MANIFEST_PATH + ".next"
+    if os.path.exists(corpus_manifest):
+        os.remove(corpus_manifest)
+    ingest_docs(collection_name=target, manifest_path=corpus_manifest, embeddings=embeddings)
+
+    # 2. Uploaded chunks (their original files are not kept locally)
+    upload_manifest = settings.INGEST_UPLOAD_MANIFEST_PATH + ".next"
+    uploads, previous_points = set(), 0
+    if source:
+        previous_points = client.count(collection_name=source, exact=True).count
+        live_upload_manifest = read_manifest(settings.INGEST_UPLOAD_MANIFEST_PATH) or {}
+        reembed = live_upload_manifest.get("embedding_model") != settings.EMBEDDING_MODEL
+        pipeline = EmbeddingPipeline(embeddings, client, target)
+        print(f"{'Re-embedding' if reembed else 'Copying'} uploaded chunks from {source}...")
+        uploads, _ = copy_uploads(client, source, target, pipeline, reembed)
+        print(f"  {len(uploads)} uploaded chunks")
+
+    # 3. Validate
+    corpus = read_manifest(corpus_manifest) or {"scopes": {}}
+    corpus_points = sum(
+        1 for entry in corpus["scopes"].values() for chunk in entry["chunks"].values() if "duplicate_of" not in chunk
+    )
+    problems = validate(client, target, embeddings, corpus_points + len(uploads), previous_points)
+    if problems:
+        print("Validation failed; the live collection is untouched:")
+        for problem in problems:
+            print(f"  - {problem}")
+        print(f"Inspect or delete {target} manually.")
+        sys.exit(1)
+
+    if not swap:
+        print(f"{target} is ready. Activate it with: python reindex.py --activate {target}")
+        return
+
+    # 4. Catch up on uploads that arrived (or were replaced) while building, then swap
+    if source:
+        added, live = copy_uploads(client, source, target, pipeline, reembed, skip=uploads)
+        stale = list((uploads | added) - live)
+        if stale:
+            client.delete(collection_name=target, points_selector=models.PointIdsList(points=stale))
+        print(f"Caught up: {len(added)} uploaded chunks added, {len(stale)} removed")
+        live_upload_manifest = read_manifest(settings.INGEST_UPLOAD_MANIFEST_PATH)
+        if live_upload_manifest:
+            live_upload_manifest["embedding_model"] = settings.EMBEDDING_MODEL
+            with open(upload_manifest, "w", encoding="utf-8") as f:
+                json.dump(live_upload_manifest, f)
+
+    previous = activate(client, target)
+    os.replace(corpus_manifest, settings.INGEST_MANIFEST_PATH)
+    if os.path.exists(upload_manifest):
+        os.replace(upload_manifest, settings.INGEST_UPLOAD_MANIFEST_PATH)
+
+    if previous and drop_old:
+        print(f"Deleting previous collection {previous}...")
+        client.delete_collection(collection_name=previous)
+    elif previous:
+        print(f"Previous collection {previous} kept for rollback (python reindex.py --activate {previous})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a new collection and switch the alias to it")
+    parser.add_argument("--no-swap", action="store_true", help="Build and validate, but leave the alias alone")
+    parser.add_argument("--drop-old", action="store_true", help="Delete the previous collection after swapping")
+    parser.add_argument("--activate", metavar="COLLECTION", help="Only point the alias at an existing collection")
+    args = parser.parse_args()
+    if args.activate:
+        # Manifests describe the last build; ingest.py re-embeds whatever the activated collection lacks
+        activate(create_qdrant_client(), args.activate)
+    else:
+        reindex(swap=not args.no_swap, drop_old=args.drop_old)
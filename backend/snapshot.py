@@ -0,0 +1,56 @@
+"""
+Export or import a prebuilt index snapshot.
+
+    python snapshot.py export [--path FILE] [--include-uploads]
+    python snapshot.py import [--path FILE] [--force]
+
+Export after ingest.py and ship the file with the build (INDEX_SNAPSHOT_PATH);
+the API restores it on startup when the collection is empty. Uploads are left
+out by default so user documents never end up in a build artifact.
+"""
+import argparse
+import os
+import sys
+from langchain_huggingface import HuggingFaceEmbeddings
+from app.core.config import settings
+from app.services.embedding_pipeline import create_qdrant_client
+from app.services.index_snapshot import export_snapshot, restore_snapshot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import a prebuilt index snapshot")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--path", default=settings.INDEX_SNAPSHOT_PATH, help="Snapshot file")
+    parser.add_argument("--include-uploads", action="store_true", help="Export: also include uploaded chunks")
+    parser.add_argument("--float32", action="store_true", help="Export: store vectors exactly (default float16)")
+    parser.add_argument("--force", action="store_true", help="Import: load even if the collection is populated")
+    args = parser.parse_args()
+
+    client = create_qdrant_client()
+    embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+
+    if args.command == "export":
+        print(f"Exporting {settings.COLLECTION_NAME} to {args.path}...")
+        header = export_snapshot(
+            client, args.path, embeddings, include_uploads=args.include_uploads,
+            dtype="float32" if args.float32 else "float16"
+        )
+        print(f"Wrote {header['points']} points ({os.path.getsize(args.path) / 1024 / 1024:.1f} MB), "
+              f"model {header['fingerprint']['model']}, corpus {header['corpus_hash']}")
+        sys.exit(0)
+
+    if not os.path.exists(args.path):
+        print(f"Snapshot {args.path} not found.")
+        sys.exit(1)
+    try:
+        result = restore_snapshot(client, args.path, embeddings, force=args.force)
+    except ValueError as e:
+        print(f"Cannot import snapshot: {e}")
+        sys.exit(1)
+    print(f"Snapshot {result['status']}: {result['points']} points in {result['seconds']}s")
+    if result.get("uploads"):
+        print(f"  {result['uploads']} uploaded chunks carried over from the live collection")
+    if result["stale"]:
+        # The restored manifest makes this incremental: only changed files are embedded
+        print("Corpus changed since the snapshot was built; syncing the changes...")
+        from ingest import ingest_docs
+        ingest_docs()
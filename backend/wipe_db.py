@@ -1,5 +1,7 @@
 from qdrant_client import QdrantClient
 from app.core.config import settings
+from app.services.collection_aliases import resolve_alias
+import os
 import sys
 
 def wipe_collection():
@@ -9,10 +11,19 @@ def wipe_collection():
     
     try:
         collections = client.get_collections()
-        if settings.COLLECTION_NAME in [c.name for c in collections.collections]:
-            print(f"Deleting collection: {settings.COLLECTION_NAME}...")
-            client.delete_collection(collection_name=settings.COLLECTION_NAME)
+        # COLLECTION_NAME is normally an alias; delete the collection behind it (and with it the alias)
+        target = resolve_alias(client, settings.COLLECTION_NAME)
+        if target is None and settings.COLLECTION_NAME in [c.name for c in collections.collections]:
+            target = settings.COLLECTION_NAME
+        if target:
+            print(f"Deleting collection: {target}...")
+            client.delete_collection(collection_name=target)
             print("Successfully wiped existing embeddings.")
+            # Nothing recorded in the ingest manifests is indexed any more
+            for manifest_path in (settings.INGEST_MANIFEST_PATH, settings.INGEST_UPLOAD_MANIFEST_PATH):
+                if os.path.exists(manifest_path):
+                    os.remove(manifest_path)
+                    print(f"Removed ingest manifest {manifest_path}.")
         else:
             print(f"Collection {settings.COLLECTION_NAME} not found. Nothing to wipe.")
     except Exception as e:
@@ -2,14 +2,8 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import {
-    getAnalyticsOverview,
-    getChatAnalytics,
-    getChatsDaily,
-    getMessagesDaily,
-    getTopTopics,
-    getEngagementAnalytics,
-    getSystemHealth,
-    uploadDocument,
+    getAnalyticsDashboard,
+    uploadDocumentAndWait,
     getAllUsers,
     makeUserAdmin,
     removeUserAdmin,
@@ -110,8 +104,13 @@ const AdminDashboard = () => {
         setUploadStatus(null);
 
         try {
-            await uploadDocument(session.access_token, uploadFile);
-            setUploadStatus({ type: 'success', message: `Successfully ingested ${uploadFile.name}` });
+            const job = await uploadDocumentAndWait(session.access_token, uploadFile, (progress) => {
+                setUploadStatus({
+                    type: 'info',
+                    message: `Ingesting ${uploadFile.name}: ${progress.stage} (${Math.round((progress.progress || 0) * 100)}%)`
+                });
+            });
+            setUploadStatus({ type: 'success', message: `Successfully ingested ${uploadFile.name} (${job.result?.chunks ?? 0} chunks)` });
             setUploadFile(null);
             // Reset file input
             const fileInput = document.getElementById('file-upload');
@@ -148,52 +147,15 @@ const AdminDashboard = () => {
         
         setLoading(true);
         try {
-            const [
-                overviewData,
-                chatData,
-                chatsData,
-                messagesData,
-                topicsData,
-                engagementData,
-                healthData
-            ] = await Promise.all([
-                getAnalyticsOverview(token).catch(e => {
-                    console.error('Overview error:', e);
-                    return null;
-                }),
-                getChatAnalytics(token).catch(e => {
-                    console.error('Chat analytics error:', e);
-                    return null;
-                }),
-                getChatsDaily(token, days).catch(e => {
-                    console.error('Chats daily error:', e);
-                    return [];
-                }),
-                getMessagesDaily(token, days).catch(e => {
-                    console.error('Messages daily error:', e);
-                    return [];
-                }),
-                getTopTopics(token, 10).catch(e => {
-                    console.error('Top topics error:', e);
-                    return [];
-                }),
-                getEngagementAnalytics(token).catch(e => {
-                    console.error('Engagement error:', e);
-                    return null;
-                }),
-                getSystemHealth(token).catch(e => {
-                    console.error('System health error:', e);
-                    return null;
-                })
-            ]);
-
-            setOverview(overviewData);
-            setChatStats(chatData);
-            setChatsDaily(chatsData || []);
-            setMessagesDaily(messagesData || []);
-            setTopTopics(topicsData || []);
-            setEngagement(engagementData);
-            setSystemHealth(healthData);
+            // One round-trip: the backend fans the queries out concurrently and caches them
+            const dashboard = await getAnalyticsDashboard(token, days, 10) || {};
+            setOverview(dashboard.overview || null);
+            setChatStats(dashboard.chats || null);
+            setChatsDaily(dashboard.chats_daily || []);
+            setMessagesDaily(dashboard.messages_daily || []);
+            setTopTopics(dashboard.topics || []);
+            setEngagement(dashboard.engagement || null);
+            setSystemHealth(dashboard.system || null);
         } catch (error) {
             console.error('Error loading analytics:', error);
         } finally {
@@ -660,7 +622,9 @@ const AdminDashboard = () => {
                 {uploadStatus && (
                     <div className={`mt-4 p-3 rounded-lg text-sm ${uploadStatus.type === 'success'
                         ? 'bg-green-500/10 text-green-500 border border-green-500/20'
-                        : 'bg-red-500/10 text-red-500 border border-red-500/20'
+                        : uploadStatus.type === 'info'
+                            ? 'bg-blue-500/10 text-blue-500 border border-blue-500/20'
+                            : 'bg-red-500/10 text-red-500 border border-red-500/20'
                         }`}>
                         {uploadStatus.message}
                     </div>
@@ -11,18 +11,16 @@ const ChatHistoryModal = ({ isOpen, onClose, onLoadChat }) => {
     const [error, setError] = useState(null);
     const [deletingId, setDeletingId] = useState(null);
     const [searchQuery, setSearchQuery] = useState("");
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const isPremium = theme === 'premium';
 
-    // Filter chats based on search query
+    // Filter chats based on search query (the summary listing carries titles, not messages)
     const filteredChats = chats.filter(chat => {
         if (!searchQuery.trim()) return true;
         const query = searchQuery.toLowerCase();
-        const titleMatch = chat.title?.toLowerCase().includes(query);
-        const messageMatch = chat.messages?.some(msg => 
-            msg.content?.toLowerCase().includes(query)
-        );
-        return titleMatch || messageMatch;
+        return chat.title?.toLowerCase().includes(query);
     });
 
     useEffect(() => {
@@ -48,9 +46,10 @@ const ChatHistoryModal = ({ isOpen, onClose, onLoadChat }) => {
         setError(null);
         try {
             console.log("Calling getChats API...");
-            const data = await getChats(session.access_token, 50, 0, false);
+            const data = await getChats(session.access_token, 50, 0, false, { view: "summary" });
             console.log("getChats response:", data);
             setChats(data.chats || []);
+            setNextCursor(data.next_cursor || null);
             if (data.chats && data.chats.length === 0) {
                 console.log("No chats found - array is empty");
             }
@@ -62,6 +61,19 @@ const ChatHistoryModal = ({ isOpen, onClose, onLoadChat }) => {
         }
     };
 
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const data = await getChats(session.access_token, 50, 0, false, { view: "summary", cursor: nextCursor });
+            setChats(prev => [...prev, ...(data.chats || [])]);
+            setNextCursor(data.next_cursor || null);
+        } catch (err) {
+            console.error("Error fetching more chats:", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleDeleteChat = async (chatId, e) => {
         e.stopPropagation();
         if (!window.confirm("Are you sure you want to delete this chat?")) return;
@@ -215,7 +227,7 @@ const ChatHistoryModal = ({ isOpen, onClose, onLoadChat }) => {
                                         <div className="flex-1 min-w-0">
                                             <div className="flex items-center gap-2 mb-1">
                                                 <h3 className={`font-medium truncate ${isPremium ? 'text-white' : 'text-text-primary'}`}>
-                                                    {formatTitle(chat.title, chat.messages?.[0]?.content)}
+                                                    {formatTitle(chat.title)}
                                                 </h3>
                                                 {chat.is_saved && (
                                                     <span className={`flex-shrink-0 px-2 py-0.5 text-xs rounded-full ${isPremium ? 'bg-amber-500/20 text-amber-300' : 'bg-accent-primary/10 text-accent-primary'}`}>
@@ -224,7 +236,7 @@ const ChatHistoryModal = ({ isOpen, onClose, onLoadChat }) => {
                                                 )}
                                             </div>
                                             <p className="text-xs text-text-secondary">
-                                                {chat.messages?.length || 0} messages • {formatDate(chat.updated_at)}
+                                                {chat.total_messages || 0} messages • {formatDate(chat.updated_at)}
                                             </p>
                                         </div>
                                         
@@ -259,6 +271,15 @@ const ChatHistoryModal = ({ isOpen, onClose, onLoadChat }) => {
                                     </div>
                                 </div>
                             ))}
+                            {nextCursor && !searchQuery && (
+                                <button
+                                    onClick={handleLoadMore}
+                                    disabled={loadingMore}
+                                    className={`w-full py-2 text-sm rounded-xl transition-colors ${isPremium ? 'text-amber-400 hover:bg-white/5' : 'text-accent-primary hover:bg-bg-primary/50'}`}
+                                >
+                                    {loadingMore ? "Loading..." : "Load more"}
+                                </button>
+                            )}
                         </div>
                     )}
                 </div>
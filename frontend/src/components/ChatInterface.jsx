@@ -1,11 +1,14 @@
 import React, { useState, useRef, useEffect, useCallback } from "react";
-import { chatWithAgentStream, autoSaveChat as autoSaveChatApi, extractFileText } from "../services/api";
+import { chatWithAgentStream, autoSaveChat as autoSaveChatApi, extractFileTextStream, getChat } from "../services/api";
 import { useTheme } from "../context/ThemeContext";
 import { useAuth } from "../context/AuthContext";
 import Sidebar from "./Sidebar";
 import ChatHistoryModal from "./ChatHistoryModal";
 import kcaLogo from "../assets/kca-logo.png";
 
+// Attachments longer than this are cut off during extraction (pages beyond it are never parsed)
+const ATTACHMENT_MAX_CHARS = 200000;
+
 const ChatInterface = () => {
     const { theme } = useTheme();
     const { session, user } = useAuth();
@@ -96,7 +99,7 @@ const ChatInterface = () => {
     const currentChatIdRef = useRef(null);
 
     // Attachment state
-    const [attachment, setAttachment] = useState(null); // { name, content, isLoading }
+    const [attachment, setAttachment] = useState(null); // { name, content, isLoading, pages, truncated }
     const fileInputRef = useRef(null);
 
     const handleFileSelect = async (e) => {
@@ -113,11 +116,17 @@ const ChatInterface = () => {
         setError(null);
 
         try {
-            const result = await extractFileText(session.access_token, file);
+            // Pages stream in as they are extracted; long documents stop at the attachment budget
+            const result = await extractFileTextStream(session.access_token, file, {
+                maxChars: ATTACHMENT_MAX_CHARS,
+                onPage: (page) => setAttachment({ name: file.name, content: null, isLoading: true, pages: page.page }),
+            });
             setAttachment({
                 name: file.name,
                 content: result.content,
-                isLoading: false
+                isLoading: false,
+                pages: result.pages,
+                truncated: result.truncated
             });
         } catch (err) {
             console.error("File extraction failed:", err);
@@ -216,7 +225,8 @@ const ChatInterface = () => {
 
         // Append attachment content if present
         if (attachment && attachment.content) {
-            messageContent = `${input}\n\n---\n**Context from attached file (${attachment.name}):**\n${attachment.content}`;
+            const note = attachment.truncated ? ` (truncated after page ${attachment.pages})` : "";
+            messageContent = `${input}\n\n---\n**Context from attached file (${attachment.name})${note}:**\n${attachment.content}`;
         }
 
         const userMessage = {
@@ -315,7 +325,8 @@ const ChatInterface = () => {
                     // Save the partial chat
                     await autoSaveChat();
                 },
-                userMetadata // Pass user metadata to the AI
+                userMetadata, // Pass user metadata to the AI
+                currentChatIdRef.current
             );
         } catch (err) {
             // Catch any other errors
@@ -385,8 +396,13 @@ const ChatInterface = () => {
         currentChatIdRef.current = null;
     };
 
-    const handleLoadChat = (chat) => {
-        // Load a saved chat
+    const handleLoadChat = async (summary) => {
+        // The history list only has summaries; fetch the chat's messages on open
+        const chat = summary.messages ? summary : await getChat(session.access_token, summary.id);
+        if (!chat) {
+            setError("Failed to load chat");
+            return;
+        }
         const loadedMessages = chat.messages.map(msg => ({
             ...msg,
             timestamp: msg.timestamp || new Date().toISOString()
@@ -766,8 +782,16 @@ const ChatInterface = () => {
                                 </svg>
                             </div>
                             <span className="text-sm text-text-primary max-w-xs truncate">
-                                {attachment.isLoading ? "Processing..." : attachment.name}
+                                {attachment.isLoading ? (attachment.pages ? `Processing... page ${attachment.pages}` : "Processing...") : attachment.name}
                             </span>
+                            {attachment.truncated && (
+                                <span
+                                    className="text-xs text-amber-500"
+                                    title={`Only the first ${attachment.pages} pages (${ATTACHMENT_MAX_CHARS.toLocaleString()} characters) are included`}
+                                >
+                                    Truncated after page {attachment.pages}
+                                </span>
+                            )}
                             {attachment.isLoading && (
                                 <svg className="animate-spin h-3 w-3 text-accent-primary" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24">
                                     <circle className="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" strokeWidth="4"></circle>
@@ -48,6 +48,61 @@ export const extractFileText = async (token, file) => {
     }
 };
 
+// Streams extraction page by page (NDJSON); stops server-side once maxChars is reached.
+// onPage(page) is called as each page arrives. Resolves to { filename, content, pages, truncated }.
+export const extractFileTextStream = async (token, file, { maxChars = 0, onPage = null } = {}) => {
+    const formData = new FormData();
+    formData.append("file", file);
+
+    const response = await fetch(`${API_URL}/documents/extract/stream?max_chars=${maxChars}`, {
+        method: "POST",
+        headers: {
+            "Authorization": `Bearer ${token}`,
+        },
+        body: formData,
+    });
+
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || "Failed to extract text");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const pages = [];
+    let buffer = "";
+    let summary = null;
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop() || "";
+
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const record = JSON.parse(line);
+            if (record.type === "page") {
+                pages.push(record.content);
+                if (onPage) onPage(record);
+            } else if (record.type === "error") {
+                throw new Error(record.detail || "Failed to extract text");
+            } else if (record.type === "done") {
+                summary = record;
+            }
+        }
+    }
+
+    return {
+        filename: file.name,
+        content: pages.join("\n\n"),
+        pages: pages.length,
+        truncated: summary ? summary.truncated : false,
+    };
+};
+
 export const uploadDocument = async (token, file) => {
     try {
         const formData = new FormData();
@@ -73,12 +128,43 @@ export const uploadDocument = async (token, file) => {
     }
 };
 
-export const chatWithAgentStream = async (message, token, onChunk, onComplete, onError, history = [], abortSignal = null, onAbort = null, userMetadata = null) => {
+export const getIngestJob = async (token, jobId) => {
+    const response = await fetch(`${API_URL}/documents/jobs/${jobId}`, {
+        method: "GET",
+        headers: {
+            "Authorization": `Bearer ${token}`,
+        },
+    });
+
+    if (!response.ok) {
+        throw new Error("Failed to fetch ingestion job");
+    }
+
+    return await response.json();
+};
+
+// Upload a document and wait for its background ingestion job to finish
+export const uploadDocumentAndWait = async (token, file, onProgress = null, pollMs = 1500) => {
+    let job = await uploadDocument(token, file);
+    while (job.status === "queued" || job.status === "running") {
+        if (onProgress) onProgress(job);
+        await new Promise((resolve) => setTimeout(resolve, pollMs));
+        job = await getIngestJob(token, job.id);
+    }
+    if (job.status !== "succeeded") {
+        throw new Error(job.error || "Document ingestion failed");
+    }
+    return job;
+};
+
+export const chatWithAgentStream = async (message, token, onChunk, onComplete, onError, history = [], abortSignal = null, onAbort = null, userMetadata = null, chatId = null) => {
     try {
         const historyParam = history.length > 0 ? `&history=${encodeURIComponent(JSON.stringify(history))}` : "";
         const userMetadataParam = userMetadata ? `&user_metadata=${encodeURIComponent(JSON.stringify(userMetadata))}` : "";
+        // Lets the backend flush any buffered autosave for this chat when the stream completes
+        const chatIdParam = chatId ? `&chat_id=${encodeURIComponent(chatId)}` : "";
 
-        const response = await fetch(`${API_URL}/chat/stream?message=${encodeURIComponent(message)}${historyParam}${userMetadataParam}`, {
+        const response = await fetch(`${API_URL}/chat/stream?message=${encodeURIComponent(message)}${historyParam}${userMetadataParam}${chatIdParam}`, {
             method: "GET",
             headers: {
                 "Authorization": `Bearer ${token}`,
@@ -136,13 +222,17 @@ export const chatWithAgentStream = async (message, token, onChunk, onComplete, o
 
 // ============ Chat History API ============
 
-export const getChats = async (token, limit = 50, offset = 0, savedOnly = false) => {
+// view "summary" returns id, title, is_saved, updated_at and total_messages only;
+// pass the returned next_cursor as cursor to fetch the next page
+export const getChats = async (token, limit = 50, offset = 0, savedOnly = false, { view = "full", cursor = null } = {}) => {
     try {
         const params = new URLSearchParams({
             limit: limit.toString(),
             offset: offset.toString(),
-            saved_only: savedOnly.toString()
+            saved_only: savedOnly.toString(),
+            view
         });
+        if (cursor) params.set("cursor", cursor);
 
         const response = await fetch(`${API_URL}/chats?${params}`, {
             method: "GET",
@@ -158,7 +248,7 @@ export const getChats = async (token, limit = 50, offset = 0, savedOnly = false)
         return await response.json();
     } catch (error) {
         console.error("Error fetching chats:", error);
-        return { chats: [], total: 0 };
+        return { chats: [], total: 0, next_cursor: null };
     }
 };
 
@@ -505,6 +595,26 @@ export const getSystemHealth = async (token) => {
     }
 };
 
+export const getAnalyticsDashboard = async (token, days = 7, topicsLimit = 10) => {
+    try {
+        const response = await fetch(`${API_URL}/admin/analytics/dashboard?days=${days}&limit=${topicsLimit}`, {
+            method: "GET",
+            headers: {
+                "Authorization": `Bearer ${token}`,
+            },
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to fetch analytics dashboard");
+        }
+
+        return await response.json();
+    } catch (error) {
+        console.error("Error fetching analytics dashboard:", error);
+        return null;
+    }
+};
+
 export const getAllUsers = async (token, limit = 50, offset = 0) => {
     try {
         const response = await fetch(`${API_URL}/admin/users?limit=${limit}&offset=${offset}`, {